@@ -1,95 +1,310 @@
 from typing import Any, Text, Dict, List
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
-from rasa_sdk.events import SlotSet
-import requests
-import json
-import os
+from rasa_sdk.events import ReminderScheduled, SlotSet
 import datetime
 from datetime import timedelta
 import logging
 
-# Configure logger
-logging.basicConfig(level=logging.INFO)
+from actions.admission import admitted
+from actions.aggregation import ContentMetricsAggregator, aggregate_content_metrics, summarize_content_metrics
+from actions.api_client import ApiResponse, aggregate_key, get_api_client, page_key, query_key
+from actions.batch import collect_values, post_many, summarize_results
+from actions.budgets import BudgetExceeded, get_budget
+from actions.config import (MEDIA_COVERAGE_PAGE_SIZE, POST_INDEX_ENABLED, PREFETCH_ENABLED,
+                            PROGRESSIVE_FIRST_ITEMS, QUERY_PLANNER_ENABLED, REPORT_JOBS_ENABLED,
+                            REPORT_REMINDER_DELAY, SENTIMENT_FALLBACK_ENABLED, SENTIMENT_STORE_ENABLED,
+                            WRITE_BEHIND_ENABLED)
+from actions.date_parser import get_date_range_from_text
+from actions.decoding import Projection
+from actions.jobs import DONE, PENDING, get_report_jobs
+from actions.lexicon import TEXT_FIELDS, lexicon_sentiment
+from actions.metrics import instrumented
+from actions.outbox import get_outbox
+from actions.planner import PlannedQuery, get_query_planner
+from actions.post_index import get_post_index
+from actions.progress import Progress, on_first_items, progressive_enabled
+from actions.result_store import content_key, get_sentiment_store
+from actions.streaming import json_page
+
+# Logging is configured by the server entrypoint, not on import
 logger = logging.getLogger(__name__)
 
-# Base URL for the API - use environment variable or default
-# In production environments, the server runs on port 8080
-API_PORT = os.environ.get("API_PORT", "8080" if os.environ.get("NODE_ENV") == "production" else "5000")
-API_HOST = os.environ.get("API_HOST", "localhost")
-API_BASE_URL = f"http://{API_HOST}:{API_PORT}/api"
+# Appended when an answer had to come from an expired cache entry
+STALE_NOTE = "\n\n(These results were cached a little while ago and may be slightly out of date.)"
+
+# Appended when sentiment was estimated locally because the sentiment service could not answer
+ESTIMATED_NOTE = ("\n\n(The sentiment service is not responding, so this is a quick estimate "
+                  "based on the wording of matching posts.)")
+
+# Fields each read action takes from its responses; the rest is never kept
+SENTIMENT_FIELDS = Projection('overall_sentiment', 'positive_count', 'negative_count', 'neutral_count')
+COVERAGE_FIELDS = Projection('title', 'summary')
+POST_METRIC_FIELDS = Projection('engagement', 'likes', 'shares', 'comments')
+SENTIMENT_TEXT_FIELDS = Projection(*TEXT_FIELDS)
 
-# Log the API base URL for debugging
-logger.info(f"Using API base URL: {API_BASE_URL}")
+# The read queries the query planner sends together for a turn
+SENTIMENT_QUERY = 'sentiment'
+COVERAGE_QUERY = 'coverage'
+METRICS_QUERY = 'metrics'
+
+# The read query each intent asks for. A multi-intent such as
+# "request_sentiment_analysis+request_content_metrics" asks for each of its parts
+INTENT_QUERIES = {
+    'request_sentiment_analysis': SENTIMENT_QUERY,
+    'ask_about_media_coverage': COVERAGE_QUERY,
+    'request_content_metrics': METRICS_QUERY,
+}
+
+# Wording for each kind of report, shared by the blocking and background paths
+REPORT_MESSAGES = {
+    'kpi': {
+        'title': "KPI report",
+        'preparing': "Your KPI report is being prepared. I'll send you the download link as soon as it's ready.",
+        'slow': "Your KPI report is taking longer than usual. It will appear in the Reports section of the dashboard when it's ready.",
+        'no_url': "Your report has been generated and is available in the Reports section of the dashboard.",
+        'failed': "I couldn't generate the KPI report at this time. Please try again later or check the Reports section in the dashboard.",
+    },
+    'custom': {
+        'title': "custom report",
+        'preparing': "Your custom report is being prepared. I'll send you the download link as soon as it's ready.",
+        'slow': "Your custom report is taking longer than usual. It will appear in the Reports section of the dashboard when it's ready.",
+        'no_url': "Your custom report has been created and is available in the Reports section of the dashboard.",
+        'failed': "I couldn't customize the report at this time. Please try again later or use the Reports section in the dashboard to create a custom report.",
+    },
+}
 
 # Helper functions for common operations
-def get_date_range_from_text(date_range_text):
-    """Convert natural language date ranges to actual dates"""
-    now = datetime.datetime.now()
+def report_ready_message(kind, report_url, format=None, date_range=None, metric_type=None):
+    """Format the message announcing a finished report"""
+    if not report_url:
+        return REPORT_MESSAGES[kind]['no_url']
     
-    if not date_range_text:
-        return None, None
+    message = f"Your {REPORT_MESSAGES[kind]['title']} has been generated! You can download it here: {report_url}"
+    if format:
+        message += f"\nFormat: {format.upper()}"
+    if date_range:
+        message += f"\nTime period: {date_range}"
+    if metric_type:
+        message += f"\nMetrics included: {metric_type}"
+    return message
+
+def report_status_reminder(job_id):
+    """Schedule a check on a background report job"""
+    return ReminderScheduled(
+        "EXTERNAL_report_status",
+        trigger_date_time=datetime.datetime.now() + timedelta(seconds=REPORT_REMINDER_DELAY),
+        entities=[{"entity": "report_job_id", "value": job_id}],
+        name=f"report_status_{job_id}",
+        kill_on_user_message=False,
+    )
+
+def sentiment_request_key(params):
+    """Content key of a sentiment request, with the timeframe resolved to concrete dates"""
+    request = {'path': "/nlp/analyze-sentiment"}
+    for name, value in params.items():
+        request[name] = " ".join(str(value).lower().split())
+    if params.get('timeframe'):
+        start_date, end_date = get_date_range_from_text(params['timeframe'])
+        if start_date:
+            request['timeframe'] = [start_date, end_date]
+    return content_key(request)
+
+
+def sentiment_params(topic=None, platform=None, timeframe=None):
+    """Request body for /nlp/analyze-sentiment, shared by the sentiment action and the query planner"""
+    params = {}
+    if topic:
+        params['topic'] = topic
+    if platform:
+        params['platform'] = platform
+    if timeframe:
+        params['timeframe'] = timeframe
+    return params
+
+
+def media_coverage_params(topic=None, timeframe=None, keyword=None):
+    """Query parameters for /press-releases, shared by the coverage action and its prefetch"""
+    params = {}
+    if topic:
+        params['topic'] = topic
+    if timeframe:
+        params['timeframe'] = timeframe
+    if keyword:
+        params['keyword'] = keyword
+    return params
+
+
+def content_metrics_params(platform=None, topic=None, timeframe=None):
+    """Query parameters for /social-posts, shared by the metrics action and its prefetch"""
+    params = {}
+    if platform:
+        params['platform'] = platform
+    if topic:
+        params['topic'] = topic
+    if timeframe:
+        params['timeframe'] = timeframe
+    return params
+
+
+def media_coverage_message(items, total, has_more, topic=None, keyword=None, timeframe=None):
+    """Format the media coverage reply from the first page of matches"""
+    if len(items) == 0:
+        return "I couldn't find any media coverage matching your criteria."
     
-    date_range_text = date_range_text.lower()
+    if total is not None:
+        message = f"Found {total} media coverage items "
+    elif has_more:
+        message = f"Found more than {len(items)} media coverage items "
+    else:
+        message = f"Found {len(items)} media coverage items "
+    if topic:
+        message += f"about '{topic}' "
+    if keyword:
+        message += f"mentioning '{keyword}' "
+    if timeframe:
+        message += f"during {timeframe} "
+    message += "\n\nHere are some highlights:\n"
     
-    if "today" in date_range_text:
-        return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
-    elif "yesterday" in date_range_text:
-        yesterday = now - timedelta(days=1)
-        return yesterday.strftime("%Y-%m-%d"), yesterday.strftime("%Y-%m-%d")
-    elif "last week" in date_range_text:
-        start = now - timedelta(days=7)
-        return start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
-    elif "last month" in date_range_text:
-        start = now - timedelta(days=30)
-        return start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
-    elif "q1" in date_range_text:
-        year = now.year
-        if "2023" in date_range_text:
-            year = 2023
-        elif "2024" in date_range_text:
-            year = 2024
-        elif "2025" in date_range_text:
-            year = 2025
-        return f"{year}-01-01", f"{year}-03-31"
-    elif "q2" in date_range_text:
-        year = now.year
-        if "2023" in date_range_text:
-            year = 2023
-        elif "2024" in date_range_text:
-            year = 2024
-        elif "2025" in date_range_text:
-            year = 2025
-        return f"{year}-04-01", f"{year}-06-30"
-    elif "q3" in date_range_text:
-        year = now.year
-        if "2023" in date_range_text:
-            year = 2023
-        elif "2024" in date_range_text:
-            year = 2024
-        elif "2025" in date_range_text:
-            year = 2025
-        return f"{year}-07-01", f"{year}-09-30"
-    elif "q4" in date_range_text:
-        year = now.year
-        if "2023" in date_range_text:
-            year = 2023
-        elif "2024" in date_range_text:
-            year = 2024
-        elif "2025" in date_range_text:
-            year = 2025
-        return f"{year}-10-01", f"{year}-12-31"
-    elif "this year" in date_range_text:
-        return f"{now.year}-01-01", f"{now.year}-12-31"
-    elif "next week" in date_range_text:
-        start = now + timedelta(days=7)
-        return now.strftime("%Y-%m-%d"), start.strftime("%Y-%m-%d")
-    elif "tomorrow" in date_range_text:
-        tomorrow = now + timedelta(days=1)
-        return tomorrow.strftime("%Y-%m-%d"), tomorrow.strftime("%Y-%m-%d")
+    # Show the fetched coverage items
+    for item in items:
+        message += f"- {item.get('title', 'Untitled')}: {item.get('summary', 'No summary available')[:100]}...\n"
     
-    # Default case - return None
-    return None, None
+    if total is not None and total > len(items):
+        message += f"\nAnd {total - len(items)} more items. Check the dashboard for complete results."
+    elif has_more:
+        message += "\nAnd more items. Check the dashboard for complete results."
+    return message
+
+def early_metrics_message(posts):
+    """Format the early look at content metrics pushed while the rest of the posts stream in"""
+    aggregator = ContentMetricsAggregator()
+    for post in posts:
+        if isinstance(post, dict):
+            aggregator.add(post)
+    return (f"Early look at the first {aggregator.posts} posts: {aggregator.engagement:.0f} total engagement, "
+            f"{aggregator.engagement / aggregator.posts:.2f} per post on average. Still counting the rest...")
+
+def progressive_content_metrics(progress):
+    """A content metrics reducer that pushes an early look once the first posts have streamed in"""
+    async def early_look(posts):
+        # Once per run: with hedging, both attempts of the read stream the posts
+        await progress.send_once(early_metrics_message(posts))
+
+    async def reducer(posts):
+        return await aggregate_content_metrics(on_first_items(posts, PROGRESSIVE_FIRST_ITEMS, early_look))
+
+    # Same name, so results are cached and coalesced with the non-progressive reducer
+    reducer.__name__ = aggregate_content_metrics.__name__
+    return reducer
+
+
+def turn_key(tracker):
+    """Identify the user message the current action is answering"""
+    message = tracker.latest_message or {}
+    return (tracker.sender_id, message.get('message_id') or message.get('text'))
+
+
+def read_filters(tracker):
+    """The slot values the read queries of a turn filter on"""
+    filters = {}
+    for name in ('topic', 'platform', 'timeframe', 'keyword'):
+        value = tracker.get_slot(name)
+        if value:
+            filters[name] = value
+    return filters
+
+
+def turn_queries(tracker, name):
+    """The read queries the current turn asks for: those of its intent, and always the asking action's own"""
+    intent = ((tracker.latest_message or {}).get('intent') or {}).get('name') or ''
+    wanted = {INTENT_QUERIES[part] for part in intent.split('+') if part in INTENT_QUERIES}
+    wanted.add(name)
+    return wanted
+
+
+def read_queries(filters, wanted):
+    """Plan the wanted read queries the filters allow, skipping those answered locally"""
+    client = get_api_client()
+    topic, platform, timeframe, keyword = (filters.get(name) for name in ('topic', 'platform', 'timeframe', 'keyword'))
+    queries = []
+    if SENTIMENT_QUERY in wanted and (topic or platform or timeframe):
+        stored = (SENTIMENT_STORE_ENABLED and get_sentiment_store().get(
+            sentiment_request_key(sentiment_params(topic, platform, timeframe))) is not None)
+        if not stored:
+            queries.append(PlannedQuery(
+                SENTIMENT_QUERY, "POST", "/nlp/analyze-sentiment", ('topic', 'platform', 'timeframe'),
+                lambda params: client.query("POST", "/nlp/analyze-sentiment", json=params, fields=SENTIMENT_FIELDS),
+                SENTIMENT_FIELDS,
+                lambda params: query_key("POST", "/nlp/analyze-sentiment", json=params, fields=SENTIMENT_FIELDS)))
+    if COVERAGE_QUERY in wanted and (topic or timeframe or keyword):
+        queries.append(PlannedQuery(
+            COVERAGE_QUERY, "GET", "/press-releases", ('topic', 'timeframe', 'keyword'),
+            lambda params: client.fetch_page("/press-releases", MEDIA_COVERAGE_PAGE_SIZE, params=params,
+                                             fields=COVERAGE_FIELDS),
+            lambda body: json_page(body, MEDIA_COVERAGE_PAGE_SIZE, projection=COVERAGE_FIELDS),
+            lambda params: page_key("/press-releases", MEDIA_COVERAGE_PAGE_SIZE, params, COVERAGE_FIELDS),
+            {'limit': MEDIA_COVERAGE_PAGE_SIZE, 'offset': 0}))
+    if METRICS_QUERY in wanted and (platform or topic or timeframe):
+        indexed = POST_INDEX_ENABLED and get_post_index().query(platform, topic, timeframe) is not None
+        if not indexed:
+            queries.append(PlannedQuery(
+                METRICS_QUERY, "GET", "/social-posts", ('platform', 'topic', 'timeframe'),
+                lambda params: client.aggregate("/social-posts", aggregate_content_metrics, params=params,
+                                                 fields=POST_METRIC_FIELDS),
+                summarize_content_metrics,
+                lambda params: aggregate_key("/social-posts", aggregate_content_metrics, params, POST_METRIC_FIELDS)))
+    return queries
+
+
+def planned_read(tracker, name, budget=None):
+    """This turn's planned result for a read query, or None when the action should send it itself
+
+    The first read action of a turn plans and sends the queries the turn asks
+    for. With a budget the result is awaited like the action's own read would
+    be, stale-cache fallback included.
+    """
+    if not QUERY_PLANNER_ENABLED:
+        return None
+    filters = read_filters(tracker)
+    plan = get_query_planner().plan(turn_key(tracker), filters,
+                                    lambda: read_queries(filters, turn_queries(tracker, name)))
+    return plan.take(name, budget)
+
+
+async def local_sentiment(topic=None, platform=None, timeframe=None):
+    """Score the text of matching posts (or press releases, if no post matches) with the local lexicon
+
+    Returns None when nothing could be read within the fallback budget.
+    """
+    client = get_api_client()
+    budget = get_budget('sentiment_fallback')
+    sources = [("/social-posts", content_metrics_params(platform, topic, timeframe))]
+    if topic or timeframe:
+        sources.append(("/press-releases", media_coverage_params(topic, timeframe)))
+    for path, params in sources:
+        try:
+            response = await client.aggregate(path, lexicon_sentiment, params=params, budget=budget,
+                                              fields=SENTIMENT_TEXT_FIELDS)
+        except BudgetExceeded:
+            return None
+        if response.status_code == 200 and any(response.json()[count] for count in
+                                                ('positive_count', 'negative_count', 'neutral_count')):
+            return response
+    return None
+
+
+async def prefetch_follow_ups(tracker):
+    """Warm the coverage and content metrics a sentiment question is usually followed by"""
+    topic = tracker.get_slot('topic')
+    timeframe = tracker.get_slot('timeframe')
+    client = get_api_client()
+    if topic or timeframe or tracker.get_slot('keyword'):
+        await client.fetch_page("/press-releases", MEDIA_COVERAGE_PAGE_SIZE, prefetch=True, fields=COVERAGE_FIELDS,
+                                params=media_coverage_params(topic, timeframe, tracker.get_slot('keyword')))
+    await client.aggregate("/social-posts", aggregate_content_metrics, prefetch=True, fields=POST_METRIC_FIELDS,
+                           params=content_metrics_params(tracker.get_slot('platform'), topic, timeframe))
+
 
 def format_response_message(data, entity_type):
     """Format API response into readable message"""
@@ -108,13 +323,15 @@ def format_response_message(data, entity_type):
     
     return message
 
+@instrumented
+@admitted
 class ActionGetSentimentAnalysis(Action):
     def name(self) -> Text:
         return "action_get_sentiment_analysis"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         topic = tracker.get_slot('topic')
@@ -128,19 +345,49 @@ class ActionGetSentimentAnalysis(Action):
         
         try:
             # Build request parameters based on available slots
-            params = {}
-            if topic:
-                params['topic'] = topic
-            if platform:
-                params['platform'] = platform
-            if timeframe:
-                params['timeframe'] = timeframe
-                
-            # Make request to sentiment analysis endpoint
-            response = requests.post(
-                f"{API_BASE_URL}/nlp/analyze-sentiment",
-                json=params
-            )
+            params = sentiment_params(topic, platform, timeframe)
+            
+            # Users tend to ask for coverage or metrics on the same topic next
+            # (the query planner only sends what this turn asks for)
+            if PREFETCH_ENABLED:
+                await prefetch_follow_ups(tracker)
+                
+            # Results shared by every action server process on this host
+            store_key = sentiment_request_key(params) if SENTIMENT_STORE_ENABLED else None
+            stored = get_sentiment_store().get(store_key) if store_key else None
+                
+            # Sent with the turn's other read queries when the query planner is on
+            planned = planned_read(tracker, SENTIMENT_QUERY, get_budget(self.name())) if stored is None else None
+                
+            failure = None
+            try:
+                if stored is not None:
+                    response = ApiResponse(200, data=stored)
+                elif planned is not None:
+                    response = await planned
+                else:
+                    # Make request to sentiment analysis endpoint
+                    response = await get_api_client().query(
+                        "POST",
+                        "/nlp/analyze-sentiment",
+                        json=params,
+                        budget=get_budget(self.name()),
+                        fields=SENTIMENT_FIELDS
+                    )
+                if store_key and stored is None and response.status_code == 200 and not response.stale:
+                    get_sentiment_store().put(store_key, response.json())
+            except Exception as e:
+                if not SENTIMENT_FALLBACK_ENABLED:
+                    raise
+                response, failure = None, e
+            
+            # Estimate from the wording of matching posts when the sentiment service cannot answer
+            estimated = None
+            if SENTIMENT_FALLBACK_ENABLED and (response is None or response.status_code != 200):
+                estimated = await local_sentiment(topic, platform, timeframe)
+                response = estimated or response
+            if response is None:
+                raise failure
             
             if response.status_code == 200:
                 sentiment_data = response.json()
@@ -159,24 +406,32 @@ class ActionGetSentimentAnalysis(Action):
                 message += f"- Positive mentions: {sentiment_data.get('positive_count', 0)}\n"
                 message += f"- Negative mentions: {sentiment_data.get('negative_count', 0)}\n"
                 message += f"- Neutral mentions: {sentiment_data.get('neutral_count', 0)}"
+                if estimated is not None:
+                    message += ESTIMATED_NOTE
+                if response.stale:
+                    message += STALE_NOTE
                 
                 dispatcher.utter_message(text=message)
             else:
                 dispatcher.utter_message(text="I couldn't retrieve sentiment data at this time. Please try again later.")
                 
+        except BudgetExceeded:
+            dispatcher.utter_message(text="Sentiment results are still loading. Please ask me again in a moment.")
         except Exception as e:
             dispatcher.utter_message(text=f"I encountered an error analyzing sentiment: {str(e)}")
         
         return []
 
 
+@instrumented
+@admitted
 class ActionGetMediaCoverage(Action):
     def name(self) -> Text:
         return "action_get_media_coverage"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         topic = tracker.get_slot('topic')
@@ -190,61 +445,63 @@ class ActionGetMediaCoverage(Action):
         
         try:
             # Build request parameters based on available slots
-            params = {}
-            if topic:
-                params['topic'] = topic
-            if timeframe:
-                params['timeframe'] = timeframe
-            if keyword:
-                params['keyword'] = keyword
-                
-            # Make request to media coverage endpoint
-            response = requests.get(
-                f"{API_BASE_URL}/press-releases",
-                params=params
-            )
+            params = media_coverage_params(topic, timeframe, keyword)
+            
+            # Progressive mode pushes updates to the chat instead of running against a budget
+            progress = Progress(tracker.sender_id, self.name()) if progressive_enabled() else None
+                
+            # Sent with the turn's other read queries when the query planner is on
+            planned = planned_read(tracker, COVERAGE_QUERY, None if progress is not None else get_budget(self.name()))
+                
+            # Fetch only the highlights plus the total number of matches
+            if progress is not None:
+                response = await progress.run(
+                    planned if planned is not None else get_api_client().fetch_page(
+                        "/press-releases", MEDIA_COVERAGE_PAGE_SIZE, params=params, fields=COVERAGE_FIELDS),
+                    ack="Looking up media coverage now. I'll share highlights as soon as they arrive."
+                )
+            elif planned is not None:
+                response = await planned
+            else:
+                response = await get_api_client().fetch_page(
+                    "/press-releases",
+                    MEDIA_COVERAGE_PAGE_SIZE,
+                    params=params,
+                    budget=get_budget(self.name()),
+                    fields=COVERAGE_FIELDS
+                )
             
             if response.status_code == 200:
-                coverage_data = response.json()
+                page = response.json()
+                coverage_data = page['items']
+                total = page['total']
                 
                 # Format response for user
-                if len(coverage_data) > 0:
-                    message = f"Found {len(coverage_data)} media coverage items "
-                    if topic:
-                        message += f"about '{topic}' "
-                    if keyword:
-                        message += f"mentioning '{keyword}' "
-                    if timeframe:
-                        message += f"during {timeframe} "
-                    
-                    message += "\n\nHere are some highlights:\n"
-                    
-                    # Show up to 3 coverage items
-                    for i, item in enumerate(coverage_data[:3]):
-                        message += f"- {item.get('title', 'Untitled')}: {item.get('summary', 'No summary available')[:100]}...\n"
-                    
-                    if len(coverage_data) > 3:
-                        message += f"\nAnd {len(coverage_data) - 3} more items. Check the dashboard for complete results."
-                else:
-                    message = "I couldn't find any media coverage matching your criteria."
+                message = media_coverage_message(coverage_data, total, page['has_more'], topic, keyword, timeframe)
+                if response.stale:
+                    message += STALE_NOTE
                 
                 dispatcher.utter_message(text=message)
             else:
                 dispatcher.utter_message(text="I couldn't retrieve media coverage data at this time. Please try again later.")
                 
+        except BudgetExceeded:
+            dispatcher.utter_message(text="Media coverage results are still loading. Please ask me again in a moment.")
         except Exception as e:
             dispatcher.utter_message(text=f"I encountered an error getting media coverage: {str(e)}")
         
         return []
 
 
+@instrumented
+@admitted
 class ActionGetContentMetrics(Action):
     def name(self) -> Text:
         return "action_get_content_metrics"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         platform = tracker.get_slot('platform')
@@ -258,28 +515,52 @@ class ActionGetContentMetrics(Action):
         
         try:
             # Build request parameters based on available slots
-            params = {}
-            if platform:
-                params['platform'] = platform
-            if topic:
-                params['topic'] = topic
-            if timeframe:
-                params['timeframe'] = timeframe
-                
-            # Make request to social posts endpoint for metrics
-            response = requests.get(
-                f"{API_BASE_URL}/social-posts",
-                params=params
-            )
+            params = content_metrics_params(platform, topic, timeframe)
             
-            if response.status_code == 200:
-                posts_data = response.json()
+            # Progressive mode pushes updates to the chat instead of running against a budget
+            progress = Progress(tracker.sender_id, self.name()) if progressive_enabled() else None
+            
+            # Answer from the local post index when it covers the question
+            summary = None
+            if POST_INDEX_ENABLED:
+                index = get_post_index()
+                await index.ensure_fresh()
+                summary = index.query(platform, topic, timeframe)
+            
+            # Sent with the turn's other read queries when the query planner is on
+            planned = None
+            if summary is None:
+                planned = planned_read(tracker, METRICS_QUERY,
+                                       None if progress is not None else get_budget(self.name()))
                 
-                # Calculate some basic metrics
-                engagement_total = sum(post.get('engagement', 0) for post in posts_data)
-                likes_total = sum(post.get('likes', 0) for post in posts_data)
-                shares_total = sum(post.get('shares', 0) for post in posts_data)
-                comments_total = sum(post.get('comments', 0) for post in posts_data)
+            if summary is not None:
+                response = ApiResponse(200, data=summary)
+            elif planned is not None and progress is not None:
+                # Requested before this action ran, so there is no early look to push
+                response = await progress.run(
+                    planned, ack="Crunching the content metrics now. I'll have them in a moment.")
+            elif planned is not None:
+                response = await planned
+            elif progress is not None:
+                response = await progress.run(
+                    get_api_client().aggregate("/social-posts", progressive_content_metrics(progress), params=params,
+                                               fields=POST_METRIC_FIELDS),
+                    ack="Crunching the content metrics now. I'll share an early look while the rest is counted."
+                )
+            else:
+                # Stream the social posts and aggregate metrics in a single pass
+                response = await get_api_client().aggregate(
+                    "/social-posts",
+                    aggregate_content_metrics,
+                    params=params,
+                    budget=get_budget(self.name()),
+                    fields=POST_METRIC_FIELDS
+                )
+            
+            if response.status_code == 200:
+                metrics = response.json()
+                total_posts = metrics['total_posts']
+                engagement_total = metrics['engagement_total']
                 
                 # Format response for user
                 message = f"Content metrics "
@@ -291,32 +572,40 @@ class ActionGetContentMetrics(Action):
                     message += f"during {timeframe} "
                 
                 message += f":\n\n"
-                message += f"- Total posts: {len(posts_data)}\n"
+                message += f"- Total posts: {total_posts}\n"
                 message += f"- Total engagement: {engagement_total}\n"
-                message += f"- Likes: {likes_total}\n"
-                message += f"- Shares: {shares_total}\n"
-                message += f"- Comments: {comments_total}\n"
+                message += f"- Likes: {metrics['likes_total']}\n"
+                message += f"- Shares: {metrics['shares_total']}\n"
+                message += f"- Comments: {metrics['comments_total']}\n"
                 
-                if len(posts_data) > 0:
-                    message += f"\nAverage engagement per post: {engagement_total / len(posts_data):.2f}"
+                if total_posts > 0:
+                    message += f"\nAverage engagement per post: {engagement_total / total_posts:.2f}"
+                    message += (f"\nEngagement per post (p50/p90/p99): {metrics['engagement_p50']:.0f} / "
+                                f"{metrics['engagement_p90']:.0f} / {metrics['engagement_p99']:.0f}")
+                if response.stale:
+                    message += STALE_NOTE
                 
                 dispatcher.utter_message(text=message)
             else:
                 dispatcher.utter_message(text="I couldn't retrieve content metrics at this time. Please try again later.")
                 
+        except BudgetExceeded:
+            dispatcher.utter_message(text="Content metrics are still loading. Please ask me again in a moment.")
         except Exception as e:
             dispatcher.utter_message(text=f"I encountered an error analyzing content metrics: {str(e)}")
         
         return []
 
 
+@instrumented
+@admitted
 class ActionGenerateKpiReport(Action):
     def name(self) -> Text:
         return "action_generate_kpi_report"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots for report customization
         date_range = tracker.get_slot('date_range')
@@ -340,30 +629,32 @@ class ActionGenerateKpiReport(Action):
             if metric_type:
                 params['metrics'] = metric_type
             
+            if REPORT_JOBS_ENABLED:
+                # Render in the background and deliver the link through a reminder
+                job = get_report_jobs().submit(tracker.sender_id, "/reports/generate", params, details={
+                    'kind': 'kpi',
+                    'format': format,
+                    'date_range': date_range,
+                    'metric_type': metric_type
+                })
+                dispatcher.utter_message(text=REPORT_MESSAGES['kpi']['preparing'])
+                return [report_status_reminder(job.job_id)]
+            
             # Make API request to generate report
-            response = requests.post(
-                f"{API_BASE_URL}/reports/generate",
+            response = await get_budget(self.name()).run(get_api_client().post(
+                "/reports/generate",
                 json=params
-            )
+            ))
             
             if response.status_code == 200:
                 report_data = response.json()
                 report_url = report_data.get('report_url')
-                
-                if report_url:
-                    message = f"Your KPI report has been generated! You can download it here: {report_url}"
-                    if format:
-                        message += f"\nFormat: {format.upper()}"
-                    if date_range:
-                        message += f"\nTime period: {date_range}"
-                    if metric_type:
-                        message += f"\nMetrics included: {metric_type}"
-                    
-                    dispatcher.utter_message(text=message)
-                else:
-                    dispatcher.utter_message(text="Your report has been generated and is available in the Reports section of the dashboard.")
+                dispatcher.utter_message(text=report_ready_message('kpi', report_url, format, date_range, metric_type))
             else:
-                dispatcher.utter_message(text="I couldn't generate the KPI report at this time. Please try again later or check the Reports section in the dashboard.")
+                dispatcher.utter_message(text=REPORT_MESSAGES['kpi']['failed'])
+        
+        except BudgetExceeded:
+            dispatcher.utter_message(text=REPORT_MESSAGES['kpi']['slow'])
         
         except Exception as e:
             logger.error(f"Error generating KPI report: {str(e)}")
@@ -372,13 +663,15 @@ class ActionGenerateKpiReport(Action):
         return []
 
 
+@instrumented
+@admitted
 class ActionSetKeywordAlert(Action):
     def name(self) -> Text:
         return "action_set_keyword_alert"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         keyword = tracker.get_slot('keyword')
@@ -404,9 +697,22 @@ class ActionSetKeywordAlert(Action):
             else:
                 params['alertThreshold'] = 5  # Default threshold
             
+            # Several keywords at once ("track pricing; outage; hiring")
+            keywords = collect_values(tracker, 'keyword')
+            if len(keywords) > 1:
+                results = await post_many("/keywords", keywords, [dict(params, word=word) for word in keywords])
+                message = summarize_results(results, "Alerts set", "I couldn't set alerts for")
+                if any(result.ok for result in results):
+                    message += f"\nYou'll be notified when mentions exceed {params['alertThreshold']} occurrences."
+                    if category:
+                        message += f"\nCategory: {category}"
+                    message += "\nYou can manage your alerts in the Settings section."
+                dispatcher.utter_message(text=message)
+                return []
+            
             # Make API request to create keyword alert
-            response = requests.post(
-                f"{API_BASE_URL}/keywords",
+            response = await get_api_client().post(
+                "/keywords",
                 json=params
             )
             
@@ -432,13 +738,15 @@ class ActionSetKeywordAlert(Action):
         return []
 
 
+@instrumented
+@admitted
 class ActionAddJournalistContact(Action):
     def name(self) -> Text:
         return "action_add_journalist_contact"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         journalist_name = tracker.get_slot('journalist_name')
@@ -462,9 +770,30 @@ class ActionAddJournalistContact(Action):
             if email:
                 params['email'] = email
             
+            # Several journalists at once, e.g. a pasted list from the same outlet;
+            # emails are only matched up when there is one per journalist
+            names = collect_values(tracker, 'journalist_name')
+            if len(names) > 1:
+                emails = collect_values(tracker, 'email')
+                records = []
+                for index, name in enumerate(names):
+                    record = dict(params, name=name)
+                    record.pop('email', None)
+                    if len(emails) == len(names):
+                        record['email'] = emails[index]
+                    records.append(record)
+                results = await post_many("/journalists", names, records)
+                message = summarize_results(results, "Added journalists", "I couldn't add")
+                if any(result.ok for result in results):
+                    if journalist_source:
+                        message += f"\nOrganization: {journalist_source}"
+                    message += "\nYou can view and manage journalist contacts in the Media Center section."
+                dispatcher.utter_message(text=message)
+                return []
+            
             # Make API request to create journalist contact
-            response = requests.post(
-                f"{API_BASE_URL}/journalists",
+            response = await get_api_client().post(
+                "/journalists",
                 json=params
             )
             
@@ -489,13 +818,15 @@ class ActionAddJournalistContact(Action):
         return []
 
 
+@instrumented
+@admitted
 class ActionPublishSocialPost(Action):
     def name(self) -> Text:
         return "action_publish_social_post"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         post_content = tracker.get_slot('post_content')
@@ -517,9 +848,14 @@ class ActionPublishSocialPost(Action):
                 'status': 'published'
             }
             
+            if WRITE_BEHIND_ENABLED:
+                get_outbox().enqueue(tracker.sender_id, "/social-posts", params)
+                dispatcher.utter_message(text=f"Your post to {platform} is queued and will be published in a moment.\nYou can view and manage your posts in the Social Media dashboard.")
+                return []
+            
             # Make API request to create social post
-            response = requests.post(
-                f"{API_BASE_URL}/social-posts",
+            response = await get_api_client().post(
+                "/social-posts",
                 json=params
             )
             
@@ -540,13 +876,15 @@ class ActionPublishSocialPost(Action):
         return []
 
 
+@instrumented
+@admitted
 class ActionScheduleSocialPost(Action):
     def name(self) -> Text:
         return "action_schedule_social_post"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots
         post_content = tracker.get_slot('post_content')
@@ -580,9 +918,20 @@ class ActionScheduleSocialPost(Action):
                 'scheduledFor': schedule_datetime
             }
             
+            if WRITE_BEHIND_ENABLED:
+                get_outbox().enqueue(tracker.sender_id, "/social-posts", params)
+                message = f"Your post for {platform} is queued for scheduling."
+                if date_range and post_schedule_time:
+                    message += f"\nScheduled for: {date_range} at {post_schedule_time}"
+                elif date_range:
+                    message += f"\nScheduled for: {date_range}"
+                message += "\nYou can view and manage your scheduled posts in the Social Media dashboard."
+                dispatcher.utter_message(text=message)
+                return []
+            
             # Make API request to create scheduled social post
-            response = requests.post(
-                f"{API_BASE_URL}/social-posts",
+            response = await get_api_client().post(
+                "/social-posts",
                 json=params
             )
             
@@ -609,13 +958,15 @@ class ActionScheduleSocialPost(Action):
         return []
 
 
+@instrumented
+@admitted
 class ActionCustomizeReport(Action):
     def name(self) -> Text:
         return "action_customize_report"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker,
-            domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
         
         # Get slots for report customization
         report_type = tracker.get_slot('report_type') or "performance"
@@ -640,32 +991,73 @@ class ActionCustomizeReport(Action):
             if metric_type:
                 params['metrics'] = metric_type
             
+            if REPORT_JOBS_ENABLED:
+                # Render in the background and deliver the link through a reminder
+                job = get_report_jobs().submit(tracker.sender_id, "/reports/customize", params, details={
+                    'kind': 'custom',
+                    'format': format,
+                    'date_range': date_range,
+                    'metric_type': metric_type
+                })
+                dispatcher.utter_message(text=REPORT_MESSAGES['custom']['preparing'])
+                return [report_status_reminder(job.job_id)]
+            
             # Make API request to customize report
-            response = requests.post(
-                f"{API_BASE_URL}/reports/customize",
+            response = await get_budget(self.name()).run(get_api_client().post(
+                "/reports/customize",
                 json=params
-            )
+            ))
             
             if response.status_code == 200:
                 report_data = response.json()
                 report_url = report_data.get('report_url')
-                
-                if report_url:
-                    message = f"Your custom report has been generated! You can download it here: {report_url}"
-                    message += f"\nFormat: {format.upper()}"
-                    if date_range:
-                        message += f"\nTime period: {date_range}"
-                    if metric_type:
-                        message += f"\nMetrics included: {metric_type}"
-                    
-                    dispatcher.utter_message(text=message)
-                else:
-                    dispatcher.utter_message(text="Your custom report has been created and is available in the Reports section of the dashboard.")
+                dispatcher.utter_message(text=report_ready_message('custom', report_url, format, date_range, metric_type))
             else:
-                dispatcher.utter_message(text="I couldn't customize the report at this time. Please try again later or use the Reports section in the dashboard to create a custom report.")
+                dispatcher.utter_message(text=REPORT_MESSAGES['custom']['failed'])
+        
+        except BudgetExceeded:
+            dispatcher.utter_message(text=REPORT_MESSAGES['custom']['slow'])
         
         except Exception as e:
             logger.error(f"Error customizing report: {str(e)}")
             dispatcher.utter_message(text="I encountered an error while customizing your report. Please try again later or use the Reports section to create one manually.")
         
-        return []
\ No newline at end of file
+        return []
+
+
+@instrumented
+@admitted
+class ActionCheckReportStatus(Action):
+    def name(self) -> Text:
+        return "action_check_report_status"
+
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker,
+                  domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        
+        # Triggered by the reminder scheduled when a report job was submitted
+        job_id = next(tracker.get_latest_entity_values('report_job_id'), None) or tracker.get_slot('report_job_id')
+        job = get_report_jobs().get(job_id)
+        
+        if job is None:
+            dispatcher.utter_message(text="I lost track of your report, but it may still be available in the Reports section of the dashboard.")
+            return []
+        
+        if job.status == PENDING:
+            # Not ready yet - check again later without bothering the user
+            return [report_status_reminder(job.job_id)]
+        
+        kind = job.details.get('kind', 'kpi')
+        if job.status == DONE:
+            dispatcher.utter_message(text=report_ready_message(
+                kind,
+                job.report_url,
+                job.details.get('format'),
+                job.details.get('date_range'),
+                job.details.get('metric_type')
+            ))
+        else:
+            logger.error(f"Report job {job.job_id} failed: {job.error}")
+            dispatcher.utter_message(text=REPORT_MESSAGES[kind]['failed'])
+        
+        return []
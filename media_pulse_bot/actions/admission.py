@@ -0,0 +1,224 @@
+"""Admission control: per-action concurrency limits and per-sender rate limits
+
+Every action has a gate that lets a fixed number of runs through at a time
+and keeps a short, bounded queue behind it. A run that finds the queue full,
+or waits in it for too long, is shed with a "try again" reply. Every sender
+also draws from a token bucket, so one noisy user or integration cannot
+monopolize the server. Slow actions such as report generation get small
+gates and cost more tokens, so interactive actions keep their latency.
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Text
+
+from actions import config
+from actions.metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = "rate_limited"
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+SHED_MESSAGES = {
+    RATE_LIMITED: "You're sending requests a little too quickly. Please wait a few seconds and try again.",
+    QUEUE_FULL: "I'm handling a lot of requests right now. Please try again in a moment.",
+    QUEUE_TIMEOUT: "I'm handling a lot of requests right now. Please try again in a moment.",
+}
+
+ADMISSION_SHED = REGISTRY.register(Counter(
+    "mediapulse_admission_shed_total", "Action runs turned away by admission control", ["action", "reason"]))
+
+
+class ConcurrencyGate:
+    """Lets limit runs of one action through at a time, queueing at most queue_size more"""
+
+    def __init__(self, name: Text, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[Text]:
+        """Take a slot, waiting in the queue if needed; returns why the run was shed, or None"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_size:
+            return QUEUE_FULL
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the first waiter
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            return QUEUE_TIMEOUT
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        return None
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class SenderRateLimiter:
+    """Token bucket per sender, refilled at rate tokens per second up to burst
+
+    Only the most recently seen max_senders buckets are kept; a sender whose
+    bucket was dropped starts again with a full one.
+    """
+
+    def __init__(self, rate: float, burst: float, max_senders: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_senders = max_senders
+        self._buckets: "OrderedDict[Text, TokenBucket]" = OrderedDict()
+
+    def allow(self, sender_id: Text, cost: float = 1) -> bool:
+        if cost <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(sender_id)
+        if bucket is None:
+            bucket = self._buckets[sender_id] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_senders:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(sender_id)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens < cost:
+            return False
+        bucket.tokens -= cost
+        return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionController:
+    def __init__(self,
+                 concurrency: Dict[Text, int] = config.ADMISSION_CONCURRENCY,
+                 default_concurrency: int = config.ADMISSION_CONCURRENCY_DEFAULT,
+                 queue_size: int = config.ADMISSION_QUEUE_SIZE,
+                 queue_timeout: float = config.ADMISSION_QUEUE_TIMEOUT,
+                 costs: Dict[Text, float] = config.RATE_LIMIT_COSTS):
+        self.concurrency = concurrency
+        self.default_concurrency = default_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.costs = costs
+        self.limiter = SenderRateLimiter(config.RATE_LIMIT_PER_SECOND, config.RATE_LIMIT_BURST,
+                                         config.RATE_LIMIT_MAX_SENDERS)
+        self.gates: Dict[Text, ConcurrencyGate] = {}
+
+    def gate(self, action_name: Text) -> ConcurrencyGate:
+        gate = self.gates.get(action_name)
+        if gate is None:
+            limit = self.concurrency.get(action_name, self.default_concurrency)
+            gate = self.gates[action_name] = ConcurrencyGate(action_name, limit, self.queue_size,
+                                                             self.queue_timeout)
+        return gate
+
+    async def admit(self, action_name: Text, sender_id: Text) -> Optional[Text]:
+        """Admit a run or return why it was shed; an admitted run must call release()"""
+        if not self.limiter.allow(sender_id, self.costs.get(action_name, 1)):
+            reason = RATE_LIMITED
+        else:
+            reason = await self.gate(action_name).acquire()
+        if reason is not None:
+            ADMISSION_SHED.inc(action_name, reason)
+            logger.warning(f"Shed {action_name} for {sender_id}: {reason}")
+        return reason
+
+    def release(self, action_name: Text) -> None:
+        self.gate(action_name).release()
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller, creating it on first use"""
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
+
+
+def admitted(action_class):
+    """Class decorator running an action only once admission control lets it through
+
+    A shed run answers with a short message and no events. Does nothing
+    unless ADMISSION_ENABLED is set.
+    """
+    if not config.ADMISSION_ENABLED:
+        return action_class
+    run = action_class.run
+
+    @functools.wraps(run)
+    async def admitted_run(self, dispatcher, tracker, domain):
+        name = self.name()
+        admission = get_admission()
+        reason = await admission.admit(name, tracker.sender_id)
+        if reason is not None:
+            dispatcher.utter_message(text=SHED_MESSAGES[reason])
+            return []
+        try:
+            return await run(self, dispatcher, tracker, domain)
+        finally:
+            admission.release(name)
+
+    action_class.run = admitted_run
+    return action_class
+
+
+def _collect_admission_stats():
+    if _admission is None:
+        return
+    gates = list(_admission.gates.items())
+    for name, gate in gates:
+        yield ("mediapulse_admission_in_flight", "gauge", "Action runs holding a concurrency slot",
+               {"action": name}, gate.active)
+    for name, gate in gates:
+        yield ("mediapulse_admission_queue_depth", "gauge", "Action runs waiting for a concurrency slot",
+               {"action": name}, gate.queued)
+    yield ("mediapulse_rate_limit_senders", "gauge", "Senders with a tracked token bucket", {},
+           len(_admission.limiter))
+
+
+REGISTRY.add_collector(_collect_admission_stats)
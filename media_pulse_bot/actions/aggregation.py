@@ -0,0 +1,128 @@
+"""Single-pass, bounded-memory aggregation of API result sets"""
+import math
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Text, Tuple
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch with a relative accuracy guarantee
+
+    Values are counted in buckets whose width grows geometrically, so memory is
+    bounded by the number of buckets rather than the number of values. When
+    max_buckets is exceeded the lowest buckets are merged, which only degrades
+    accuracy for the smallest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self._buckets: Dict[int, int] = {}
+        self._zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self._zero_count += 1
+            return
+
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        indexes = sorted(self._buckets)
+        lowest, target = indexes[0], indexes[1]
+        self._buckets[target] += self._buckets.pop(lowest)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self._buckets) / (self.gamma + 1)
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def post_metrics(post: Dict[Text, Any]) -> Tuple[float, float, float, float]:
+    """(engagement, likes, shares, comments) of a post
+
+    Engagement is either a number next to likes/shares/comments, or (as stored
+    by the MediaPulse API) an object holding those three counts, in which case
+    it is their sum.
+    """
+    engagement = post.get('engagement', 0)
+    if isinstance(engagement, dict):
+        likes = _number(engagement.get('likes', 0))
+        shares = _number(engagement.get('shares', 0))
+        comments = _number(engagement.get('comments', 0))
+        return likes + shares + comments, likes, shares, comments
+    return (_number(engagement), _number(post.get('likes', 0)),
+            _number(post.get('shares', 0)), _number(post.get('comments', 0)))
+
+
+class ContentMetricsAggregator:
+    """Accumulates post totals and engagement percentiles in one pass"""
+
+    def __init__(self):
+        self.posts = 0
+        self.engagement = 0
+        self.likes = 0
+        self.shares = 0
+        self.comments = 0
+        self.engagement_sketch = QuantileSketch()
+
+    def add(self, post: Dict[Text, Any]) -> None:
+        engagement, likes, shares, comments = post_metrics(post)
+        self.posts += 1
+        self.engagement += engagement
+        self.likes += likes
+        self.shares += shares
+        self.comments += comments
+        self.engagement_sketch.add(engagement)
+
+    def summary(self) -> Dict[Text, Any]:
+        return {
+            'total_posts': self.posts,
+            'engagement_total': self.engagement,
+            'likes_total': self.likes,
+            'shares_total': self.shares,
+            'comments_total': self.comments,
+            'engagement_p50': self.engagement_sketch.quantile(0.50),
+            'engagement_p90': self.engagement_sketch.quantile(0.90),
+            'engagement_p99': self.engagement_sketch.quantile(0.99),
+        }
+
+
+async def aggregate_content_metrics(posts: AsyncIterator[Dict[Text, Any]]) -> Dict[Text, Any]:
+    """Reduce a stream of social posts to the content metrics summary"""
+    aggregator = ContentMetricsAggregator()
+    async for post in posts:
+        if isinstance(post, dict):
+            aggregator.add(post)
+    return aggregator.summary()
+
+
+def summarize_content_metrics(posts: Iterable[Any]) -> Dict[Text, Any]:
+    """The content metrics summary of posts that are already in memory"""
+    aggregator = ContentMetricsAggregator()
+    for post in posts:
+        if isinstance(post, dict):
+            aggregator.add(post)
+    return aggregator.summary()
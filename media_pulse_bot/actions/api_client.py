@@ -0,0 +1,405 @@
+"""Shared, connection-pooled async client for the MediaPulse API"""
+import asyncio
+import copy
+import json
+import logging
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Text, Tuple
+
+from actions import config
+from actions.budgets import LatencyBudget, LatencyWindow, hedged
+from actions.cache import ResponseCache, make_cache_key
+from actions.circuit_breaker import CLOSED, CircuitBreaker, get_breaker
+from actions.decoding import Projection, loads
+from actions.metrics import (API_ERRORS, API_REQUEST_SECONDS, API_RESPONSE_BYTES, CACHE_LOOKUPS, REGISTRY,
+                             endpoint_label)
+from actions.prefetch import PrefetchTracker
+from actions.singleflight import SingleFlight
+from actions.streaming import iter_json_array, read_json_page
+
+if TYPE_CHECKING:
+    # Imported when the first session is opened, so it stays off the startup path
+    import aiohttp
+
+# Reduces a stream of decoded JSON array items to a single result
+Reducer = Callable[[AsyncIterator[Any]], Awaitable[Any]]
+
+logger = logging.getLogger(__name__)
+
+
+def query_key(method: Text, path: Text, params: Optional[Dict[Text, Any]] = None,
+              json: Optional[Any] = None, fields: Optional[Projection] = None) -> Tuple:
+    """The cache key of ApiClient.query"""
+    key = make_cache_key(method, path, params if json is None else json)
+    return key if fields is None else key + (fields.key,)
+
+
+def page_key(path: Text, limit: int, params: Optional[Dict[Text, Any]] = None,
+             fields: Optional[Projection] = None) -> Tuple:
+    """The cache key of ApiClient.fetch_page"""
+    key = make_cache_key("GET", path, params) + (f"page:{limit}",)
+    return key if fields is None else key + (fields.key,)
+
+
+def aggregate_key(path: Text, reducer: Reducer, params: Optional[Dict[Text, Any]] = None,
+                  fields: Optional[Projection] = None) -> Tuple:
+    """The cache key of ApiClient.aggregate"""
+    key = make_cache_key("GET", path, params) + (reducer.__name__,)
+    return key if fields is None else key + (fields.key,)
+
+
+class ApiResponse:
+    """A fully read API response, detached from its pooled connection
+
+    Responses produced by a streaming reducer carry the reduced value as their
+    decoded data instead of a body. With a projection only those fields of the
+    decoded body are kept.
+    """
+
+    def __init__(self, status_code: int, body: bytes = b"",
+                 headers: Optional[Dict[Text, Text]] = None,
+                 data: Any = None, size: Optional[int] = None,
+                 projection: Optional[Projection] = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.size = len(body) if size is None else size
+        # Set when the response was served from an expired cache entry
+        self.stale = False
+        self.projection = projection
+        self._data = data
+        self._decoded = data is not None
+
+    def json(self) -> Any:
+        # Decoded once, so cached responses are not re-parsed on every hit
+        if not self._decoded:
+            self._data = loads(self.body, self.projection) if self.body else None
+            self._decoded = True
+        return self._data
+
+    def as_stale(self) -> "ApiResponse":
+        response = copy.copy(self)
+        response.stale = True
+        return response
+
+
+class ApiClient:
+    """Async HTTP client that shares one keep-alive connection pool across all actions"""
+
+    def __init__(self,
+                 base_url: Text = config.API_BASE_URL,
+                 pool_size: int = config.HTTP_POOL_SIZE,
+                 pool_per_host: int = config.HTTP_POOL_PER_HOST,
+                 keepalive_timeout: float = config.HTTP_KEEPALIVE_TIMEOUT,
+                 cache: Optional[ResponseCache] = None,
+                 prefetches: Optional[PrefetchTracker] = None):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.inflight = SingleFlight()
+        # Recent latency per endpoint, used to decide when to hedge GETs
+        self.latency: Dict[Text, LatencyWindow] = {}
+        self.hedges = 0
+        self.prefetches = prefetches
+        # Strong references to running prefetches so they are not garbage collected
+        self._background: Set[asyncio.Task] = set()
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # The session is bound to the event loop it was created on, so it is
+        # built lazily inside the action server's loop and rebuilt if that changes
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.HTTP_REQUEST_TIMEOUT),
+            )
+            self._loop = loop
+            logger.info(f"Opened API connection pool (size={self.pool_size}, per_host={self.pool_per_host})")
+        return self._session
+
+    async def _send(self, method: Text, path: Text,
+                    params: Optional[Dict[Text, Any]] = None,
+                    json: Optional[Any] = None,
+                    reader: Optional[Callable[["aiohttp.ClientResponse"], Awaitable[ApiResponse]]] = None,
+                    headers: Optional[Dict[Text, Text]] = None) -> ApiResponse:
+        breaker = get_breaker(path) if config.BREAKER_ENABLED else None
+        if breaker is not None and not breaker.allow():
+            # Fail fast: callers treat this like any other unavailable response
+            API_ERRORS.inc(endpoint_label(path), "circuit_open")
+            return ApiResponse(503)
+
+        window = self.latency.get(path)
+        if (method == "GET" and config.HEDGE_ENABLED and window is not None
+                and len(window) >= config.HEDGE_MIN_SAMPLES
+                and (breaker is None or breaker.state == CLOSED)):
+            delay = max(window.percentile(config.HEDGE_PERCENTILE), config.HEDGE_MIN_DELAY)
+            return await hedged(lambda: self._attempt(method, path, params, json, reader, breaker, headers), delay,
+                                on_hedge=self._count_hedge)
+        return await self._attempt(method, path, params, json, reader, breaker, headers)
+
+    def _count_hedge(self) -> None:
+        self.hedges += 1
+
+    async def _attempt(self, method: Text, path: Text,
+                       params: Optional[Dict[Text, Any]],
+                       json: Optional[Any],
+                       reader: Optional[Callable[["aiohttp.ClientResponse"], Awaitable[ApiResponse]]],
+                       breaker: Optional[CircuitBreaker] = None,
+                       headers: Optional[Dict[Text, Text]] = None) -> ApiResponse:
+        session = self._get_session()
+        endpoint = endpoint_label(path)
+        started = time.monotonic()
+        failed = None
+        try:
+            async with session.request(method, f"{self.base_url}{path}", params=params, json=json,
+                                       headers=headers) as response:
+                if reader is None or response.status != 200:
+                    body = await response.read()
+                    result = ApiResponse(response.status, body, response.headers)
+                    received = len(body)
+                else:
+                    result = await reader(response)
+                    received = response.content.total_bytes
+            failed = result.status_code >= 500 or result.status_code == 429
+            if failed:
+                API_ERRORS.inc(endpoint, str(result.status_code))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failed = True
+            API_ERRORS.inc(endpoint, type(e).__name__)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            if breaker is not None:
+                breaker.record(failed, elapsed)
+
+        API_REQUEST_SECONDS.observe(elapsed, endpoint, method)
+        API_RESPONSE_BYTES.observe(received, endpoint)
+        if not failed:
+            self.latency.setdefault(path, LatencyWindow()).record(elapsed)
+        return result
+
+    async def request(self, method: Text, path: Text,
+                      params: Optional[Dict[Text, Any]] = None,
+                      json: Optional[Any] = None,
+                      headers: Optional[Dict[Text, Text]] = None) -> ApiResponse:
+        return await self._send(method, path, params=params, json=json, headers=headers)
+
+    async def query(self, method: Text, path: Text,
+                    params: Optional[Dict[Text, Any]] = None,
+                    json: Optional[Any] = None,
+                    budget: Optional[LatencyBudget] = None,
+                    fields: Optional[Projection] = None) -> ApiResponse:
+        """Run a read-only request, answering from the response cache when possible
+
+        Concurrent identical queries are coalesced into a single backend request.
+        With a budget, a query that runs over it is answered from stale cache or
+        raises BudgetExceeded while the request finishes in the background.
+        With fields the body is decoded whole and only those fields are kept.
+        """
+        key = query_key(method, path, params, json, fields)
+        if fields is None:
+            return await self._read(key, lambda: self.request(method, path, params=params, json=json), budget)
+
+        async def fetch() -> ApiResponse:
+            response = await self.request(method, path, params=params, json=json)
+            response.projection = fields
+            return response
+
+        return await self._read(key, fetch, budget)
+
+    async def stream(self, path: Text, reducer: Reducer,
+                     params: Optional[Dict[Text, Any]] = None,
+                     fields: Optional[Projection] = None) -> ApiResponse:
+        """GET a JSON array and feed its items to reducer as they arrive, bypassing the cache
+
+        For consumers that keep their own state, such as the local post index.
+        With fields the items keep only those fields.
+        """
+        async def read(response: "aiohttp.ClientResponse") -> ApiResponse:
+            data = await reducer(iter_json_array(response.content.iter_chunked(config.STREAM_CHUNK_SIZE), fields))
+            return ApiResponse(response.status, headers=response.headers, data=data, size=0)
+
+        return await self._send("GET", path, params=params, reader=read)
+
+    async def aggregate(self, path: Text, reducer: Reducer,
+                        params: Optional[Dict[Text, Any]] = None,
+                        budget: Optional[LatencyBudget] = None,
+                        prefetch: bool = False,
+                        fields: Optional[Projection] = None) -> Optional[ApiResponse]:
+        """GET a JSON array and stream its items through reducer without buffering the body
+
+        The reduced value is returned as the response data and is cached and
+        coalesced like any other read query. With prefetch the query only warms
+        the cache in the background and None is returned. With fields the
+        reducer only sees those fields of each item.
+        """
+        async def read(response: "aiohttp.ClientResponse") -> ApiResponse:
+            data = await reducer(iter_json_array(response.content.iter_chunked(config.STREAM_CHUNK_SIZE), fields))
+            return ApiResponse(response.status, headers=response.headers, data=data,
+                               size=len(json.dumps(data, default=str)))
+
+        key = aggregate_key(path, reducer, params, fields)
+        return await self._read(key, lambda: self._send("GET", path, params=params, reader=read), budget, prefetch)
+
+    async def fetch_page(self, path: Text, limit: int,
+                         params: Optional[Dict[Text, Any]] = None,
+                         budget: Optional[LatencyBudget] = None,
+                         prefetch: bool = False,
+                         fields: Optional[Projection] = None) -> Optional[ApiResponse]:
+        """GET the first limit items of a list endpoint plus the total match count
+
+        The response data is {"items": [...], "total": int or None, "has_more": bool}.
+        If the server ignores limit/offset the body is streamed and the
+        connection is dropped as soon as enough items have arrived. With
+        prefetch the page is only warmed in the background and None is returned.
+        With fields the items keep only those fields.
+        """
+        page_params = dict(params or {}, limit=limit, offset=0)
+
+        async def read(response: "aiohttp.ClientResponse") -> ApiResponse:
+            total = response.headers.get("X-Total-Count")
+            data = await read_json_page(response.content.iter_chunked(config.STREAM_CHUNK_SIZE), limit,
+                                        int(total) if total and total.isdigit() else None, fields)
+            return ApiResponse(response.status, headers=response.headers, data=data,
+                               size=len(json.dumps(data, default=str)))
+
+        key = page_key(path, limit, params, fields)
+        return await self._read(key, lambda: self._send("GET", path, params=page_params, reader=read), budget,
+                                prefetch)
+
+    async def _read(self, key, fetch: Callable[[], Awaitable[ApiResponse]],
+                    budget: Optional[LatencyBudget] = None, prefetch: bool = False) -> Optional[ApiResponse]:
+        if prefetch:
+            self._prefetch(key, fetch)
+            return None
+
+        endpoint = endpoint_label(key[1])
+        if self.prefetches is not None:
+            self.prefetches.claim(key)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                CACHE_LOOKUPS.inc(endpoint, "hit")
+                return cached
+            CACHE_LOOKUPS.inc(endpoint, "miss")
+
+        return await self.settle(key, self.inflight.do(key, lambda: self._fetch(key, fetch)), budget)
+
+    async def settle(self, key, call: Awaitable[ApiResponse],
+                     budget: Optional[LatencyBudget] = None) -> ApiResponse:
+        """Await a read that is already on its way, such as a planned query
+
+        Runs it against the budget and falls back to stale cache under key
+        exactly as any other read does.
+        """
+        if budget is None:
+            response = await call
+        else:
+            response = await budget.run(call, fallback=lambda: self._stale(key))
+
+        # An unavailable backend (or an open circuit) is better answered from stale cache
+        if response.status_code >= 500:
+            response = self._stale(key) or response
+        if response.stale:
+            CACHE_LOOKUPS.inc(endpoint_label(key[1]), "stale")
+        return response
+
+    def _stale(self, key) -> Optional[ApiResponse]:
+        stale = self.cache.get_stale(key) if self.cache is not None else None
+        return stale.as_stale() if stale is not None else None
+
+    async def _fetch(self, key, fetch: Callable[[], Awaitable[ApiResponse]],
+                     ttl: Optional[float] = None) -> ApiResponse:
+        response = await fetch()
+        if self.cache is not None and response.status_code == 200:
+            self.cache.set(key, response, response.size, ttl)
+        return response
+
+    def _prefetch(self, key, fetch: Callable[[], Awaitable[ApiResponse]]) -> None:
+        if self.cache is None or self.prefetches is None:
+            return
+        if key in self.cache:
+            self.prefetches.skipped += 1
+            return
+        if not self.prefetches.mark(key):
+            return
+        # Short-lived entry: a prefetch is only a guess at the next question
+        ttl = min(self.prefetches.ttl, self.cache.ttl_for(key[1]))
+        task = asyncio.get_running_loop().create_task(
+            self.inflight.do(key, lambda: self._fetch(key, fetch, ttl)))
+        self._background.add(task)
+        task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Prefetch failed: {task.exception()}")
+
+    async def get(self, path: Text, params: Optional[Dict[Text, Any]] = None) -> ApiResponse:
+        return await self.request("GET", path, params=params)
+
+    async def post(self, path: Text, json: Optional[Any] = None,
+                   headers: Optional[Dict[Text, Text]] = None) -> ApiResponse:
+        response = await self.request("POST", path, json=json, headers=headers)
+        # Writes make cached reads of the same endpoint stale
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        return response
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_client: Optional[ApiClient] = None
+
+
+def get_api_client() -> ApiClient:
+    """Return the process-wide API client, creating it on first use"""
+    global _client
+    if _client is None:
+        _client = ApiClient(
+            cache=ResponseCache() if config.CACHE_ENABLED else None,
+            prefetches=PrefetchTracker() if config.PREFETCH_ENABLED and config.CACHE_ENABLED else None,
+        )
+        logger.info(f"Using API base URL: {_client.base_url}")
+    return _client
+
+
+def _collect_client_stats():
+    if _client is None:
+        return
+    if _client.cache is not None:
+        stats = _client.cache.stats()
+        yield ("mediapulse_cache_entries", "gauge", "Entries in the response cache", {}, stats["entries"])
+        yield ("mediapulse_cache_bytes", "gauge", "Bytes held by the response cache", {}, stats["bytes"])
+        yield ("mediapulse_cache_evictions_total", "counter", "Response cache LRU evictions", {}, stats["evictions"])
+    inflight = _client.inflight.stats()
+    yield ("mediapulse_singleflight_executed_total", "counter",
+           "Read queries sent to the backend", {}, inflight["executed"])
+    yield ("mediapulse_singleflight_coalesced_total", "counter",
+           "Read queries that joined an identical in-flight request", {}, inflight["coalesced"])
+    yield ("mediapulse_api_hedged_requests_total", "counter", "Hedge requests sent for slow GETs", {}, _client.hedges)
+    if _client.prefetches is not None:
+        for outcome, count in _client.prefetches.stats().items():
+            if outcome != "outstanding":
+                yield ("mediapulse_prefetch_total", "counter", "Speculative prefetches by outcome",
+                       {"outcome": outcome}, count)
+
+
+REGISTRY.add_collector(_collect_client_stats)
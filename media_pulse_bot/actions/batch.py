@@ -0,0 +1,140 @@
+"""Batched writes for requests that name several keywords or journalists"""
+import asyncio
+import logging
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Text
+
+from rasa_sdk import Tracker
+
+from actions import config
+from actions.api_client import ApiResponse, get_api_client
+
+logger = logging.getLogger(__name__)
+
+# The list separator of a pasted value; commas and "and" belong to the items,
+# as in "Acme, Inc." or "research and development"
+_SEPARATORS = re.compile(r"\s*[;\n؛]\s*")
+
+# Status codes meaning the endpoint does not take a JSON array
+_NO_BULK_STATUS = {400, 404, 405, 415, 422}
+
+# Endpoints found not to accept arrays; they are fanned out from then on
+_no_bulk: Set[Text] = set()
+
+
+class WriteResult(NamedTuple):
+    item: Text
+    ok: bool
+    data: Optional[Dict[Text, Any]] = None
+    error: Optional[Text] = None
+
+
+def split_values(value: Any) -> List[Text]:
+    """Split a slot value like "a; b; c" (or a list of them) into unique items
+
+    Items of a list, from repeated entities or a list slot, are taken as they
+    are. A single text is split on semicolons and line breaks only, so
+    "Acme, Inc." stays one keyword.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        items = _SEPARATORS.split(value)
+    else:
+        items = [str(item) for item in value]
+    items = [item.strip().strip("\"'").strip() for item in items]
+
+    seen: Set[Text] = set()
+    unique = []
+    for item in items:
+        if item and item.lower() not in seen:
+            seen.add(item.lower())
+            unique.append(item)
+    return unique
+
+
+def collect_values(tracker: Tracker, name: Text) -> List[Text]:
+    """All values the user gave for a slot, from repeated entities or a pasted list"""
+    entities = list(tracker.get_latest_entity_values(name))
+    return split_values(entities if len(entities) > 1 else tracker.get_slot(name))
+
+
+def _error(response: ApiResponse) -> Text:
+    return f"HTTP {response.status_code}"
+
+
+def _bulk_results(items: List[Text], response: ApiResponse) -> List[WriteResult]:
+    """Match a bulk response's per-record entries back to the submitted items"""
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict):
+        body = next((body[key] for key in ('results', 'items', 'data') if isinstance(body.get(key), list)), None)
+    if not isinstance(body, list) or len(body) != len(items):
+        return [WriteResult(item, True) for item in items]
+
+    results = []
+    for item, entry in zip(items, body):
+        entry = entry if isinstance(entry, dict) else {}
+        status = entry.get('status')
+        failed = bool(entry.get('error')) or (isinstance(status, int) and status >= 400)
+        results.append(WriteResult(item, not failed, entry,
+                                   str(entry.get('error') or f"HTTP {status}") if failed else None))
+    return results
+
+
+async def _post_one(path: Text, item: Text, record: Dict[Text, Any], semaphore: asyncio.Semaphore) -> WriteResult:
+    async with semaphore:
+        try:
+            response = await get_api_client().post(path, json=record)
+        except Exception as e:
+            logger.error(f"Error posting {item!r} to {path}: {str(e)}")
+            return WriteResult(item, False, error=type(e).__name__)
+    if response.status_code in (200, 201):
+        return WriteResult(item, True, response.json())
+    return WriteResult(item, False, error=_error(response))
+
+
+async def _post_chunk(path: Text, items: List[Text], records: List[Dict[Text, Any]],
+                      semaphore: asyncio.Semaphore) -> List[WriteResult]:
+    if len(records) > 1 and config.BULK_WRITES_ENABLED and path not in _no_bulk:
+        async with semaphore:
+            response = await get_api_client().post(path, json=records)
+        if response.status_code in (200, 201, 207):
+            return _bulk_results(items, response)
+        if response.status_code not in _NO_BULK_STATUS:
+            return [WriteResult(item, False, error=_error(response)) for item in items]
+        logger.info(f"{path} does not accept bulk writes (HTTP {response.status_code}), fanning out instead")
+        _no_bulk.add(path)
+    return list(await asyncio.gather(*(
+        _post_one(path, item, record, semaphore) for item, record in zip(items, records)
+    )))
+
+
+async def post_many(path: Text, items: Iterable[Text], records: Iterable[Dict[Text, Any]]) -> List[WriteResult]:
+    """Create several records, in as few round trips as the endpoint allows
+
+    Records are sent as JSON arrays of up to BULK_WRITE_MAX_ITEMS; an endpoint
+    that rejects arrays gets one POST per record instead, at most
+    BULK_WRITE_CONCURRENCY at a time. Results come back in input order.
+    """
+    items, records = list(items), list(records)
+    size = max(1, config.BULK_WRITE_MAX_ITEMS)
+    semaphore = asyncio.Semaphore(max(1, config.BULK_WRITE_CONCURRENCY))
+    chunks = await asyncio.gather(*(
+        _post_chunk(path, items[i:i + size], records[i:i + size], semaphore) for i in range(0, len(items), size)
+    ))
+    return [result for chunk in chunks for result in chunk]
+
+
+def summarize_results(results: List[WriteResult], done: Text, failed: Text) -> Text:
+    """One reply for a batch: what succeeded, then what failed and why"""
+    succeeded = [result.item for result in results if result.ok]
+    errors = [result for result in results if not result.ok]
+    lines = []
+    if succeeded:
+        lines.append(f"{done} ({len(succeeded)} of {len(results)}): {', '.join(succeeded)}.")
+    if errors:
+        lines.append(f"{failed} ({len(errors)}): " + ", ".join(f"{result.item} ({result.error})" for result in errors) + ".")
+    return "\n".join(lines)
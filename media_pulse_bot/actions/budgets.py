@@ -0,0 +1,131 @@
+"""Per-action latency budgets and hedged requests"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Text
+
+from actions import config
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceeded(Exception):
+    """Raised when an action's latency budget runs out with no degraded answer"""
+
+    def __init__(self, budget: "LatencyBudget"):
+        super().__init__(f"{budget.name} exceeded its {budget.seconds:.2f}s latency budget")
+        self.budget = budget
+
+
+def _consume_result(task: asyncio.Future) -> None:
+    # Background work that outlived its budget may still fail; nobody awaits it
+    if not task.cancelled():
+        task.exception()
+
+
+class LatencyBudget:
+    """The time an action may spend waiting on the backend before degrading"""
+
+    def __init__(self, name: Text, seconds: float):
+        self.name = name
+        self.seconds = seconds
+        self.breaches = 0
+
+    async def run(self, awaitable: Awaitable[Any],
+                  fallback: Optional[Callable[[], Optional[Any]]] = None) -> Any:
+        """Await the call within the budget, falling back once it runs out
+
+        The call itself is not cancelled: it keeps running in the background so
+        its result can still fill the cache for the next question.
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.seconds)
+        except asyncio.TimeoutError:
+            self.breaches += 1
+            task.add_done_callback(_consume_result)
+            logger.warning(f"{self.name} exceeded its {self.seconds:.2f}s latency budget")
+
+            degraded = fallback() if fallback is not None else None
+            if degraded is not None:
+                return degraded
+            raise BudgetExceeded(self)
+
+
+_budgets: Dict[Text, LatencyBudget] = {}
+
+
+def get_budget(action_name: Text) -> LatencyBudget:
+    """Return the latency budget configured for an action"""
+    budget = _budgets.get(action_name)
+    if budget is None:
+        budget = LatencyBudget(action_name, config.ACTION_BUDGETS.get(action_name, config.ACTION_BUDGET_DEFAULT))
+        _budgets[action_name] = budget
+    return budget
+
+
+def budget_breaches() -> Dict[Text, int]:
+    return {name: budget.breaches for name, budget in _budgets.items()}
+
+
+def _collect_budget_stats():
+    for name, budget in list(_budgets.items()):
+        yield ("mediapulse_budget_breaches_total", "counter", "Actions that ran out of latency budget",
+               {"action": name}, budget.breaches)
+
+
+REGISTRY.add_collector(_collect_budget_stats)
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies used to pick the hedging delay"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._percentile: Optional[float] = None
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._percentile = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def samples(self) -> List[float]:
+        return list(self._samples)
+
+    def percentile(self, q: float) -> float:
+        if self._percentile is None:
+            ordered = sorted(self._samples)
+            self._percentile = ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+        return self._percentile
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], delay: float,
+                 on_hedge: Optional[Callable[[], None]] = None) -> Any:
+    """Run call, starting a second identical call if the first takes longer than delay
+
+    Whichever finishes first successfully wins and the other is cancelled.
+    Only safe for idempotent requests.
+    """
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        if on_hedge is not None:
+            on_hedge()
+        pending.add(asyncio.ensure_future(call()))
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in pending:
+            task.cancel()
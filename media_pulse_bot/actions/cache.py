@@ -0,0 +1,173 @@
+"""Bounded TTL + LRU cache for read-only API queries"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Text, Tuple
+
+from actions import config
+
+
+def normalize_params(params: Optional[Dict[Text, Any]]) -> Tuple[Tuple[Text, Any], ...]:
+    """Turn request parameters into a hashable, order- and case-insensitive tuple"""
+    if not params:
+        return ()
+
+    normalized = []
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        elif isinstance(value, (list, tuple)):
+            value = tuple(sorted(" ".join(str(v).lower().split()) for v in value))
+        elif isinstance(value, dict):
+            value = normalize_params(value)
+        normalized.append((key, value))
+    return tuple(sorted(normalized))
+
+
+def make_cache_key(method: Text, path: Text, params: Optional[Dict[Text, Any]] = None) -> Tuple:
+    return (method.upper(), path, normalize_params(params))
+
+
+class ResponseCache:
+    """LRU cache with per-endpoint TTLs, bounded by entry count and total byte size"""
+
+    def __init__(self,
+                 max_entries: int = config.CACHE_MAX_ENTRIES,
+                 max_bytes: int = config.CACHE_MAX_BYTES,
+                 default_ttl: float = config.CACHE_DEFAULT_TTL,
+                 ttls: Optional[Dict[Text, float]] = None,
+                 stale_ttl: float = config.CACHE_STALE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(config.CACHE_TTLS if ttls is None else ttls)
+        self.stale_ttl = stale_ttl
+        # key -> (expires_at, size, value), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def ttl_for(self, path: Text) -> float:
+        for prefix, ttl in self.ttls.items():
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, size, value = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                # Expired entries linger for stale_ttl as a degraded fallback
+                if expires_at + self.stale_ttl <= now:
+                    self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Return an entry even if it has expired, as long as it is within stale_ttl"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+                return None
+            self.stale_hits += 1
+            return entry[2]
+
+    def set(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.ttl_for(key[1]) if isinstance(key, tuple) and len(key) > 1 else self.default_ttl
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def snapshot(self) -> List[Tuple[Hashable, float, int, Any]]:
+        """Entries not yet past their stale window as (key, seconds until expiry, size, value), oldest first"""
+        with self._lock:
+            now = time.monotonic()
+            return [(key, expires_at - now, size, value)
+                    for key, (expires_at, size, value) in self._entries.items()
+                    if expires_at + self.stale_ttl > now]
+
+    def restore(self, entries: Iterable[Tuple[Hashable, float, int, Any]]) -> int:
+        """Add snapshot entries behind the live ones; returns how many were added
+
+        Keys already cached and entries past their stale window are skipped.
+        """
+        added = 0
+        with self._lock:
+            now = time.monotonic()
+            # Newest first, each moved to the least recently used end
+            for key, expires_in, size, value in reversed(list(entries)):
+                if key in self._entries or expires_in + self.stale_ttl <= 0 or size > self.max_bytes:
+                    continue
+                self._entries[key] = (now + expires_in, size, value)
+                self._entries.move_to_end(key, last=False)
+                self._bytes += size
+                added += 1
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+                # Restored entries are the least recently used, so they go first
+                added -= 1
+        return added
+
+    def invalidate(self, path_prefix: Optional[Text] = None) -> None:
+        """Drop every entry, or only those whose endpoint starts with path_prefix"""
+        with self._lock:
+            for key in list(self._entries):
+                if path_prefix is None or (isinstance(key, tuple) and str(key[1]).startswith(path_prefix)):
+                    self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[Text, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_hits": self.stale_hits,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Fresh entries only; unlike get() this does not touch the LRU order or counters
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
@@ -0,0 +1,137 @@
+"""Circuit breakers that fail fast while an API endpoint family is unhealthy"""
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Text, Tuple
+
+from actions import config
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Trips on a high error or slow-call rate over the last calls, then probes to recover
+
+    While open every call is rejected without touching the network. After
+    open_seconds a limited number of probe calls are let through; one success
+    closes the circuit again and one failure re-opens it.
+    """
+
+    def __init__(self, name: Text,
+                 window: int = config.BREAKER_WINDOW,
+                 min_calls: int = config.BREAKER_MIN_CALLS,
+                 error_rate: float = config.BREAKER_ERROR_RATE,
+                 slow_call_seconds: float = config.BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = config.BREAKER_SLOW_CALL_RATE,
+                 open_seconds: float = config.BREAKER_OPEN_SECONDS,
+                 half_open_probes: int = config.BREAKER_HALF_OPEN_PROBES):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        # (failed, slow) for the most recent calls
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; reserves a probe slot when half-open"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"Circuit for {self.name} is half-open, probing")
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, failed: Optional[bool], seconds: float = 0.0) -> None:
+        """Record a call outcome; failed=None means the call was abandoned"""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if failed is None:
+                return
+            if failed or seconds >= self.slow_call_seconds:
+                self._open()
+            else:
+                self._close()
+            return
+
+        if self.state == OPEN or failed is None:
+            return
+
+        self._calls.append((failed, seconds >= self.slow_call_seconds))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for call_failed, _ in self._calls if call_failed)
+        slow = sum(1 for _, call_slow in self._calls if call_slow)
+        if failures / len(self._calls) >= self.error_rate or slow / len(self._calls) >= self.slow_call_rate:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(f"Circuit for {self.name} opened; failing fast for {self.open_seconds:g}s")
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._calls.clear()
+        logger.info(f"Circuit for {self.name} closed")
+
+
+_breakers: Dict[Text, CircuitBreaker] = {}
+
+
+def endpoint_family(path: Text) -> Text:
+    """Map an API path such as /reports/jobs/123 to its family, /reports"""
+    return "/" + path.lstrip("/").split("/", 1)[0]
+
+
+def get_breaker(path: Text) -> CircuitBreaker:
+    """Return the shared circuit breaker for the endpoint family of path"""
+    family = endpoint_family(path)
+    breaker = _breakers.get(family)
+    if breaker is None:
+        breaker = CircuitBreaker(family)
+        _breakers[family] = breaker
+    return breaker
+
+
+def breaker_states() -> Dict[Text, Dict[Text, object]]:
+    return {
+        family: {"state": breaker.state, "trips": breaker.trips, "rejected": breaker.rejected}
+        for family, breaker in _breakers.items()
+    }
+
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _collect_breaker_stats():
+    for family, breaker in list(_breakers.items()):
+        labels = {"family": family}
+        yield ("mediapulse_circuit_state", "gauge", "Circuit state (0 closed, 1 half-open, 2 open)",
+               labels, _STATE_VALUES[breaker.state])
+        yield ("mediapulse_circuit_trips_total", "counter", "Times the circuit opened", labels, breaker.trips)
+        yield ("mediapulse_circuit_rejected_total", "counter", "Calls rejected while open", labels, breaker.rejected)
+
+
+REGISTRY.add_collector(_collect_breaker_stats)
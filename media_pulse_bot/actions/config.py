@@ -0,0 +1,186 @@
+"""Environment-driven settings for the MediaPulse action server"""
+import os
+
+# Base URL for the API - use environment variable or default
+# In production environments, the server runs on port 8080
+API_PORT = os.environ.get("API_PORT", "8080" if os.environ.get("NODE_ENV") == "production" else "5000")
+API_HOST = os.environ.get("API_HOST", "localhost")
+API_BASE_URL = f"http://{API_HOST}:{API_PORT}/api"
+
+# Shared connection pool used for every call to the API
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "100"))
+HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", "50"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Hard ceiling on any single API call, including writes
+HTTP_REQUEST_TIMEOUT = float(os.environ.get("HTTP_REQUEST_TIMEOUT", "10"))
+
+# In-process cache for read-only API queries
+CACHE_ENABLED = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_DEFAULT_TTL = float(os.environ.get("CACHE_DEFAULT_TTL", "60"))
+# How long past expiry an entry may still be served as a degraded answer
+CACHE_STALE_TTL = float(os.environ.get("CACHE_STALE_TTL", "600"))
+
+# Per-endpoint TTLs in seconds, matched by path prefix
+CACHE_TTLS = {
+    "/nlp/analyze-sentiment": float(os.environ.get("CACHE_TTL_SENTIMENT", "300")),
+    "/press-releases": float(os.environ.get("CACHE_TTL_PRESS_RELEASES", "120")),
+    "/social-posts": float(os.environ.get("CACHE_TTL_SOCIAL_POSTS", "60")),
+}
+
+# Read size for streamed (incrementally parsed) API responses
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", str(64 * 1024)))
+
+# Number of press releases fetched for media coverage highlights
+MEDIA_COVERAGE_PAGE_SIZE = int(os.environ.get("MEDIA_COVERAGE_PAGE_SIZE", "3"))
+
+# Background report generation: submit, acknowledge, then deliver via reminder
+REPORT_JOBS_ENABLED = os.environ.get("REPORT_JOBS_ENABLED", "true").lower() == "true"
+REPORT_JOB_POLL_INTERVAL = float(os.environ.get("REPORT_JOB_POLL_INTERVAL", "2"))
+REPORT_JOB_TIMEOUT = float(os.environ.get("REPORT_JOB_TIMEOUT", "600"))
+REPORT_JOB_RETENTION = float(os.environ.get("REPORT_JOB_RETENTION", "3600"))
+REPORT_REMINDER_DELAY = float(os.environ.get("REPORT_REMINDER_DELAY", "5"))
+
+# Per-action latency budgets in seconds; past the budget an action answers
+# from stale cache or says results are loading instead of waiting
+ACTION_BUDGET_DEFAULT = float(os.environ.get("ACTION_BUDGET_DEFAULT", "2"))
+ACTION_BUDGETS = {
+    "action_get_sentiment_analysis": float(os.environ.get("ACTION_BUDGET_SENTIMENT", "0.8")),
+    "action_get_media_coverage": float(os.environ.get("ACTION_BUDGET_MEDIA_COVERAGE", "1.5")),
+    "action_get_content_metrics": float(os.environ.get("ACTION_BUDGET_CONTENT_METRICS", "2")),
+    "action_generate_kpi_report": float(os.environ.get("ACTION_BUDGET_REPORTS", "3")),
+    "action_customize_report": float(os.environ.get("ACTION_BUDGET_REPORTS", "3")),
+    # Reading and scoring posts locally once the sentiment service has failed
+    "sentiment_fallback": float(os.environ.get("ACTION_BUDGET_SENTIMENT_FALLBACK", "1.5")),
+}
+
+# Hedged GETs: a second identical request is sent once the first has taken
+# longer than the endpoint's recent p95 latency
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.05"))
+
+# Circuit breakers per endpoint family (/nlp, /social-posts, /reports, ...)
+BREAKER_ENABLED = os.environ.get("BREAKER_ENABLED", "true").lower() == "true"
+BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.environ.get("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("BREAKER_SLOW_CALL_SECONDS", "3"))
+BREAKER_SLOW_CALL_RATE = float(os.environ.get("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("BREAKER_OPEN_SECONDS", "15"))
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get("BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Instrumentation: sampling profiler for the slowest action runs (0 disables)
+PROFILE_SLOWEST_N = int(os.environ.get("PROFILE_SLOWEST_N", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+
+# Batched writes: list-valued keyword/journalist requests are sent as one JSON
+# array per BULK_WRITE_MAX_ITEMS records, or fanned out with bounded
+# concurrency when the endpoint does not accept arrays
+BULK_WRITES_ENABLED = os.environ.get("BULK_WRITES_ENABLED", "true").lower() == "true"
+BULK_WRITE_MAX_ITEMS = int(os.environ.get("BULK_WRITE_MAX_ITEMS", "50"))
+BULK_WRITE_CONCURRENCY = int(os.environ.get("BULK_WRITE_CONCURRENCY", "5"))
+
+# Write-behind mode for publishing/scheduling social posts: the action queues
+# the POST in a local SQLite file and replies at once; a background task sends
+# it with retries and an Idempotency-Key header
+WRITE_BEHIND_ENABLED = os.environ.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_PATH = os.environ.get("WRITE_BEHIND_PATH", "outbox.sqlite3")
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+WRITE_BEHIND_RETRY_BASE = float(os.environ.get("WRITE_BEHIND_RETRY_BASE", "1"))
+WRITE_BEHIND_RETRY_MAX = float(os.environ.get("WRITE_BEHIND_RETRY_MAX", "300"))
+WRITE_BEHIND_POLL_INTERVAL = float(os.environ.get("WRITE_BEHIND_POLL_INTERVAL", "5"))
+WRITE_BEHIND_RETENTION = float(os.environ.get("WRITE_BEHIND_RETENTION", "86400"))
+
+# Speculative prefetch: after a sentiment question, warm the coverage and
+# content metrics results for the same slots into the cache for PREFETCH_TTL
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_TTL = float(os.environ.get("PREFETCH_TTL", "30"))
+
+# Local columnar index of social post metrics, rebuilt from a full sync of
+# /social-posts every POST_INDEX_REFRESH_INTERVAL seconds and capped in memory
+POST_INDEX_ENABLED = os.environ.get("POST_INDEX_ENABLED", "false").lower() == "true"
+POST_INDEX_MAX_BYTES = int(os.environ.get("POST_INDEX_MAX_BYTES", str(64 * 1024 * 1024)))
+POST_INDEX_REFRESH_INTERVAL = float(os.environ.get("POST_INDEX_REFRESH_INTERVAL", "300"))
+POST_INDEX_REFRESH_TIMEOUT = float(os.environ.get("POST_INDEX_REFRESH_TIMEOUT", "0.5"))
+
+# Sentiment results shared by all action server processes on a host: a
+# content-addressed SQLite (WAL) store keyed by the normalized request
+SENTIMENT_STORE_ENABLED = os.environ.get("SENTIMENT_STORE_ENABLED", "false").lower() == "true"
+SENTIMENT_STORE_PATH = os.environ.get("SENTIMENT_STORE_PATH", "sentiment_store.sqlite3")
+SENTIMENT_STORE_TTL = float(os.environ.get("SENTIMENT_STORE_TTL", "900"))
+SENTIMENT_STORE_MAX_BYTES = int(os.environ.get("SENTIMENT_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# JSON decoder for API responses: auto picks orjson, then ujson, then the
+# standard library; naming one that is not installed falls back to json
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto").lower()
+
+# Admission control: each action runs at most N at a time with a bounded
+# wait queue, and each sender draws from a token bucket; requests over
+# either limit get a short "try again" reply instead of queueing forever
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "false").lower() == "true"
+ADMISSION_CONCURRENCY_DEFAULT = int(os.environ.get("ADMISSION_CONCURRENCY_DEFAULT", "64"))
+ADMISSION_CONCURRENCY = {
+    "action_get_content_metrics": int(os.environ.get("ADMISSION_CONCURRENCY_CONTENT_METRICS", "16")),
+    "action_generate_kpi_report": int(os.environ.get("ADMISSION_CONCURRENCY_REPORTS", "4")),
+    "action_customize_report": int(os.environ.get("ADMISSION_CONCURRENCY_REPORTS", "4")),
+}
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2"))
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "1"))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", "10"))
+# Tokens an action takes from its sender's bucket (default 1)
+RATE_LIMIT_COSTS = {
+    "action_generate_kpi_report": float(os.environ.get("RATE_LIMIT_COST_REPORTS", "5")),
+    "action_customize_report": float(os.environ.get("RATE_LIMIT_COST_REPORTS", "5")),
+    # Triggered by reminders rather than by the user
+    "action_check_report_status": 0,
+}
+RATE_LIMIT_MAX_SENDERS = int(os.environ.get("RATE_LIMIT_MAX_SENDERS", "10000"))
+
+# Startup: heavy dependencies (aiohttp, numpy) are imported on first use. With
+# ACTION_SERVER_WARM_UP the server imports them and opens WARM_UP_CONNECTIONS
+# pooled API connections (GET WARM_UP_PATH) before it starts listening
+ACTION_SERVER_WARM_UP = os.environ.get("ACTION_SERVER_WARM_UP", "false").lower() == "true"
+WARM_UP_CONNECTIONS = int(os.environ.get("WARM_UP_CONNECTIONS", "4"))
+WARM_UP_PATH = os.environ.get("WARM_UP_PATH", "/health")
+
+# Progressive replies for coverage and content metrics: an acknowledgement
+# (if the answer takes longer than PROGRESSIVE_ACK_DELAY) and early results
+# are pushed to PUSH_URL, which relays them to the chat websocket, and the
+# final totals are the action's normal reply. Needs PUSH_URL to be set
+PROGRESSIVE_RESPONSES_ENABLED = os.environ.get("PROGRESSIVE_RESPONSES_ENABLED", "false").lower() == "true"
+PUSH_URL = os.environ.get("PUSH_URL", "")
+PUSH_TIMEOUT = float(os.environ.get("PUSH_TIMEOUT", "2"))
+PROGRESSIVE_ACK_DELAY = float(os.environ.get("PROGRESSIVE_ACK_DELAY", "0.3"))
+# Posts read before content metrics pushes an early look
+PROGRESSIVE_FIRST_ITEMS = int(os.environ.get("PROGRESSIVE_FIRST_ITEMS", "200"))
+
+# Query planner: the first sentiment, coverage or metrics action of a turn
+# sends every read query the turn's slots allow at once, as one POST to
+# QUERY_PLANNER_BULK_PATH or, when that is unset or unsupported, as
+# concurrent requests; the other actions of the turn use those results
+QUERY_PLANNER_ENABLED = os.environ.get("QUERY_PLANNER_ENABLED", "false").lower() == "true"
+QUERY_PLANNER_BULK_PATH = os.environ.get("QUERY_PLANNER_BULK_PATH", "")
+# Seconds a plan waits for the rest of its turn's actions
+QUERY_PLANNER_TTL = float(os.environ.get("QUERY_PLANNER_TTL", "30"))
+QUERY_PLANNER_MAX_PLANS = int(os.environ.get("QUERY_PLANNER_MAX_PLANS", "1000"))
+
+# Local sentiment fallback: when /nlp/analyze-sentiment fails or runs out of
+# budget, the matching posts (or press releases) are scored in process against
+# an English and Arabic lexicon, reading at most SENTIMENT_FALLBACK_MAX_ITEMS
+SENTIMENT_FALLBACK_ENABLED = os.environ.get("SENTIMENT_FALLBACK_ENABLED", "false").lower() == "true"
+SENTIMENT_FALLBACK_MAX_ITEMS = int(os.environ.get("SENTIMENT_FALLBACK_MAX_ITEMS", "100000"))
+
+# Cache snapshots: the response cache, recently resolved date ranges and the
+# per-endpoint latency windows are written to CACHE_SNAPSHOT_PATH every
+# CACHE_SNAPSHOT_INTERVAL seconds and on shutdown, and reloaded on startup.
+# Entries keep their remaining TTL; latency windows older than
+# CACHE_SNAPSHOT_MAX_AGE seconds are not reloaded
+CACHE_SNAPSHOT_ENABLED = os.environ.get("CACHE_SNAPSHOT_ENABLED", "false").lower() == "true"
+CACHE_SNAPSHOT_PATH = os.environ.get("CACHE_SNAPSHOT_PATH", "cache_snapshot.json.gz")
+CACHE_SNAPSHOT_INTERVAL = float(os.environ.get("CACHE_SNAPSHOT_INTERVAL", "60"))
+CACHE_SNAPSHOT_MAX_AGE = float(os.environ.get("CACHE_SNAPSHOT_MAX_AGE", "3600"))
@@ -0,0 +1,163 @@
+"""Table-driven natural-language date range parsing"""
+import calendar
+import datetime
+import re
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Text, Tuple
+
+DateRange = Tuple[Optional[Text], Optional[Text]]
+
+# Fixed phrases, resolved relative to today
+_PHRASES: Dict[Text, Callable[[datetime.date], Tuple[datetime.date, datetime.date]]] = {
+    "today": lambda today: (today, today),
+    "yesterday": lambda today: (today - timedelta(days=1), today - timedelta(days=1)),
+    "tomorrow": lambda today: (today + timedelta(days=1), today + timedelta(days=1)),
+    "last week": lambda today: (today - timedelta(days=7), today),
+    "last month": lambda today: (today - timedelta(days=30), today),
+    "next week": lambda today: (today, today + timedelta(days=7)),
+    "this week": lambda today: (today - timedelta(days=today.weekday()),
+                                today + timedelta(days=6 - today.weekday())),
+    "this month": lambda today: (today.replace(day=1),
+                                 today.replace(day=calendar.monthrange(today.year, today.month)[1])),
+    "this year": lambda today: (datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)),
+    "last year": lambda today: (datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)),
+    "اليوم": lambda today: (today, today),
+    "أمس": lambda today: (today - timedelta(days=1), today - timedelta(days=1)),
+    "غدا": lambda today: (today + timedelta(days=1), today + timedelta(days=1)),
+    "الأسبوع الماضي": lambda today: (today - timedelta(days=7), today),
+    "الشهر الماضي": lambda today: (today - timedelta(days=30), today),
+    "هذا العام": lambda today: (datetime.date(today.year, 1, 1), datetime.date(today.year, 12, 31)),
+}
+
+_MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): index for index, name in enumerate(calendar.month_abbr) if name})
+_MONTHS["sept"] = 9
+
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30}
+
+_QUARTERS = {1: (1, 3), 2: (4, 6), 3: (7, 9), 4: (10, 12)}
+
+
+def _alternation(words) -> Text:
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_MONTH = _alternation(_MONTHS)
+_YEAR_NUMBER = r"(?:19|20)\d{2}"
+_DAY_NUMBER = r"\d{1,2}(?:st|nd|rd|th)?"
+
+# One pass over the text. A month name only counts as a date with a day or a
+# year next to it ("3 March", "May 2026"), so "what may happen today" is about
+# today. Alternatives that match at the same position are tried in the order
+# listed here; see _precedence for which match wins.
+_PATTERN = re.compile(
+    r"(?P<iso>\d{4}-\d{2}-\d{2})(?:\s*(?:to|until|through|-|–)\s*(?P<iso_end>\d{4}-\d{2}-\d{2}))?"
+    r"|\b(?:last|past)\s+(?P<count>\d+)\s+(?P<unit>day|week|month)s?\b"
+    r"|\bq(?P<quarter>[1-4])\b"
+    rf"|\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<day_month>{_MONTH})\b"
+    rf"(?:,?\s+(?P<day_year>{_YEAR_NUMBER})\b)?"
+    rf"|\b(?P<month>{_MONTH})(?=\s+{_DAY_NUMBER}\b|,?\s+{_YEAR_NUMBER}\b)"
+    rf"(?:\s+(?P<month_day>\d{{1,2}})(?:st|nd|rd|th)?\b)?(?:,?\s+(?P<month_year>{_YEAR_NUMBER})\b)?"
+    rf"|(?P<phrase>{_alternation(_PHRASES)})"
+)
+
+# The if/elif chain this parser replaced checked these in order, whatever their
+# position in the text; they keep that precedence over everything else
+_LEGACY_ORDER = ("today", "yesterday", "last week", "last month", "quarter",
+                 "this year", "next week", "tomorrow")
+
+
+def _precedence(match: "re.Match") -> Tuple[int, int]:
+    kind = "quarter" if match.group("quarter") else match.group("phrase")
+    rank = _LEGACY_ORDER.index(kind) if kind in _LEGACY_ORDER else len(_LEGACY_ORDER)
+    return rank, match.start()
+
+_YEAR = re.compile(r"\b(?P<year>(?:19|20)\d{2})\b")
+
+
+def _year(text: Text, default: int) -> int:
+    match = _YEAR.search(text)
+    return int(match.group("year")) if match else default
+
+
+@lru_cache(maxsize=1024)
+def _resolve(text: Text, today: datetime.date) -> DateRange:
+    matches = list(_PATTERN.finditer(text))
+    if not matches:
+        return None, None
+    match = min(matches, key=_precedence)
+
+    try:
+        if match.group("iso"):
+            start = datetime.date.fromisoformat(match.group("iso"))
+            end = datetime.date.fromisoformat(match.group("iso_end")) if match.group("iso_end") else start
+        elif match.group("count"):
+            start, end = today - timedelta(days=int(match.group("count")) * _UNIT_DAYS[match.group("unit")]), today
+        elif match.group("quarter"):
+            year = _year(text, today.year)
+            first_month, last_month = _QUARTERS[int(match.group("quarter"))]
+            start = datetime.date(year, first_month, 1)
+            end = datetime.date(year, last_month, calendar.monthrange(year, last_month)[1])
+        elif match.group("day"):
+            year = int(match.group("day_year") or _year(text, today.year))
+            start = end = datetime.date(year, _MONTHS[match.group("day_month")], int(match.group("day")))
+        elif match.group("month"):
+            year = int(match.group("month_year") or _year(text, today.year))
+            month = _MONTHS[match.group("month")]
+            if match.group("month_day"):
+                start = end = datetime.date(year, month, int(match.group("month_day")))
+            else:
+                start = datetime.date(year, month, 1)
+                end = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        else:
+            start, end = _PHRASES[match.group("phrase")](today)
+    except ValueError:
+        return None, None
+
+    return start.isoformat(), end.isoformat()
+
+
+def get_date_range_from_text(date_range_text: Optional[Text],
+                             today: Optional[datetime.date] = None) -> DateRange:
+    """Convert natural language date ranges to actual dates
+
+    Understands relative phrases ("yesterday", "last week", "last 14 days"),
+    quarters and months with any year ("Q1 2027", "March 2026"), days of a
+    month ("3 March", "March 3, 2026"), ISO dates and ISO ranges. Returns (start, end) as YYYY-MM-DD strings, or (None, None).
+    Results are memoized per normalized text and day.
+    """
+    if not date_range_text:
+        return None, None
+
+    normalized = " ".join(date_range_text.lower().split())
+    if today is None:
+        today = datetime.date.today()
+        _remember(normalized)
+    return _resolve(normalized, today)
+
+
+# Texts recently resolved against today's date, most recent last, for cache snapshots
+_recent: "OrderedDict[Text, None]" = OrderedDict()
+
+
+def _remember(normalized: Text) -> None:
+    _recent[normalized] = None
+    _recent.move_to_end(normalized)
+    if len(_recent) > _resolve.cache_info().maxsize:
+        _recent.popitem(last=False)
+
+
+def recent_texts() -> List[Text]:
+    """Normalized texts recently resolved against today's date, oldest first"""
+    return list(_recent)
+
+
+def warm(texts: List[Text], today: Optional[datetime.date] = None) -> int:
+    """Resolve texts into the memo for today, as if they had just been asked; returns how many"""
+    today = today or datetime.date.today()
+    for text in texts:
+        _remember(text)
+        _resolve(text, today)
+    return len(texts)
@@ -0,0 +1,92 @@
+"""Fast JSON decoding with field projection for API responses
+
+Bodies are decoded with orjson or ujson when one is installed and with the
+standard library otherwise, both for buffered responses and for the batches
+of a streamed JSON array. Actions usually read a handful of fields from
+large payloads. There is no partial parse: every item is decoded in full,
+then a Projection keeps only those fields and the rest is dropped straight
+away instead of staying referenced from the response cache or a reducer.
+"""
+import gc
+import json
+from contextlib import contextmanager
+from typing import Any, Optional, Text, Union
+
+from actions import config
+
+
+def _load_backend(name: Text):
+    if name == "orjson":
+        import orjson
+        return orjson.loads
+    if name == "ujson":
+        import ujson
+        return ujson.loads
+    return json.loads
+
+
+def _select_backend(preferred: Text):
+    candidates = ("orjson", "ujson", "json") if preferred == "auto" else (preferred, "json")
+    for name in candidates:
+        try:
+            return name, _load_backend(name)
+        except ImportError:
+            continue
+    return "json", json.loads
+
+
+BACKEND, _loads = _select_backend(config.JSON_BACKEND)
+
+# Decoding a body this large allocates enough containers to set off several
+# garbage collections, none of which can free anything (parsed JSON has no cycles)
+_GC_PAUSE_BYTES = 256 * 1024
+
+
+@contextmanager
+def _gc_paused(size: int):
+    if size < _GC_PAUSE_BYTES or not gc.isenabled():
+        yield
+        return
+    gc.disable()
+    try:
+        yield
+    finally:
+        gc.enable()
+
+
+class Projection:
+    """The fields an action reads from each object of a response
+
+    Applied to an object it keeps the listed keys that are present; applied
+    to a list it projects every object in it. Nested values of kept keys,
+    such as an engagement object, are kept whole.
+    """
+
+    def __init__(self, *fields: Text):
+        self.fields = tuple(fields)
+        # Part of the cache key, so differently projected reads never share an entry
+        self.key = "fields:" + ",".join(self.fields)
+
+    def __call__(self, value: Any) -> Any:
+        fields = self.fields
+        if isinstance(value, dict):
+            return {field: value[field] for field in fields if field in value}
+        if isinstance(value, list):
+            return [{field: item[field] for field in fields if field in item} if isinstance(item, dict) else item
+                    for item in value]
+        return value
+
+    def __repr__(self) -> Text:
+        return f"Projection{self.fields!r}"
+
+
+def loads_with(backend, body: Union[bytes, Text], projection: Optional[Projection] = None) -> Any:
+    with _gc_paused(len(body)):
+        data = backend(body)
+        return projection(data) if projection is not None else data
+
+
+def loads(body: Union[bytes, Text], projection: Optional[Projection] = None) -> Any:
+    """Decode a JSON body, optionally keeping only the projected fields"""
+    return loads_with(_loads, body, projection)
+
@@ -0,0 +1,133 @@
+"""In-process table of report generation jobs running in the background"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional, Text
+
+from actions import config
+from actions.api_client import get_api_client
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Status values the reports API uses for a job that has finished
+_FINISHED = {"done", "completed", "complete", "ready", "success"}
+_FAILED = {"failed", "error", "cancelled"}
+
+
+class ReportJob:
+    """A report request submitted on behalf of one conversation"""
+
+    def __init__(self, sender_id: Text, path: Text, params: Dict[Text, Any], details: Dict[Text, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.sender_id = sender_id
+        self.path = path
+        self.params = params
+        # Slot values needed to word the message once the report is ready
+        self.details = details
+        self.status = PENDING
+        self.report_url: Optional[Text] = None
+        self.error: Optional[Text] = None
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def expired(self) -> bool:
+        return self.status == PENDING and time.monotonic() - self.created_at > config.REPORT_JOB_TIMEOUT
+
+    def _finish(self, status: Text, report_url: Optional[Text] = None, error: Optional[Text] = None) -> None:
+        self.status = status
+        self.report_url = report_url
+        self.error = error
+        self.finished_at = time.monotonic()
+
+
+class ReportJobTable:
+    """Runs report requests off the conversation path and tracks their outcome"""
+
+    def __init__(self, retention: float = config.REPORT_JOB_RETENTION):
+        self.retention = retention
+        self._jobs: Dict[Text, ReportJob] = {}
+
+    def submit(self, sender_id: Text, path: Text, params: Dict[Text, Any],
+               details: Optional[Dict[Text, Any]] = None) -> ReportJob:
+        self._prune()
+        job = ReportJob(sender_id, path, params, details or {})
+        self._jobs[job.job_id] = job
+        job._task = asyncio.get_running_loop().create_task(self._run(job))
+        return job
+
+    def get(self, job_id: Optional[Text]) -> Optional[ReportJob]:
+        return self._jobs.get(job_id) if job_id else None
+
+    async def _run(self, job: ReportJob) -> None:
+        client = get_api_client()
+        try:
+            response = await client.post(job.path, json=job.params)
+            if response.status_code not in (200, 201, 202):
+                job._finish(FAILED, error=f"HTTP {response.status_code}")
+                return
+
+            data = response.json() or {}
+            # Reports API either renders synchronously or hands back a job to poll
+            remote_id = data.get('job_id')
+            while not data.get('report_url') and remote_id and not job.expired:
+                status = str(data.get('status', PENDING)).lower()
+                if status in _FINISHED:
+                    break
+                if status in _FAILED:
+                    job._finish(FAILED, error=data.get('error') or status)
+                    return
+                await asyncio.sleep(config.REPORT_JOB_POLL_INTERVAL)
+                response = await client.get(f"/reports/jobs/{remote_id}")
+                if response.status_code != 200:
+                    job._finish(FAILED, error=f"HTTP {response.status_code}")
+                    return
+                data = response.json() or {}
+
+            if job.expired:
+                job._finish(FAILED, error="timed out")
+            else:
+                job._finish(DONE, report_url=data.get('report_url'))
+        except Exception as e:
+            logger.error(f"Error generating report in background: {str(e)}")
+            job._finish(FAILED, error=str(e))
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.retention:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[Text, int]:
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+
+_jobs: Optional[ReportJobTable] = None
+
+
+def get_report_jobs() -> ReportJobTable:
+    """Return the process-wide report job table, creating it on first use"""
+    global _jobs
+    if _jobs is None:
+        _jobs = ReportJobTable()
+    return _jobs
+
+
+def _collect_job_stats():
+    if _jobs is None:
+        return
+    for status, count in _jobs.stats().items():
+        yield ("mediapulse_report_jobs", "gauge", "Report jobs in the job table", {"status": status}, count)
+
+
+REGISTRY.add_collector(_collect_job_stats)
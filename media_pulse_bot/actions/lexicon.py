@@ -0,0 +1,243 @@
+"""Local lexicon sentiment, for when the sentiment service cannot answer
+
+Scores post text against a compact English and Arabic lexicon and returns
+the same counts as /nlp/analyze-sentiment. The texts are split in one pass
+over the joined corpus, and each distinct word is normalized and looked up
+once, giving a sparse document-term matrix that keeps only lexicon terms, in
+coordinate form (one row and one column per entry). A
+post's score is its row of the matrix times the term weights, with a negator
+("not", "لا") flipping the sign of the term after it. Posts scoring above
+zero count as positive, below zero as negative, and the rest as neutral.
+"""
+import asyncio
+import functools
+import re
+from itertools import chain
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Text, Tuple
+
+from actions import config
+
+POSITIVE_EN = {
+    "good": 1, "great": 2, "excellent": 2, "amazing": 2, "awesome": 2, "fantastic": 2, "outstanding": 2,
+    "love": 2, "loved": 2, "loving": 2, "liked": 1, "happy": 1, "glad": 1, "pleased": 1,
+    "impressive": 2, "impressed": 2, "best": 2, "better": 1, "win": 1, "wins": 1, "success": 1,
+    "successful": 1, "proud": 1, "thanks": 1, "thank": 1, "helpful": 1, "reliable": 1, "fast": 1,
+    "easy": 1, "smooth": 1, "recommend": 1, "recommended": 1, "nice": 1, "beautiful": 1, "brilliant": 2,
+    "perfect": 2, "praise": 1, "praised": 1, "award": 1, "innovative": 1, "growth": 1,
+    "strong": 1, "supportive": 1, "trust": 1, "wonderful": 2, "exciting": 1, "excited": 1,
+    "congrats": 1, "congratulations": 1, "fixed": 1, "resolved": 1, "improved": 1, "improvement": 1,
+}
+NEGATIVE_EN = {
+    "bad": 1, "terrible": 2, "awful": 2, "horrible": 2, "worst": 2, "worse": 1, "poor": 1, "hate": 2,
+    "hated": 2, "angry": 2, "upset": 1, "sad": 1, "disappointed": 2, "disappointing": 2, "fail": 1,
+    "failed": 1, "failure": 1, "broken": 1, "bug": 1, "bugs": 1, "crash": 1, "crashed": 1, "slow": 1,
+    "outage": 2, "down": 1, "delay": 1, "delayed": 1, "problem": 1, "problems": 1, "issue": 1,
+    "issues": 1, "complaint": 1, "complaints": 1, "complain": 1, "scam": 2, "fraud": 2, "useless": 2,
+    "expensive": 1, "overpriced": 1, "rude": 1, "unreliable": 1, "wrong": 1, "crisis": 2, "scandal": 2,
+    "lawsuit": 1, "refund": 1, "cancel": 1, "cancelled": 1, "annoying": 1, "frustrating": 2,
+    "frustrated": 2, "waste": 1, "misleading": 2, "layoffs": 1, "loss": 1, "losses": 1,
+}
+POSITIVE_AR = {
+    "جيد": 1, "جيده": 1, "ممتاز": 2, "ممتازه": 2, "رائع": 2, "رائعه": 2, "جميل": 1, "جميله": 1,
+    "احب": 2, "احببت": 2, "حب": 1, "سعيد": 1, "سعيده": 1, "شكرا": 1, "افضل": 2, "احسن": 1,
+    "نجاح": 1, "ناجح": 1, "مميز": 1, "مميزه": 1, "مذهل": 2, "سريع": 1, "سهل": 1, "انصح": 1,
+    "فخور": 1, "تميز": 1, "ابداع": 2, "مبدع": 2, "دعم": 1, "ثقه": 1, "تحسن": 1, "انجاز": 1,
+    "جائزه": 1, "نمو": 1, "مبروك": 1, "عظيم": 2, "رهيب": 1, "حلو": 1, "موفق": 1, "مفيد": 1,
+}
+NEGATIVE_AR = {
+    "سيء": 1, "سيئ": 1, "سيئه": 1, "سئ": 1, "رديء": 1, "فاشل": 2, "فشل": 1, "مشكله": 1, "مشاكل": 1,
+    "سوء": 1, "اسوا": 2, "غاضب": 2, "زعلان": 1, "حزين": 1, "مخيب": 2, "خيبه": 2, "بطيء": 1,
+    "تاخير": 1, "متاخر": 1, "عطل": 1, "اعطال": 1, "انقطاع": 2, "شكوى": 1, "شكاوى": 1, "نصب": 2,
+    "احتيال": 2, "غالي": 1, "كارثه": 2, "فضيحه": 2, "ازمه": 2, "خساره": 1, "مزعج": 1, "ضعيف": 1,
+    "اكره": 2, "خطا": 1, "تسريح": 1, "مقاطعه": 1, "سرقه": 2, "تعبان": 1,
+}
+NEGATORS = {
+    "not", "no", "never", "nothing", "nobody", "neither", "nor", "without", "hardly", "barely",
+    "cannot", "cant", "dont", "doesnt", "didnt", "isnt", "wasnt", "arent", "wont", "t",
+    "لا", "لم", "لن", "ليس", "ليست", "غير", "ما", "مش", "مو", "بدون",
+}
+# Arabic clitics a lexicon term can carry ("the", "and", "with", ...)
+ARABIC_PREFIXES = ("ال", "و", "وال", "ب", "بال", "ف", "فال", "ل", "لل", "ك", "كال")
+
+# Texts are joined around this token, so one split covers every post
+_SEPARATOR = "\x00"
+_WORD = re.compile(r"[^\W\d_]+")
+
+# Diacritics and tatweel removed, alef, yeh and teh marbuta variants folded
+_ARABIC_FOLD = str.maketrans(
+    {**{chr(code): None for code in range(0x064B, 0x0653)}, "ـ": None,
+     "أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي", "ة": "ه"})
+
+# A mostly positive or mostly negative set must lead the other side by this
+# share of all scored posts, otherwise the overall sentiment is neutral
+_OVERALL_MARGIN = 0.05
+
+# Fields of a post or press release whose text is scored
+TEXT_FIELDS = ('title', 'summary', 'content', 'text')
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """numpy, imported on the first scoring run rather than at startup, or None if it is missing"""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - numpy ships with rasa, but scoring has a pure Python fallback
+        return None
+    return numpy
+
+
+def normalize(text: Text) -> Text:
+    return text.lower().translate(_ARABIC_FOLD)
+
+
+class TokenMatrix(NamedTuple):
+    """Sparse document-term matrix of lexicon hits, one entry per occurrence in text order"""
+    rows: Any
+    columns: Any
+    documents: int
+
+
+class Lexicon:
+    """Term weights by matrix column; column 0 stands for every word outside the lexicon"""
+
+    def __init__(self, terms: Dict[Text, float], negators: Iterable[Text]):
+        self.columns: Dict[Text, int] = {_SEPARATOR: -1}
+        weights = [0.0]
+        negator_flags = [False]
+        for term, weight in terms.items():
+            self.columns[term] = len(weights)
+            weights.append(float(weight))
+            negator_flags.append(False)
+        for term in negators:
+            self.columns[term] = len(weights)
+            weights.append(0.0)
+            negator_flags.append(True)
+        self.weights = weights
+        self.negators = negator_flags
+        self._arrays = None
+
+    @classmethod
+    def default(cls) -> "Lexicon":
+        terms: Dict[Text, float] = {}
+        for lexicon, sign in ((POSITIVE_EN, 1), (NEGATIVE_EN, -1)):
+            for term, weight in lexicon.items():
+                terms[term] = sign * weight
+        for lexicon, sign in ((POSITIVE_AR, 1), (NEGATIVE_AR, -1)):
+            for term, weight in lexicon.items():
+                term = normalize(term)
+                for prefix in ("",) + ARABIC_PREFIXES:
+                    terms.setdefault(prefix + term, sign * weight)
+        return cls(terms, {normalize(term) for term in NEGATORS})
+
+    def _hits(self, token: Text) -> Tuple[int, ...]:
+        """Columns of the lexicon terms in one whitespace-separated token, such as "isn't" or "#great" """
+        if token == _SEPARATOR:
+            return (-1,)
+        columns = self.columns
+        return tuple(columns[word] for word in _WORD.findall(normalize(token)) if word in columns)
+
+    def term_ids(self, texts: List[Text]) -> List[int]:
+        """Columns of the lexicon terms in the texts, in order, with -1 between two texts"""
+        if any(_SEPARATOR in text for text in texts):
+            texts = [text.replace(_SEPARATOR, " ") for text in texts]
+        tokens = f" {_SEPARATOR} ".join(texts).split()
+        # Real text repeats a small vocabulary, so each distinct token is normalized only once
+        hits = {token: self._hits(token) for token in set(tokens)}
+        return list(chain.from_iterable(map(hits.__getitem__, tokens)))
+
+    def matrix(self, np, texts: List[Text]) -> TokenMatrix:
+        ids = np.array(self.term_ids(texts), dtype=np.int32)
+        rows = np.cumsum(ids == -1, dtype=np.int32)
+        hits = ids > 0
+        return TokenMatrix(rows[hits], ids[hits], len(texts))
+
+    def scores(self, texts: List[Text]) -> List[float]:
+        if not texts:
+            return []
+        np = _numpy()
+        if np is not None:
+            return self._scores_numpy(np, texts).tolist()
+        return self._scores_python(texts)
+
+    def label_counts(self, texts: List[Text]) -> Tuple[int, int, int]:
+        """Number of positive, negative and neutral texts"""
+        np = _numpy()
+        if np is not None and texts:
+            scores = self._scores_numpy(np, texts)
+            positive, negative = int(np.count_nonzero(scores > 0)), int(np.count_nonzero(scores < 0))
+        else:
+            scores = self._scores_python(texts)
+            positive, negative = sum(1 for score in scores if score > 0), sum(1 for score in scores if score < 0)
+        return positive, negative, len(texts) - positive - negative
+
+    def _scores_numpy(self, np, texts: List[Text]):
+        if self._arrays is None:
+            self._arrays = (np.array(self.weights, dtype=np.float64), np.array(self.negators, dtype=bool))
+        weights, negators = self._arrays
+        matrix = self.matrix(np, texts)
+        term_weights = weights[matrix.columns]
+        negated = np.zeros(len(term_weights), dtype=bool)
+        negated[1:] = negators[matrix.columns[:-1]] & (matrix.rows[1:] == matrix.rows[:-1])
+        term_weights[negated] *= -1
+        return np.bincount(matrix.rows, weights=term_weights, minlength=matrix.documents)
+
+    def _scores_python(self, texts: List[Text]) -> List[float]:
+        scores = [0.0] * len(texts)
+        row = 0
+        negate = False
+        weights, negators = self.weights, self.negators
+        for column in self.term_ids(texts):
+            if column == -1:
+                row += 1
+                negate = False
+            elif column:
+                scores[row] += -weights[column] if negate else weights[column]
+                negate = negators[column]
+        return scores
+
+
+@functools.lru_cache(maxsize=None)
+def get_lexicon() -> Lexicon:
+    return Lexicon.default()
+
+
+def overall_sentiment(positive: int, negative: int, neutral: int) -> Text:
+    margin = _OVERALL_MARGIN * (positive + negative + neutral)
+    if positive - negative > margin:
+        return "positive"
+    if negative - positive > margin:
+        return "negative"
+    return "neutral"
+
+
+def score_texts(texts: List[Text], lexicon: Optional[Lexicon] = None) -> Dict[Text, Any]:
+    """Sentiment counts of texts, in the shape /nlp/analyze-sentiment answers with"""
+    positive, negative, neutral = (lexicon or get_lexicon()).label_counts(texts)
+    return {
+        'overall_sentiment': overall_sentiment(positive, negative, neutral),
+        'positive_count': positive,
+        'negative_count': negative,
+        'neutral_count': neutral,
+    }
+
+
+def item_text(item: Any) -> Text:
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return " ".join(item[field] for field in TEXT_FIELDS if isinstance(item.get(field), str))
+    return ""
+
+
+async def lexicon_sentiment(items: AsyncIterator[Any]) -> Dict[Text, Any]:
+    """Reduce a stream of posts or press releases to their lexicon sentiment counts
+
+    Reads at most SENTIMENT_FALLBACK_MAX_ITEMS items. Scoring runs in a
+    worker thread so the event loop keeps serving other conversations.
+    """
+    texts = []
+    async for item in items:
+        texts.append(item_text(item))
+        if len(texts) >= config.SENTIMENT_FALLBACK_MAX_ITEMS:
+            break
+    return await asyncio.get_running_loop().run_in_executor(None, score_texts, texts)
@@ -0,0 +1,159 @@
+"""In-process latency histograms and counters, rendered in Prometheus text format"""
+import bisect
+import functools
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Text, Tuple
+
+from actions.profiler import get_profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# A collector yields (name, type, help, labels, value) samples when scraped
+Sample = Tuple[Text, Text, Text, Dict[Text, Any], float]
+
+
+def _format_labels(labelnames: Sequence[Text], values: Sequence[Any], extra: Text = "") -> Text:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: Text, help: Text, labelnames: Sequence[Text] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: Any) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: Text, help: Text, labelnames: Sequence[Text] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: Any) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[Text]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative:g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]:g}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative:g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Add a callback whose samples are gathered at scrape time"""
+        self._collectors.append(collector)
+
+    def render(self) -> Text:
+        lines: List[Text] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        described = set()
+        for collector in self._collectors:
+            for name, kind, help, labels, value in collector():
+                if name not in described:
+                    lines.append(f"# HELP {name} {help}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ACTION_RUN_SECONDS = REGISTRY.register(Histogram(
+    "mediapulse_action_run_seconds", "Wall time of Action.run", ["action"]))
+ACTION_ERRORS = REGISTRY.register(Counter(
+    "mediapulse_action_errors_total", "Exceptions raised out of Action.run", ["action"]))
+API_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "mediapulse_api_request_seconds", "Latency of calls to the MediaPulse API", ["endpoint", "method"]))
+API_RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "mediapulse_api_response_bytes", "Bytes read from MediaPulse API responses", ["endpoint"],
+    buckets=BYTES_BUCKETS))
+API_ERRORS = REGISTRY.register(Counter(
+    "mediapulse_api_errors_total", "Failed calls to the MediaPulse API", ["endpoint", "reason"]))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "mediapulse_cache_lookups_total", "Read query cache lookups by outcome", ["endpoint", "result"]))
+
+_ID_SEGMENT = re.compile(r"/[^/]*\d[^/]*")
+
+
+def endpoint_label(path: Text) -> Text:
+    """Collapse id-like path segments so /reports/jobs/ab12 becomes /reports/jobs/:id"""
+    return _ID_SEGMENT.sub("/:id", path)
+
+
+def render_metrics() -> Text:
+    return REGISTRY.render()
+
+
+def instrumented(action_class):
+    """Class decorator timing every run of an action and counting its failures"""
+    run = action_class.run
+
+    @functools.wraps(run)
+    async def timed_run(self, dispatcher, tracker, domain):
+        name = self.name()
+        profiler = get_profiler()
+        coro = run(self, dispatcher, tracker, domain)
+        token = profiler.track(name, coro) if profiler is not None else None
+        started = time.monotonic()
+        try:
+            return await coro
+        except Exception:
+            ACTION_ERRORS.inc(name)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            ACTION_RUN_SECONDS.observe(elapsed, name)
+            if token is not None:
+                profiler.finish(token, elapsed)
+
+    action_class.run = timed_run
+    return action_class
@@ -0,0 +1,219 @@
+"""Durable write-behind queue for social posts
+
+Actions enqueue the POST in a local SQLite file and acknowledge straight away;
+a background task drains the queue with retries. Every entry carries an
+idempotency key sent as the Idempotency-Key header, so a retry after a lost
+response or an action server restart does not publish the same post twice.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Text
+
+from actions import config
+from actions.api_client import get_api_client
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# 4xx answers worth retrying; any other 4xx means the post itself is rejected
+_RETRY_STATUS = {408, 425, 429}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    sender_id TEXT,
+    path TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class WriteBehindQueue:
+    """SQLite-backed queue of POSTs drained by one background task per process"""
+
+    def __init__(self, path: Text = config.WRITE_BEHIND_PATH,
+                 max_attempts: int = config.WRITE_BEHIND_MAX_ATTEMPTS,
+                 retry_base: float = config.WRITE_BEHIND_RETRY_BASE,
+                 retry_max: float = config.WRITE_BEHIND_RETRY_MAX,
+                 poll_interval: float = config.WRITE_BEHIND_POLL_INTERVAL,
+                 retention: float = config.WRITE_BEHIND_RETENTION):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Outcomes seen by this process's drainer
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def enqueue(self, sender_id: Text, path: Text, body: Dict[Text, Any]) -> Text:
+        """Durably store a POST and make sure the drainer is running; returns its idempotency key"""
+        key = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (idempotency_key, sender_id, path, body, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, sender_id, path, json.dumps(body), PENDING, now, now),
+            )
+        self.start()
+        self._wakeup.set()
+        return key
+
+    def start(self) -> None:
+        """Start draining on the running loop; entries left by a previous process are picked up too"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Lease the next due entry so another process sharing the file skips it meanwhile"""
+        now = time.time()
+        lease = now + config.HTTP_REQUEST_TIMEOUT + 5
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT id, idempotency_key, path, body, attempts, next_attempt_at FROM outbox "
+                    "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                    (PENDING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._db.execute(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND next_attempt_at = ?",
+                    (lease, row[0], row[5]),
+                ).rowcount
+                if claimed:
+                    return row
+
+    def _next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def _finish(self, entry_id: int, status: Text, error: Optional[Text] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), entry_id),
+            )
+
+    def _retry(self, entry_id: int, attempts: int, error: Text) -> None:
+        if attempts >= self.max_attempts:
+            self._finish(entry_id, FAILED, error)
+            self.failed += 1
+            logger.error(f"Giving up on queued write {entry_id} after {attempts} attempts: {error}")
+            return
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, entry_id),
+            )
+        self.retried += 1
+
+    def _prune(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE status = ? AND finished_at < ?",
+                             (SENT, time.time() - self.retention))
+
+    async def _deliver(self, row) -> None:
+        entry_id, key, path, body, attempts = row[0], row[1], row[2], row[3], row[4] + 1
+        try:
+            response = await get_api_client().post(path, json=json.loads(body), headers={"Idempotency-Key": key})
+        except Exception as e:
+            self._retry(entry_id, attempts, f"{type(e).__name__}: {e}")
+            return
+        # 409 is how an idempotent API reports a key it has already applied
+        if response.status_code < 300 or response.status_code == 409:
+            self._finish(entry_id, SENT)
+            self.sent += 1
+        elif response.status_code >= 500 or response.status_code in _RETRY_STATUS:
+            self._retry(entry_id, attempts, f"HTTP {response.status_code}")
+        else:
+            self._finish(entry_id, FAILED, f"HTTP {response.status_code}")
+            self.failed += 1
+            logger.error(f"Queued write {entry_id} to {path} was rejected with HTTP {response.status_code}")
+
+    async def _drain(self) -> None:
+        self._prune()
+        while True:
+            row = self._claim()
+            if row is not None:
+                await self._deliver(row)
+                continue
+            next_due = self._next_due()
+            timeout = self.poll_interval if next_due is None else max(0.0, min(self.poll_interval, next_due - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[Text, int]:
+        counts = {PENDING: 0, SENT: 0, FAILED: 0}
+        with self._lock:
+            for status, count in self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+                counts[status] = count
+        return counts
+
+
+_outbox: Optional[WriteBehindQueue] = None
+
+
+def get_outbox() -> WriteBehindQueue:
+    """Return the process-wide write-behind queue, opening its file on first use"""
+    global _outbox
+    if _outbox is None:
+        _outbox = WriteBehindQueue()
+    return _outbox
+
+
+def _collect_outbox_stats():
+    if _outbox is None:
+        return
+    for status, count in _outbox.stats().items():
+        yield ("mediapulse_outbox_entries", "gauge", "Entries in the write-behind queue", {"status": status}, count)
+    yield ("mediapulse_outbox_retries_total", "counter", "Queued writes retried after a failure", {}, _outbox.retried)
+
+
+REGISTRY.add_collector(_collect_outbox_stats)
@@ -0,0 +1,258 @@
+"""Query planning: the read queries of one turn, sent together
+
+A question such as "how are we doing on pricing on Twitter this month" can
+run the sentiment, media coverage and content metrics actions one after
+another, each waiting for its own request. With the planner, the first of
+them plans the read queries the turn asks for and sends them all at once: as
+one POST to a bulk query endpoint when the API has one, or as concurrent
+requests when it does not. The filters the queries have in common are sent
+only once. The other actions of the turn pick up their results from the
+plan, under the same latency budget and stale-cache fallback as a read of
+their own, so the turn waits for its slowest query instead of the sum of all
+of them.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Text, Tuple
+
+from actions import config
+from actions.api_client import ApiResponse, get_api_client
+from actions.budgets import LatencyBudget
+from actions.metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+BULK = "bulk"
+PARALLEL = "parallel"
+
+# Status codes meaning the API has no bulk query endpoint at that path
+_NO_BULK_STATUS = {400, 404, 405, 415, 422}
+
+# Bulk paths found not to be supported; plans send their queries one by one from then on
+_no_bulk: Set[Text] = set()
+
+PLANNED_QUERIES = REGISTRY.register(Counter(
+    "mediapulse_planner_queries_total", "Read queries sent by the query planner", ["query", "mode"]))
+PLANNED_RESULTS = REGISTRY.register(Counter(
+    "mediapulse_planner_results_total", "Planned query results by whether an action used them",
+    ["query", "outcome"]))
+
+
+class PlannedQuery(NamedTuple):
+    """One read query of a plan
+
+    filters names the plan filters the query takes. send runs the query on its
+    own through the API client; from_bulk turns the body of its bulk result
+    into the data the action reads; key gives the cache key send reads under,
+    so bulk results are cached and stale answers found where a read of its
+    own would find them.
+    """
+    name: Text
+    method: Text
+    path: Text
+    filters: Tuple[Text, ...]
+    send: Callable[[Dict[Text, Any]], Awaitable[ApiResponse]]
+    from_bulk: Callable[[Any], Any]
+    key: Callable[[Dict[Text, Any]], Hashable]
+    # Request options beyond the filters, such as a page size
+    options: Optional[Dict[Text, Any]] = None
+
+
+class QueryPlan:
+    """The read queries of one turn and their results as they arrive"""
+
+    def __init__(self, filters: Dict[Text, Any], queries: List[PlannedQuery]):
+        self.filters = filters
+        self.queries = {query.name: query for query in queries}
+        self.expires = time.monotonic() + config.QUERY_PLANNER_TTL
+        self._results: Dict[Text, asyncio.Future] = {}
+        self._taken: Set[Text] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, bulk_path: Text = config.QUERY_PLANNER_BULK_PATH) -> None:
+        loop = asyncio.get_running_loop()
+        self._results = {name: loop.create_future() for name in self.queries}
+        if bulk_path and bulk_path not in _no_bulk and len(self.queries) > 1:
+            self._task = loop.create_task(self._send_bulk(bulk_path))
+        else:
+            self._task = loop.create_task(self._send_each(list(self.queries.values())))
+
+    def take(self, name: Text, budget: Optional[LatencyBudget] = None) -> Optional[Awaitable[ApiResponse]]:
+        """Claim the result of a planned query; None if it was not planned or is already taken
+
+        With a budget the result is awaited like any other read: past the
+        budget it is answered from stale cache or raises BudgetExceeded, and
+        a server error is answered from stale cache when there is one.
+        """
+        future = self._results.get(name)
+        if future is None or name in self._taken:
+            return None
+        self._taken.add(name)
+        PLANNED_RESULTS.inc(name, "used")
+        query = self.queries[name]
+        # Shielded, so an action giving up on its budget leaves the query running
+        return get_api_client().settle(query.key(self._query_filters(query)), asyncio.shield(future), budget)
+
+    @property
+    def exhausted(self) -> bool:
+        return len(self._taken) == len(self._results)
+
+    def close(self) -> None:
+        """Count the results no action asked for"""
+        for name in self._results:
+            if name not in self._taken:
+                PLANNED_RESULTS.inc(name, "unused")
+        self._taken.update(self._results)
+
+    def _query_filters(self, query: PlannedQuery) -> Dict[Text, Any]:
+        return {name: self.filters[name] for name in query.filters if name in self.filters}
+
+    def _resolve(self, name: Text, response: Optional[ApiResponse] = None,
+                 error: Optional[BaseException] = None) -> None:
+        future = self._results[name]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+        # Unclaimed failures must not be reported as never retrieved
+        future.add_done_callback(_consume_result)
+
+    async def _send_one(self, query: PlannedQuery) -> None:
+        PLANNED_QUERIES.inc(query.name, PARALLEL)
+        try:
+            self._resolve(query.name, await query.send(self._query_filters(query)))
+        except asyncio.CancelledError:
+            self._results[query.name].cancel()
+            raise
+        except Exception as e:
+            self._resolve(query.name, error=e)
+
+    async def _send_each(self, queries: List[PlannedQuery]) -> None:
+        await asyncio.gather(*(self._send_one(query) for query in queries))
+
+    async def _send_bulk(self, path: Text) -> None:
+        payload = {
+            "filters": self.filters,
+            "queries": [dict({"id": query.name, "method": query.method, "path": query.path,
+                              "filters": list(query.filters)},
+                             **({"options": query.options} if query.options else {}))
+                        for query in self.queries.values()],
+        }
+        try:
+            response = await get_api_client().request("POST", path, json=payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Bulk query to {path} failed, sending queries one by one: {type(e).__name__}: {e}")
+            response = None
+        if response is not None and response.status_code in _NO_BULK_STATUS:
+            _no_bulk.add(path)
+            logger.info(f"{path} does not take bulk queries (HTTP {response.status_code}); sending them one by one")
+
+        results = _bulk_results(response) if response is not None and response.status_code == 200 else {}
+        missing = []
+        for query in self.queries.values():
+            entry = results.get(query.name)
+            # Failed entries are retried alone, so they get the client's stale-cache fallback
+            if entry is None or entry.get("status", 200) != 200:
+                missing.append(query)
+                continue
+            PLANNED_QUERIES.inc(query.name, BULK)
+            try:
+                data = query.from_bulk(entry.get("body"))
+                result = ApiResponse(200, data=data, size=len(json.dumps(data, default=str)))
+            except Exception as e:
+                self._resolve(query.name, error=e)
+                continue
+            cache = get_api_client().cache
+            if cache is not None:
+                cache.set(query.key(self._query_filters(query)), result, result.size)
+            self._resolve(query.name, result)
+        await self._send_each(missing)
+
+
+def _bulk_results(response: ApiResponse) -> Dict[Text, Dict[Text, Any]]:
+    """Per-query entries of a bulk response, keyed by query id
+
+    Accepts {"results": {"<id>": {"status", "body"}}} or a list of entries
+    that carry their own "id".
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    results = body.get("results") if isinstance(body, dict) else body
+    if isinstance(results, list):
+        results = {entry.get("id"): entry for entry in results if isinstance(entry, dict)}
+    if not isinstance(results, dict):
+        return {}
+    return {name: entry for name, entry in results.items() if isinstance(entry, dict)}
+
+
+def _consume_result(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class QueryPlanner:
+    """The plans of recent turns, so every action of a turn finds the plan its first action made"""
+
+    def __init__(self, bulk_path: Text = config.QUERY_PLANNER_BULK_PATH,
+                 max_plans: int = config.QUERY_PLANNER_MAX_PLANS):
+        self.bulk_path = bulk_path
+        self.max_plans = max_plans
+        self._plans: "OrderedDict[Hashable, QueryPlan]" = OrderedDict()
+
+    def plan(self, turn: Hashable, filters: Dict[Text, Any],
+             build: Callable[[], List[PlannedQuery]]) -> QueryPlan:
+        """Return the plan of a turn, building and starting it on first use"""
+        self._expire()
+        key = (turn, tuple(sorted(filters.items())))
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._plans[key] = QueryPlan(filters, build())
+            plan.start(self.bulk_path)
+            if len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)[1].close()
+        return plan
+
+    def _expire(self) -> None:
+        # Plans are added in order, so expired ones sit at the front
+        now = time.monotonic()
+        for key in [key for key, plan in self._plans.items() if plan.exhausted]:
+            del self._plans[key]
+        while self._plans:
+            key, plan = next(iter(self._plans.items()))
+            if plan.expires > now:
+                break
+            del self._plans[key]
+            plan.close()
+
+    def __len__(self) -> int:
+        return len(self._plans)
+
+
+_planner: Optional[QueryPlanner] = None
+
+
+def get_query_planner() -> QueryPlanner:
+    """Return the process-wide query planner, creating it on first use"""
+    global _planner
+    if _planner is None:
+        _planner = QueryPlanner()
+    return _planner
+
+
+def _collect_planner_stats():
+    if _planner is None:
+        return
+    yield ("mediapulse_planner_open_plans", "gauge", "Turn plans held by the query planner", {},
+           len(_planner))
+
+
+REGISTRY.add_collector(_collect_planner_stats)
@@ -0,0 +1,381 @@
+"""Local columnar index of social post metrics, kept in sync with /social-posts
+
+Each post is one row across typed arrays (platform dictionary-coded,
+timestamp, engagement, likes, shares, comments), plus the rows of each of
+its keywords, so a metrics question is a vectorized scan over local memory
+instead of a download of every post. A topic matches the posts that have it
+as a keyword; posts have no topic field of their own. GET /api/social-posts
+has no way to ask for changed posts only, so every refresh is a full sync
+that builds a new generation of the index. The memory cap covers both
+generations while a sync streams in: the new one evicts its oldest rows as it
+grows past the cap, and the old one is released early if the two together
+would not fit. Questions the index cannot answer meanwhile, or that reach back
+past evicted rows, are left to the API.
+"""
+import asyncio
+import datetime
+import functools
+import logging
+import time
+from array import array
+from typing import Any, AsyncIterator, Dict, List, Optional, Text
+
+from actions import config
+from actions.aggregation import post_metrics
+from actions.api_client import get_api_client
+from actions.date_parser import get_date_range_from_text
+from actions.decoding import Projection
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """numpy, imported on the first scan rather than at startup, or None if it is missing"""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - numpy ships with rasa, but the scan has a pure Python fallback
+        return None
+    return numpy
+
+
+# The fields of a post the index keeps
+INDEX_FIELDS = Projection('id', 'platform', 'keywords', 'postedAt', 'createdAt',
+                          'engagement', 'likes', 'shares', 'comments')
+
+# Rough cost of one entry in the id -> row dict, on top of the column arrays
+_ID_MAP_BYTES = 100
+
+# Posts streamed in between checks of a sync's size against the memory cap
+_CAP_CHECK_POSTS = 1000
+
+
+def _parse_timestamp(value: Any) -> float:
+    if not value:
+        return float('nan')
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return float('nan')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def _day_start(day: Text) -> float:
+    return datetime.datetime.fromisoformat(day).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _plain(value: float) -> Any:
+    # Keep whole counts as ints so replies read "120", not "120.0"
+    return int(value) if float(value).is_integer() else value
+
+
+class _Columns:
+    """Column storage for one generation of the index"""
+
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.platform = array('H')
+        self.posted_at = array('d')
+        self.engagement = array('d')
+        self.likes = array('d')
+        self.shares = array('d')
+        self.comments = array('d')
+        self.rows: Dict[Any, int] = {}
+        # Code 0 means "not set"
+        self.platform_codes: Dict[Text, int] = {'': 0}
+        # Lower-cased keyword -> rows of the posts that have it
+        self.keyword_rows: Dict[Text, array] = {}
+        # Rows older than this were evicted to honour the memory cap
+        self.evicted_before: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        columns = (self.platform, self.posted_at, self.engagement, self.likes, self.shares, self.comments,
+                   *self.keyword_rows.values())
+        return sum(column.itemsize * len(column) for column in columns) + len(self.rows) * _ID_MAP_BYTES
+
+    @staticmethod
+    def _code(codes: Dict[Text, int], value: Any) -> int:
+        key = str(value).strip().lower() if value else ''
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(codes)
+        return code
+
+    def upsert(self, post: Dict[Text, Any]) -> None:
+        post_id = post.get('id')
+        if post_id is None:
+            return
+        engagement, likes, shares, comments = post_metrics(post)
+        values = (
+            self._code(self.platform_codes, post.get('platform')),
+            _parse_timestamp(post.get('postedAt') or post.get('createdAt')),
+            engagement, likes, shares, comments,
+        )
+        columns = (self.platform, self.posted_at, self.engagement, self.likes, self.shares, self.comments)
+        row = self.rows.get(post_id)
+        if row is None:
+            row = self.rows[post_id] = len(self.ids)
+            self.ids.append(post_id)
+            for column, value in zip(columns, values):
+                column.append(value)
+        else:
+            # A post listed twice in one sync keeps the keywords of both listings
+            for column, value in zip(columns, values):
+                column[row] = value
+
+        keywords = post.get('keywords')
+        if isinstance(keywords, list):
+            for keyword in {str(keyword).strip().lower() for keyword in keywords if keyword}:
+                rows = self.keyword_rows.get(keyword)
+                if rows is None:
+                    rows = self.keyword_rows[keyword] = array('L')
+                rows.append(row)
+
+    def evict_to(self, max_bytes: int) -> int:
+        """Drop the oldest rows until the columns fit in max_bytes; returns rows dropped"""
+        if self.nbytes <= max_bytes or not self.ids:
+            return 0
+        # Aim a little below the cap so every sync does not evict again
+        keep = int(len(self.ids) * max_bytes * 0.9 / self.nbytes)
+        # Undated rows (NaN) sort as the oldest
+        order = sorted(range(len(self.ids)), reverse=True,
+                       key=lambda row: self.posted_at[row] if self.posted_at[row] == self.posted_at[row] else float('-inf'))
+        kept = sorted(order[:keep])
+        cutoff = min((self.posted_at[row] for row in kept), default=float('inf'))
+        self.evicted_before = cutoff if self.evicted_before is None else max(self.evicted_before, cutoff)
+
+        self.ids = [self.ids[row] for row in kept]
+        for name in ('platform', 'posted_at', 'engagement', 'likes', 'shares', 'comments'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[row] for row in kept)))
+        self.rows = {post_id: row for row, post_id in enumerate(self.ids)}
+        # Keywords whose posts were all evicted stay known, with no rows
+        moved = {old: new for new, old in enumerate(kept)}
+        for keyword, rows in self.keyword_rows.items():
+            self.keyword_rows[keyword] = array('L', (moved[row] for row in rows if row in moved))
+        return len(order) - len(kept)
+
+
+class PostMetricsIndex:
+    """In-memory metrics of every social post, answering content metrics questions locally"""
+
+    def __init__(self, path: Text = "/social-posts",
+                 max_bytes: int = config.POST_INDEX_MAX_BYTES,
+                 refresh_interval: float = config.POST_INDEX_REFRESH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        # None while a sync that outgrew the cap alongside it is streaming in
+        self._columns: Optional[_Columns] = _Columns()
+        self.synced_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.syncs = 0
+        self.evicted_rows = 0
+
+    def __len__(self) -> int:
+        return len(self._columns) if self._columns is not None else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._columns.nbytes if self._columns is not None else 0
+
+    async def refresh(self) -> None:
+        """Pull every post into a new generation, which replaces the current one once complete
+
+        Queries keep scanning the current generation until then, and deleted
+        posts disappear with it. Neither generation grows the index past
+        max_bytes: the new one is trimmed as it streams in, and the current one
+        is dropped early when both would not fit.
+        """
+        now = time.monotonic()
+        columns = _Columns()
+
+        def enforce_cap() -> None:
+            size = columns.nbytes
+            if size > self.max_bytes:
+                self.evicted_rows += columns.evict_to(self.max_bytes)
+                size = columns.nbytes
+            if self._columns is not None and size + self._columns.nbytes > self.max_bytes:
+                logger.info("Post index sync outgrew the memory cap alongside the current generation; "
+                            "releasing it until the sync completes")
+                self._columns = None
+
+        async def apply(posts: AsyncIterator[Any]) -> int:
+            count = 0
+            async for post in posts:
+                if isinstance(post, dict):
+                    columns.upsert(post)
+                    count += 1
+                    if count % _CAP_CHECK_POSTS == 0:
+                        enforce_cap()
+            return count
+
+        try:
+            response = await get_api_client().stream(self.path, apply, fields=INDEX_FIELDS)
+        except Exception as e:
+            logger.error(f"Error syncing the post index: {str(e)}")
+            self._sync_failed()
+            return
+        if response.status_code != 200:
+            logger.warning(f"Post index sync failed with HTTP {response.status_code}")
+            self._sync_failed()
+            return
+
+        enforce_cap()
+        self._columns = columns
+        self.synced_at = now
+        self.syncs += 1
+
+    def _sync_failed(self) -> None:
+        if self._columns is None:
+            # Nothing left to answer from; the next question starts another sync
+            self._columns = _Columns()
+            self.synced_at = None
+
+    async def ensure_fresh(self, timeout: float = config.POST_INDEX_REFRESH_TIMEOUT) -> None:
+        """Start a sync when one is due, waiting up to timeout for it
+
+        The first full sync always runs in the background; until it finishes
+        query() returns None and callers go to the API.
+        """
+        if self.synced_at is not None and time.monotonic() - self.synced_at < self.refresh_interval:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.refresh())
+        if self.synced_at is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def query(self, platform: Optional[Text] = None, topic: Optional[Text] = None,
+              timeframe: Optional[Text] = None) -> Optional[Dict[Text, Any]]:
+        """Content metrics summary for the matching posts, or None if the index cannot answer
+
+        The index declines when it has not synced yet (or released its last
+        generation to make room for a sync), the timeframe cannot be
+        resolved to dates, the topic is not a keyword of any post it has seen,
+        or the range reaches back past evicted rows.
+        """
+        columns = self._columns
+        if self.synced_at is None or columns is None:
+            return None
+
+        start = end = None
+        if timeframe:
+            start_date, end_date = get_date_range_from_text(timeframe)
+            if start_date is None:
+                return None
+            start = _day_start(start_date)
+            end = _day_start(end_date or start_date) + 86400
+        if columns.evicted_before is not None and (start is None or start < columns.evicted_before):
+            return None
+
+        topic_rows = None
+        if topic:
+            topic_rows = columns.keyword_rows.get(topic.strip().lower())
+            if topic_rows is None:
+                return None
+        platform_code = None
+        if platform:
+            # A platform with no posts at all is a legitimate zero
+            platform_code = columns.platform_codes.get(platform.strip().lower(), -1)
+
+        np = _numpy()
+        if np is not None:
+            return self._scan_numpy(np, columns, platform_code, topic_rows, start, end)
+        return self._scan_python(columns, platform_code, topic_rows, start, end)
+
+    @staticmethod
+    def _scan_numpy(np, columns: _Columns, platform_code, topic_rows, start, end) -> Dict[Text, Any]:
+        if topic_rows is not None:
+            mask = np.zeros(len(columns), dtype=bool)
+            mask[np.asarray(topic_rows, dtype=np.intp)] = True
+        else:
+            mask = np.ones(len(columns), dtype=bool)
+        if platform_code is not None:
+            mask &= np.frombuffer(columns.platform, dtype=np.uint16) == platform_code
+        if start is not None:
+            posted_at = np.frombuffer(columns.posted_at, dtype=np.float64)
+            mask &= (posted_at >= start) & (posted_at < end)
+
+        engagement = np.frombuffer(columns.engagement, dtype=np.float64)[mask]
+        totals = [float(np.frombuffer(column, dtype=np.float64)[mask].sum())
+                  for column in (columns.likes, columns.shares, columns.comments)]
+        percentiles = ([float(value) for value in np.quantile(engagement, (0.50, 0.90, 0.99), method='lower')]
+                       if len(engagement) else [None, None, None])
+        return _summary(len(engagement), float(engagement.sum()), totals, percentiles)
+
+    @staticmethod
+    def _scan_python(columns: _Columns, platform_code, topic_rows, start, end) -> Dict[Text, Any]:
+        engagement = []
+        totals = [0.0, 0.0, 0.0]
+        rows = sorted(set(topic_rows)) if topic_rows is not None else range(len(columns))
+        for row in rows:
+            if platform_code is not None and columns.platform[row] != platform_code:
+                continue
+            if start is not None and not start <= columns.posted_at[row] < end:
+                continue
+            engagement.append(columns.engagement[row])
+            totals[0] += columns.likes[row]
+            totals[1] += columns.shares[row]
+            totals[2] += columns.comments[row]
+        engagement.sort()
+        percentiles = [engagement[int(q * (len(engagement) - 1))] if engagement else None
+                       for q in (0.50, 0.90, 0.99)]
+        return _summary(len(engagement), sum(engagement), totals, percentiles)
+
+    def stats(self) -> Dict[Text, Any]:
+        return {
+            "rows": len(self),
+            "bytes": self.nbytes,
+            "syncs": self.syncs,
+            "evicted_rows": self.evicted_rows,
+        }
+
+
+def _summary(posts: int, engagement: float, totals: List[float], percentiles: List[Optional[float]]) -> Dict[Text, Any]:
+    # Same shape as ContentMetricsAggregator.summary()
+    return {
+        'total_posts': posts,
+        'engagement_total': _plain(engagement),
+        'likes_total': _plain(totals[0]),
+        'shares_total': _plain(totals[1]),
+        'comments_total': _plain(totals[2]),
+        'engagement_p50': percentiles[0],
+        'engagement_p90': percentiles[1],
+        'engagement_p99': percentiles[2],
+    }
+
+
+_index: Optional[PostMetricsIndex] = None
+
+
+def get_post_index() -> PostMetricsIndex:
+    """Return the process-wide post metrics index, creating it on first use"""
+    global _index
+    if _index is None:
+        _index = PostMetricsIndex()
+    return _index
+
+
+def _collect_index_stats():
+    if _index is None:
+        return
+    stats = _index.stats()
+    yield ("mediapulse_post_index_rows", "gauge", "Posts held in the local metrics index", {}, stats["rows"])
+    yield ("mediapulse_post_index_bytes", "gauge", "Approximate memory used by the post index", {}, stats["bytes"])
+    yield ("mediapulse_post_index_syncs_total", "counter", "Completed post index syncs", {}, stats["syncs"])
+    yield ("mediapulse_post_index_evicted_total", "counter", "Posts evicted to stay under the memory cap",
+           {}, stats["evicted_rows"])
+
+
+REGISTRY.add_collector(_collect_index_stats)
@@ -0,0 +1,66 @@
+"""Bookkeeping for speculative prefetches of likely follow-up queries"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Text
+
+from actions import config
+
+
+class PrefetchTracker:
+    """Remember which cache keys were prefetched and whether anyone read them in time
+
+    A prefetched key read within ttl seconds counts as a hit; one that expires
+    unread counts as wasted.
+    """
+
+    def __init__(self, ttl: float = config.PREFETCH_TTL):
+        self.ttl = ttl
+        self._marked: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        # Prefetches not sent because the result was already cached or in flight
+        self.skipped = 0
+
+    def mark(self, key: Hashable) -> bool:
+        """Record a prefetch of key; False if one is already outstanding"""
+        with self._lock:
+            self._expire()
+            if key in self._marked:
+                self.skipped += 1
+                return False
+            self._marked[key] = time.monotonic() + self.ttl
+            self.issued += 1
+            return True
+
+    def claim(self, key: Hashable) -> bool:
+        """Note a real read of key, counting a hit if it had been prefetched"""
+        with self._lock:
+            self._expire()
+            if self._marked.pop(key, None) is None:
+                return False
+            self.hits += 1
+            return True
+
+    def _expire(self) -> None:
+        # Deadlines are appended in order, so expired keys sit at the front
+        now = time.monotonic()
+        while self._marked:
+            key, deadline = next(iter(self._marked.items()))
+            if deadline > now:
+                break
+            del self._marked[key]
+            self.wasted += 1
+
+    def stats(self) -> Dict[Text, int]:
+        with self._lock:
+            self._expire()
+            return {
+                "issued": self.issued,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "skipped": self.skipped,
+                "outstanding": len(self._marked),
+            }
@@ -0,0 +1,117 @@
+"""Sampling profiler that keeps folded stacks for the slowest action runs
+
+Output uses the folded-stack format ("frame;frame;frame count") understood by
+flamegraph.pl, speedscope and similar tools.
+"""
+import heapq
+import itertools
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Text, Tuple
+
+from actions import config
+
+
+def _describe(frame) -> Text:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _await_chain(coro: Any) -> List[Any]:
+    """Frames of a coroutine and everything it is currently awaiting, outermost first"""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+class SlowRunProfiler:
+    """Samples the stacks of in-flight action runs and retains the slowest N
+
+    A background thread wakes every interval seconds. For each running action it
+    records where the coroutine is suspended (waiting on the backend, a lock,
+    a sleep) or, if it is the one currently executing, the live stack of the
+    event loop thread, so both waiting and CPU time show up in the profile.
+    """
+
+    def __init__(self, slowest_n: int = config.PROFILE_SLOWEST_N,
+                 interval: float = config.PROFILE_INTERVAL):
+        self.slowest_n = slowest_n
+        self.interval = interval
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        # token -> (action name, coroutine, loop thread id, samples)
+        self._active: Dict[int, Tuple[Text, Any, int, Counter]] = {}
+        # min-heap of (duration, token, action name, samples)
+        self._slowest: List[Tuple[float, int, Text, Counter]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, action_name: Text, coro: Any) -> int:
+        token = next(self._ids)
+        with self._lock:
+            self._active[token] = (action_name, coro, threading.get_ident(), Counter())
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample_forever, name="action-profiler", daemon=True)
+            self._thread.start()
+        return token
+
+    def finish(self, token: int, duration: float) -> None:
+        with self._lock:
+            action_name, _, _, samples = self._active.pop(token)
+            entry = (duration, token, action_name, samples)
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, entry)
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def _sample_forever(self) -> None:
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        current = sys._current_frames()
+        with self._lock:
+            for action_name, coro, thread_id, samples in self._active.values():
+                chain = _await_chain(coro)
+                if not chain:
+                    continue
+                stack = [_describe(frame) for frame in chain]
+                if getattr(coro, "cr_running", False):
+                    # Running right now: extend with the synchronous frames below the innermost coroutine
+                    frame = current.get(thread_id)
+                    below = []
+                    while frame is not None and frame is not chain[-1]:
+                        below.append(_describe(frame))
+                        frame = frame.f_back
+                    if frame is not None:
+                        stack.extend(reversed(below))
+                samples[";".join([action_name] + stack)] += 1
+
+    def render(self) -> Text:
+        """Folded stacks of the slowest runs, slowest first, one tower per run"""
+        with self._lock:
+            runs = sorted(self._slowest, reverse=True)
+        lines = []
+        for rank, (duration, _, action_name, samples) in enumerate(runs, 1):
+            prefix = f"#{rank} {action_name} {duration * 1000:.0f}ms"
+            for stack, count in samples.items():
+                lines.append(f"{prefix};{stack} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+_profiler: Optional[SlowRunProfiler] = None
+
+
+def get_profiler() -> Optional[SlowRunProfiler]:
+    """Return the profiler if PROFILE_SLOWEST_N is set, creating it on first use"""
+    global _profiler
+    if _profiler is None and config.PROFILE_SLOWEST_N > 0:
+        _profiler = SlowRunProfiler()
+    return _profiler
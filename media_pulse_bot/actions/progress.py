@@ -0,0 +1,146 @@
+"""Progressive replies: messages pushed to the chat before an action finishes
+
+Rasa only delivers what an action utters once its run returns, so a slow
+action that streams a large result set would otherwise stay silent until the
+last byte arrives. In progressive mode the action pushes an acknowledgement
+and early results to PUSH_URL, which relays them to the user's chat
+websocket, and utters only the final totals through the dispatcher. Pushed
+messages use the Rasa callback channel format ({"recipient_id", "text"})
+plus the action name and a stage, ack or partial.
+"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, List, Optional, Set, Text
+
+from actions import config
+from actions.metrics import REGISTRY, Counter
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+ACK = "ack"
+PARTIAL = "partial"
+
+PROGRESS_PUSHES = REGISTRY.register(Counter(
+    "mediapulse_progress_pushes_total", "Progressive messages pushed to the chat", ["stage", "result"]))
+
+
+class PushChannel:
+    """Posts messages for a conversation to the chat server's push endpoint"""
+
+    def __init__(self, url: Text = config.PUSH_URL, timeout: float = config.PUSH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._loop = loop
+        return self._session
+
+    async def push(self, sender_id: Text, text: Text, action: Text, stage: Text) -> bool:
+        """Deliver one message; False when it could not be delivered"""
+        message = {"recipient_id": sender_id, "text": text, "action": action, "stage": stage}
+        try:
+            async with self._get_session().post(self.url, json=message) as response:
+                await response.read()
+                delivered = response.status < 300
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Could not push a progress message to {self.url}: {type(e).__name__}: {e}")
+            delivered = False
+        PROGRESS_PUSHES.inc(stage, "delivered" if delivered else "failed")
+        return delivered
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_channel: Optional[PushChannel] = None
+
+
+def get_push_channel() -> PushChannel:
+    """Return the process-wide push channel, creating it on first use"""
+    global _channel
+    if _channel is None:
+        _channel = PushChannel()
+    return _channel
+
+
+def progressive_enabled() -> bool:
+    return config.PROGRESSIVE_RESPONSES_ENABLED and bool(config.PUSH_URL)
+
+
+class Progress:
+    """The progressive messages of one action run
+
+    Records which stages reached the user, so the final message can repeat
+    whatever could not be pushed.
+    """
+
+    def __init__(self, sender_id: Text, action: Text, channel: Optional[PushChannel] = None):
+        self.sender_id = sender_id
+        self.action = action
+        self.channel = channel or get_push_channel()
+        self.delivered: List[Text] = []
+        # Stages claimed by send_once, set before the push so concurrent callers see it
+        self._claimed: Set[Text] = set()
+
+    async def send(self, text: Text, stage: Text = PARTIAL) -> bool:
+        delivered = await self.channel.push(self.sender_id, text, self.action, stage)
+        if delivered:
+            self.delivered.append(stage)
+        return delivered
+
+    async def send_once(self, text: Text, stage: Text = PARTIAL) -> bool:
+        """Send a stage only the first time it is asked for in this run
+
+        A hedged read runs its reducer in both attempts, and each would
+        otherwise push its own early result.
+        """
+        if stage in self._claimed:
+            return False
+        self._claimed.add(stage)
+        return await self.send(text, stage)
+
+    async def run(self, awaitable: Awaitable[Any], ack: Text,
+                  delay: float = config.PROGRESSIVE_ACK_DELAY) -> Any:
+        """Await a slow call, acknowledging the question if it takes longer than delay
+
+        Answers that are ready quickly, such as cache hits, go out without an
+        acknowledgement in front of them, and so do calls that already pushed
+        an early result of their own.
+        """
+        task = asyncio.ensure_future(awaitable)
+        done, _ = await asyncio.wait({task}, timeout=delay)
+        if not done and not self.delivered:
+            await self.send(ack, ACK)
+        return await task
+
+
+async def on_first_items(items: AsyncIterator[Any], count: int,
+                         callback: Callable[[List[Any]], Awaitable[None]]) -> AsyncIterator[Any]:
+    """Pass a stream of items through, handing the first count of them to callback once they arrive
+
+    A stream shorter than count never calls back: its final result is as
+    close as the early one would have been.
+    """
+    first: Optional[List[Any]] = []
+    async for item in items:
+        if first is not None:
+            first.append(item)
+            if len(first) == count:
+                await callback(first)
+                first = None
+        yield item
@@ -0,0 +1,155 @@
+"""Content-addressed result store shared by every action server process on a host
+
+Results are keyed by a hash of the normalized request and kept in one SQLite
+file in WAL mode, so concurrent readers in other processes are never blocked
+by a writer. Entries expire after a TTL and the least recently used ones are
+evicted once the stored values exceed a size cap.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Text
+
+from actions import config
+from actions.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access);
+"""
+
+# Hits only refresh an entry's LRU position this often, to keep reads from writing
+_TOUCH_INTERVAL = 60
+# Size checks run every this many writes
+_EVICT_EVERY = 32
+
+
+def content_key(request: Dict[Text, Any]) -> Text:
+    """Stable hash of a request: the same normalized request always gets the same key"""
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """Persistent key -> JSON value store with TTL expiry and size-based LRU eviction"""
+
+    def __init__(self, path: Text, ttl: float, max_bytes: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Text) -> Optional[Any]:
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, last_access FROM results WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None and now - row[1] > _TOUCH_INTERVAL:
+                    self._db.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            # The store is only an optimization; a locked or damaged file means a miss
+            logger.warning(f"Result store lookup failed: {str(e)}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: Text, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        encoded = json.dumps(value, default=str)
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, encoded, len(encoded), now + (self.ttl if ttl is None else ttl), now),
+                )
+                self._writes += 1
+                if self._writes % _EVICT_EVERY == 0:
+                    self._evict(now)
+        except sqlite3.Error as e:
+            logger.warning(f"Result store write failed: {str(e)}")
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the cap so the next few writes do not evict again
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM results WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[Text, int]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_sentiment_store: Optional[ResultStore] = None
+
+
+def get_sentiment_store() -> ResultStore:
+    """Return the host-wide sentiment result store, opening its file on first use"""
+    global _sentiment_store
+    if _sentiment_store is None:
+        _sentiment_store = ResultStore(config.SENTIMENT_STORE_PATH, config.SENTIMENT_STORE_TTL,
+                                       config.SENTIMENT_STORE_MAX_BYTES)
+    return _sentiment_store
+
+
+def _collect_store_stats():
+    if _sentiment_store is None:
+        return
+    stats = _sentiment_store.stats()
+    labels = {"store": "sentiment"}
+    yield ("mediapulse_result_store_entries", "gauge", "Entries in the shared result store", labels, stats["entries"])
+    yield ("mediapulse_result_store_bytes", "gauge", "Bytes of values in the shared result store",
+           labels, stats["bytes"])
+    yield ("mediapulse_result_store_hits_total", "counter", "Result store hits in this process", labels, stats["hits"])
+    yield ("mediapulse_result_store_misses_total", "counter", "Result store misses in this process",
+           labels, stats["misses"])
+    yield ("mediapulse_result_store_evictions_total", "counter", "Result store entries evicted for size",
+           labels, stats["evictions"])
+
+
+REGISTRY.add_collector(_collect_store_stats)
@@ -0,0 +1,151 @@
+"""Action server entrypoint: the rasa_sdk webhook app plus metrics routes
+
+Run from media_pulse_bot/ in place of `rasa run actions`:
+
+    python -m actions.server --port 5055
+    python -m actions.server --port 5055 --workers 4
+    python -m actions.server --port 5055 --warm-up
+"""
+import argparse
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Text
+
+from rasa_sdk import endpoint
+from rasa_sdk.constants import DEFAULT_SERVER_PORT
+from rasa_sdk.executor import ActionExecutor
+from sanic import Sanic, response
+
+from actions import config
+from actions.api_client import get_api_client
+from actions.metrics import render_metrics
+from actions.outbox import get_outbox
+from actions.profiler import get_profiler
+from actions.progress import get_push_channel
+from actions.snapshots import get_cache_snapshots
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def warm_up(connections: int = config.WARM_UP_CONNECTIONS) -> None:
+    """Do the work deferred from startup so the first conversation does not pay for it
+
+    Imports the lazily loaded dependencies and opens pooled API connections
+    with concurrent GETs of WARM_UP_PATH; any answer, even an error, leaves a
+    connection behind.
+    """
+    started = time.monotonic()
+    client = get_api_client()
+    results = await asyncio.gather(*(client.get(config.WARM_UP_PATH) for _ in range(connections)),
+                                   return_exceptions=True)
+    if config.POST_INDEX_ENABLED:
+        from actions.post_index import _numpy, get_post_index
+
+        _numpy()
+        await get_post_index().ensure_fresh()
+    failed = sum(isinstance(result, Exception) for result in results)
+    logger.info(f"Warmed up in {time.monotonic() - started:.2f}s "
+                f"({connections - failed}/{connections} API connections opened)")
+
+
+def create_action_app(package: Text = "actions", cors_origins: Text = "*", auto_reload: bool = False,
+                      warm: bool = config.ACTION_SERVER_WARM_UP) -> Sanic:
+    """Build the rasa_sdk Sanic app and add /metrics and /metrics/profile"""
+    # rasa_sdk 3.6 takes the package name, later versions a prepared executor
+    if "action_executor" in inspect.signature(endpoint.create_app).parameters:
+        executor = ActionExecutor()
+        executor.register_package(package)
+        app = endpoint.create_app(executor, cors_origins=cors_origins, auto_reload=auto_reload)
+    else:
+        app = endpoint.create_app(package, cors_origins=cors_origins, auto_reload=auto_reload)
+
+    async def metrics(request):
+        return response.text(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    async def profile(request):
+        profiler = get_profiler()
+        if profiler is None:
+            return response.text("Profiling is disabled; set PROFILE_SLOWEST_N to enable it.\n", status=404)
+        return response.text(profiler.render())
+
+    async def start_outbox(app, loop):
+        # Resume sending posts queued before a restart
+        if config.WRITE_BEHIND_ENABLED:
+            get_outbox().start()
+        if config.CACHE_SNAPSHOT_ENABLED:
+            get_cache_snapshots().start()
+
+    async def load_snapshot(app, loop):
+        # Before listening, so the first questions after a deploy find a warm cache
+        await loop.run_in_executor(None, get_cache_snapshots().load)
+
+    async def start_warm_up(app, loop):
+        # Before listening, so a readiness probe only passes once the server is warm
+        try:
+            await asyncio.wait_for(warm_up(), config.HTTP_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Warm-up did not finish in time; starting anyway")
+
+    async def close_api_client(app, loop):
+        if config.WRITE_BEHIND_ENABLED:
+            await get_outbox().stop()
+        if config.CACHE_SNAPSHOT_ENABLED:
+            await get_cache_snapshots().stop()
+        await get_api_client().close()
+        if config.PROGRESSIVE_RESPONSES_ENABLED:
+            await get_push_channel().close()
+
+    app.add_route(metrics, "/metrics", methods=["GET"])
+    app.add_route(profile, "/metrics/profile", methods=["GET"])
+    app.register_listener(start_outbox, "after_server_start")
+    if config.CACHE_SNAPSHOT_ENABLED:
+        app.register_listener(load_snapshot, "before_server_start")
+    if warm:
+        app.register_listener(start_warm_up, "before_server_start")
+    app.register_listener(close_api_client, "after_server_stop")
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the MediaPulse action server")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ACTION_SERVER_PORT", DEFAULT_SERVER_PORT)))
+    parser.add_argument("--actions", default="actions", help="package containing the custom actions")
+    parser.add_argument("--cors", default="*", help="CORS origins to allow")
+    parser.add_argument("--auto-reload", action="store_true", help="reload actions when their files change")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ACTION_SERVER_WORKERS", "1")),
+                        help="worker processes behind the port; above 1 a dispatcher balances between them")
+    parser.add_argument("--worker-base-port", type=int,
+                        help="first loopback port for the workers (default: --port + 1)")
+    parser.add_argument("--warm-up", action="store_true", default=config.ACTION_SERVER_WARM_UP,
+                        help="open API connections and load deferred dependencies right after startup")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    host = os.environ.get("SANIC_HOST", "0.0.0.0")
+    if args.workers > 1:
+        from actions.workers import run_worker_pool
+
+        if args.warm_up:
+            # Inherited by the worker processes
+            os.environ["ACTION_SERVER_WARM_UP"] = "true"
+
+        run_worker_pool(host, args.port, args.workers, args.worker_base_port or args.port + 1, args.actions)
+        return
+
+    app = create_action_app(args.actions, cors_origins=args.cors, auto_reload=args.auto_reload, warm=args.warm_up)
+    logger.info(f"Action endpoint is up and running on http://{host}:{args.port}")
+
+    run_options = {"access_log": False}
+    # Newer Sanic releases fork a worker manager unless told otherwise
+    if "single_process" in inspect.signature(app.run).parameters:
+        run_options["single_process"] = True
+    app.run(host, args.port, **run_options)
+
+
+if __name__ == "__main__":
+    main()
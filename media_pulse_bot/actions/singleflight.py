@@ -0,0 +1,41 @@
+"""Request coalescing for identical concurrent backend queries"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Text
+
+
+class SingleFlight:
+    """Share one in-flight call between all concurrent callers using the same key"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # Calls that actually reached the backend vs. callers that joined one
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The call runs as its own task, so the caller that started it can
+            # give up without cancelling it for everyone else who joined
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            self.executed += 1
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # Shielded so one waiter giving up does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter had given up
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[Text, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,206 @@
+"""Cache snapshots, so a restarted action server does not start cold
+
+The response cache, the date ranges resolved today and the per-endpoint
+latency windows used for hedging are written to a gzip-compressed JSON lines
+file: a header line, then one line per cache entry. The file is written to a
+temporary name and renamed over the old one, so a crash mid-write leaves the
+previous snapshot intact. On startup the snapshot is reloaded. Cache entries
+keep the TTL they had left when it was written, less the time since, and
+entries past their stale window are dropped. Date ranges are only reloaded
+on the day they were resolved, and latency windows only if the snapshot is
+recent enough to describe the API as it is now.
+"""
+import asyncio
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Text
+
+from actions import config, date_parser
+from actions.api_client import ApiResponse, get_api_client
+from actions.budgets import LatencyWindow
+from actions.decoding import loads
+from actions.metrics import REGISTRY, Counter
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+SNAPSHOT_ENTRIES = REGISTRY.register(Counter(
+    "mediapulse_cache_snapshot_entries_total", "Response cache entries written to or reloaded from snapshots",
+    ["operation"]))
+
+
+def snapshot_path(path: Text = config.CACHE_SNAPSHOT_PATH) -> Text:
+    """The snapshot file of this process; each worker of a pool keeps its own"""
+    worker = os.environ.get("ACTION_SERVER_WORKER")
+    if not worker:
+        return path
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition(".")
+    return os.path.join(directory, f"{stem}.worker{worker}{dot}{extension}")
+
+
+def _tuples(value: Any) -> Any:
+    # Cache keys are nested tuples, which JSON brings back as lists
+    if isinstance(value, list):
+        return tuple(_tuples(item) for item in value)
+    return value
+
+
+class CacheSnapshots:
+    def __init__(self, path: Optional[Text] = None,
+                 interval: float = config.CACHE_SNAPSHOT_INTERVAL,
+                 max_age: float = config.CACHE_SNAPSHOT_MAX_AGE):
+        self.path = path or snapshot_path()
+        self.interval = interval
+        self.max_age = max_age
+        self._task: Optional[asyncio.Task] = None
+        # A periodic save may still be writing in its thread when the final one starts
+        self._write_lock = threading.Lock()
+
+    def collect(self) -> Dict[Text, Any]:
+        """Copy the state to snapshot on the event loop, which owns the cached responses
+
+        Payloads are taken here rather than in the writer thread, since
+        ApiResponse.json() decodes and memoizes on first use. Cached responses
+        have almost always been decoded by the action that read them already.
+        """
+        client = get_api_client()
+        entries = []
+        for key, expires_in, size, response in (client.cache.snapshot() if client.cache is not None else []):
+            try:
+                data = response.json()
+            except (TypeError, ValueError):
+                # Not JSON (or not decodable); it will simply be fetched again
+                continue
+            entries.append((key, expires_in, size, response.status_code, data))
+        return {
+            "header": {
+                "version": FORMAT_VERSION,
+                "saved_at": time.time(),
+                "day": datetime.date.today().isoformat(),
+                "date_ranges": date_parser.recent_texts(),
+                "latency": {path: window.samples() for path, window in list(client.latency.items())},
+            },
+            "entries": entries,
+        }
+
+    def write(self, state: Dict[Text, Any]) -> int:
+        """Write a collected state atomically; returns the number of cache entries written"""
+        with self._write_lock:
+            written = self._write(state)
+        SNAPSHOT_ENTRIES.inc("written", amount=written)
+        return written
+
+    def _write(self, state: Dict[Text, Any]) -> int:
+        written = 0
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with gzip.open(temporary, "wt", encoding="utf-8", compresslevel=5) as f:
+                f.write(json.dumps(state["header"]) + "\n")
+                for entry in state["entries"]:
+                    try:
+                        line = json.dumps(entry)
+                    except (TypeError, ValueError):
+                        # Decoded, but not something JSON can hold
+                        continue
+                    f.write(line + "\n")
+                    written += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return written
+
+    def save(self) -> int:
+        return self.write(self.collect())
+
+    async def save_async(self) -> int:
+        state = self.collect()
+        return await asyncio.get_running_loop().run_in_executor(None, self.write, state)
+
+    def load(self) -> int:
+        """Reload a snapshot, if there is one; returns the number of cache entries restored"""
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                header = loads(f.readline())
+                if not isinstance(header, dict) or header.get("version") != FORMAT_VERSION:
+                    logger.warning(f"Ignoring cache snapshot {self.path}: unknown format")
+                    return 0
+                age = max(0.0, time.time() - header["saved_at"])
+                entries = []
+                for line in f:
+                    try:
+                        key, expires_in, size, status, data = loads(line)
+                    except ValueError:
+                        break
+                    entries.append((_tuples(key), expires_in - age, size, ApiResponse(status, data=data, size=size)))
+        except FileNotFoundError:
+            return 0
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not read cache snapshot {self.path}, starting cold: {type(e).__name__}: {e}")
+            return 0
+
+        client = get_api_client()
+        restored = client.cache.restore(entries) if client.cache is not None else 0
+        ranges = 0
+        if header.get("day") == datetime.date.today().isoformat():
+            ranges = date_parser.warm(header.get("date_ranges", []))
+        windows = 0
+        if age <= self.max_age:
+            for path, samples in header.get("latency", {}).items():
+                window = client.latency.get(path)
+                if window is None and samples:
+                    window = client.latency[path] = LatencyWindow()
+                    for seconds in samples:
+                        window.record(seconds)
+                    windows += 1
+        SNAPSHOT_ENTRIES.inc("restored", amount=restored)
+        logger.info(f"Restored {restored} cache entries, {ranges} date ranges and {windows} latency windows "
+                    f"from a {age:.0f}s old snapshot")
+        return restored
+
+    def start(self) -> None:
+        """Save a snapshot every interval seconds on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save_async()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not write cache snapshot {self.path}: {type(e).__name__}: {e}")
+
+    async def stop(self) -> None:
+        """Stop the periodic saves and write a last snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.save_async()
+        except Exception as e:
+            logger.warning(f"Could not write cache snapshot {self.path}: {type(e).__name__}: {e}")
+
+
+_snapshots: Optional[CacheSnapshots] = None
+
+
+def get_cache_snapshots() -> CacheSnapshots:
+    """Return the process-wide snapshot writer, creating it on first use"""
+    global _snapshots
+    if _snapshots is None:
+        _snapshots = CacheSnapshots()
+    return _snapshots
@@ -0,0 +1,186 @@
+"""Incremental parsing of large JSON array responses
+
+The body is not parsed byte by byte in Python. As chunks arrive, the items
+received so far are cut off at the last separator between two items and
+decoded together by the fast backend of actions.decoding, then projected.
+"""
+import re
+from itertools import chain, islice
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Pattern, Text
+
+from actions.decoding import Projection, loads
+
+_WHITESPACE = b" \t\n\r"
+
+# Candidate separators between two items of an array of objects or arrays.
+# One can also sit inside an item (an inner list of objects); decoding the
+# batch then fails and an earlier candidate is tried
+_OBJECT_SEPARATOR = re.compile(rb",[ \t\n\r]*\{")
+_ARRAY_SEPARATOR = re.compile(rb",[ \t\n\r]*\[")
+_ANY_SEPARATOR = re.compile(rb",")
+
+# The first key of an object. API list items all start with the same key,
+# which inner objects rarely do, so separators followed by it are tried first
+_FIRST_KEY = re.compile(rb'[ \t\n\r]*\{[ \t\n\r]*("(?:[^"\\]|\\.)*")[ \t\n\r]*:')
+
+# Separators tried, last first, before waiting for more of the body
+_MAX_CUTS = 8
+
+# Keys used by paginated responses for the page items and the overall match count
+_PAGE_ITEM_KEYS = ("items", "data", "results")
+_PAGE_TOTAL_KEYS = ("total", "totalCount", "count")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes],
+                          projection: Optional[Projection] = None) -> AsyncIterator[Any]:
+    """Yield the items of a top-level JSON array as its bytes arrive
+
+    Each batch of complete items is decoded whole and then projected, so
+    memory is bounded by about one chunk of undecoded body plus one batch of
+    projected items, however long the array is.
+    """
+    pending = b""
+    started = False
+    separator = None
+    item_separator = None
+    # A batch is only retried once the body has grown past this, so an item
+    # larger than a chunk is not decoded over and over as it arrives
+    retry_at = 0
+    # Whether pending starts right after a separator
+    cut_off = False
+
+    async for chunk in chunks:
+        pending += chunk
+        if not started:
+            pending = pending.lstrip(_WHITESPACE)
+            if not pending:
+                continue
+            if pending[:1] != b"[":
+                raise ValueError(f"Expected a JSON array, got {pending[:1]!r}")
+            started = True
+            pending = pending[1:]
+        if separator is None:
+            first = pending.lstrip(_WHITESPACE)[:1]
+            if not first:
+                continue
+            separator = {b"{": _OBJECT_SEPARATOR, b"[": _ARRAY_SEPARATOR}.get(first, _ANY_SEPARATOR)
+            if first == b"{":
+                key = _FIRST_KEY.match(pending)
+                if key is None:
+                    # Wait for the first key, unless the item has none
+                    if b":" not in pending and b"}" not in pending:
+                        separator = None
+                        continue
+                else:
+                    item_separator = re.compile(rb",[ \t\n\r]*\{[ \t\n\r]*" + re.escape(key.group(1))
+                                                + rb"[ \t\n\r]*:")
+        if len(pending) < retry_at:
+            continue
+
+        cuts = _last_matches(item_separator, pending) if item_separator is not None else iter(())
+        first_cut = next(cuts, None)
+        if first_cut is None:
+            cuts = _last_matches(separator, pending)
+        else:
+            cuts = chain((first_cut,), cuts)
+        for cut in islice(cuts, _MAX_CUTS):
+            try:
+                items = loads(b"[" + pending[:cut] + b"]", projection)
+            except ValueError:
+                continue
+            pending = pending[cut + 1:]
+            retry_at = 0
+            cut_off = True
+            for item in items:
+                yield item
+            break
+        else:
+            retry_at = 2 * len(pending)
+
+    if not started:
+        raise ValueError("Unexpected end of JSON array")
+    if cut_off and pending.lstrip(_WHITESPACE)[:1] == b"]":
+        # The last batch ended at a separator with no item after it
+        raise ValueError("Trailing comma in JSON array")
+    # What is left is the last items and the closing bracket
+    for item in loads(b"[" + pending, projection):
+        yield item
+
+
+def _last_matches(pattern: Pattern[bytes], data: bytes) -> Iterator[int]:
+    """Start positions of pattern in data, last first
+
+    Scans back from the end in growing windows, since usually only the last
+    match or two are needed.
+    """
+    limit = len(data)
+    window = 4096
+    while limit:
+        start = max(0, len(data) - window)
+        positions = [match.start() for match in pattern.finditer(data, start)]
+        for position in reversed(positions):
+            if position < limit:
+                yield position
+        limit = start
+        window *= 4
+
+
+async def _prepend(first: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+def json_page(data: Any, limit: int, total: Optional[int] = None,
+              projection: Optional[Callable[[Any], Any]] = None) -> Dict[Text, Any]:
+    """The first limit items of an already decoded list response, shaped like read_json_page's result"""
+    if isinstance(data, dict):
+        items = next((data[key] for key in _PAGE_ITEM_KEYS if isinstance(data.get(key), list)), [])
+        if total is None:
+            total = next((data[key] for key in _PAGE_TOTAL_KEYS if isinstance(data.get(key), int)), None)
+    else:
+        items = data if isinstance(data, list) else []
+    return {
+        "items": projection(items[:limit]) if projection is not None else items[:limit],
+        "total": total,
+        "has_more": len(items) > limit if total is None else total > limit,
+    }
+
+
+async def read_json_page(chunks: AsyncIterator[bytes], limit: int,
+                         total: Optional[int] = None,
+                         projection: Optional[Callable[[Any], Any]] = None) -> Dict[Text, Any]:
+    """Read at most limit items from a paginated or plain JSON array response
+
+    Servers that support pagination answer with either a short array (and an
+    X-Total-Count header, passed in as total) or an object such as
+    {"items": [...], "total": 123}. A plain array from a server that ignored
+    the limit is streamed and abandoned once limit items have been read, so
+    the amount downloaded does not depend on how many results match. A
+    projection is applied to the returned items as they are decoded.
+    """
+    first = b""
+    async for chunk in chunks:
+        first += chunk
+        if first.strip():
+            break
+
+    if first.lstrip().startswith(b"{"):
+        body = first
+        async for chunk in chunks:
+            body += chunk
+        return json_page(loads(body), limit, total, projection)
+
+    items = []
+    has_more = False
+    async for item in iter_json_array(_prepend(first, chunks), projection):
+        if len(items) == limit:
+            has_more = True
+            break
+        items.append(item)
+
+    return {
+        "items": items,
+        "total": total,
+        "has_more": has_more if total is None else total > limit,
+    }
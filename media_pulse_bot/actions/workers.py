@@ -0,0 +1,411 @@
+"""Multi-process action server: a pool of single-process workers behind one port
+
+The dispatcher listens on the webhook port. Webhook calls go to the worker
+their sender_id hashes to, because report jobs, turn plans and per-sender
+rate limits live inside one worker process. Other requests, and calls whose
+worker is not ready, go to the worker with the fewest requests in flight
+(ties go to the lower recent latency). Workers are
+ordinary `python -m actions.server` processes on loopback ports that share
+nothing but the host-level stores. Crashed workers are restarted; SIGHUP or
+POST /workers/reload replaces them one at a time, draining each before it is
+stopped. GET /workers reports per-worker health, and /metrics merges every
+worker's metrics with a worker label.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Text
+
+if TYPE_CHECKING:
+    # rasa_sdk imports every module of the actions package at startup, so the
+    # dispatcher's aiohttp dependency is only imported when a pool is started
+    import aiohttp
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+STOPPED = "stopped"
+
+# Hop-by-hop headers that must not be forwarded
+_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+def sender_key(body: bytes) -> Optional[Text]:
+    """The sender_id of a webhook call body, if it has one"""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    sender = payload.get("sender_id") if isinstance(payload, dict) else None
+    if sender is None and isinstance(payload, dict) and isinstance(payload.get("tracker"), dict):
+        sender = payload["tracker"].get("sender_id")
+    return str(sender) if sender is not None else None
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Worker:
+    """One action server process and its dispatch bookkeeping"""
+
+    def __init__(self, slot: int, port: int, package: Text):
+        self.slot = slot
+        self.port = port
+        self.package = package
+        self.state = STARTING
+        self.process: Optional[subprocess.Popen] = None
+        self.in_flight = 0
+        self.served = 0
+        self.errors = 0
+        # Exponentially weighted moving average of response time in seconds
+        self.latency = 0.0
+        self.started_at = time.time()
+
+    @property
+    def url(self) -> Text:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        env = dict(os.environ, SANIC_HOST="127.0.0.1", ACTION_SERVER_WORKER=str(self.slot))
+        # Own session, so a Ctrl-C aimed at the dispatcher's process group does not
+        # reach workers directly; the dispatcher drains and stops them itself
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "actions.server", "--port", str(self.port), "--actions", self.package],
+            env=env, start_new_session=True)
+        self.started_at = time.time()
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def observe(self, seconds: float, failed: bool) -> None:
+        self.served += 1
+        if failed:
+            self.errors += 1
+        self.latency = seconds if self.served == 1 else 0.8 * self.latency + 0.2 * seconds
+
+    def stop(self, timeout: float = 10) -> None:
+        self.state = STOPPED
+        if not self.alive():
+            return
+        # SIGTERM lets Sanic finish open requests and run its stop listeners
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def stats(self) -> Dict[Text, object]:
+        return {
+            "slot": self.slot,
+            "pid": self.process.pid if self.process else None,
+            "port": self.port,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "served": self.served,
+            "errors": self.errors,
+            "latency_ms": round(self.latency * 1000, 2),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "rss_mb": _rss_mb(self.process.pid) if self.alive() else None,
+        }
+
+
+class WorkerPool:
+    """Starts, supervises and dispatches to a fixed number of worker processes"""
+
+    def __init__(self, size: int, base_port: int, package: Text = "actions",
+                 start_timeout: float = 60, drain_timeout: float = 30):
+        self.size = size
+        self.base_port = base_port
+        self.package = package
+        self.start_timeout = start_timeout
+        self.drain_timeout = drain_timeout
+        self.workers: List[Worker] = []
+        self.restarts = [0] * size
+        self._generation = [0] * size
+        self._rotation = itertools.count()
+        # Webhook calls sent to another worker because their own was not ready
+        self.affinity_misses = 0
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._reloading: Optional[asyncio.Task] = None
+
+    def _port(self, slot: int) -> int:
+        # Two ports per slot, alternating, so a replacement can start before its predecessor stops
+        return self.base_port + 2 * slot + self._generation[slot] % 2
+
+    async def start(self) -> None:
+        import aiohttp
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=None),
+        )
+        self.workers = [Worker(slot, self._port(slot), self.package) for slot in range(self.size)]
+        for worker in self.workers:
+            worker.start()
+        await asyncio.gather(*(self._wait_ready(worker) for worker in self.workers))
+        self._monitor = asyncio.get_running_loop().create_task(self._supervise())
+        logger.info(f"Started {self.size} action server workers on ports {self.base_port}-{self.base_port + 2 * self.size - 1}")
+
+    async def _wait_ready(self, worker: Worker) -> bool:
+        import aiohttp
+
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline and worker.alive():
+            try:
+                async with self._session.get(f"{worker.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status == 200:
+                        worker.state = READY
+                        return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.2)
+        logger.error(f"Worker {worker.slot} (port {worker.port}) did not become ready")
+        return False
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(1)
+            for slot, worker in enumerate(self.workers):
+                if worker.state in (READY, STARTING) and not worker.alive():
+                    logger.warning(f"Worker {slot} (pid {worker.process.pid}) exited with "
+                                   f"{worker.process.returncode}; restarting it")
+                    self.restarts[slot] += 1
+                    await self._replace(slot, drain=False)
+
+    async def _replace(self, slot: int, drain: bool = True) -> None:
+        old = self.workers[slot]
+        self._generation[slot] += 1
+        new = Worker(slot, self._port(slot), self.package)
+        new.start()
+        if not await self._wait_ready(new):
+            await asyncio.get_running_loop().run_in_executor(None, new.stop)
+            return
+        self.workers[slot] = new
+        old.state = DRAINING
+        if drain:
+            deadline = time.monotonic() + self.drain_timeout
+            while old.in_flight and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        await asyncio.get_running_loop().run_in_executor(None, old.stop)
+
+    async def reload(self) -> None:
+        """Replace every worker in turn, starting each replacement before its predecessor stops"""
+        for slot in range(self.size):
+            await self._replace(slot)
+        logger.info("Reloaded all action server workers")
+
+    def trigger_reload(self) -> bool:
+        if self._reloading is not None and not self._reloading.done():
+            return False
+        self._reloading = asyncio.get_running_loop().create_task(self.reload())
+        return True
+
+    def home(self, sender: Text) -> Worker:
+        """The worker a sender's calls go to, by rendezvous hashing on its slot
+
+        Slots outlive their processes, so a sender keeps its slot across
+        restarts and reloads, and only the senders of a removed slot would
+        move if the pool size changed.
+        """
+        def weight(worker: Worker) -> bytes:
+            return hashlib.blake2b(f"{worker.slot}:{sender}".encode(), digest_size=8).digest()
+
+        return max(self.workers, key=weight)
+
+    def pick(self, exclude: Optional[Worker] = None, sender: Optional[Text] = None) -> Optional[Worker]:
+        if sender is not None and self.workers:
+            worker = self.home(sender)
+            if worker.state == READY and worker is not exclude:
+                return worker
+            self.affinity_misses += 1
+        ready = [worker for worker in self.workers if worker.state == READY and worker is not exclude]
+        if not ready:
+            return None
+        # Rotate the starting point so idle workers share the load evenly
+        offset = next(self._rotation) % len(ready)
+        ready = ready[offset:] + ready[:offset]
+        return min(ready, key=lambda worker: (worker.in_flight, worker.latency))
+
+    async def forward(self, request: "web.Request") -> "web.Response":
+        import aiohttp
+        from aiohttp import web
+
+        body = await request.read()
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in _HOP_HEADERS}
+        worker = self.pick(sender=sender_key(body) if request.path == "/webhook" else None)
+        for attempt in range(2):
+            if worker is None:
+                return web.json_response({"error": "no action server worker is available"}, status=503)
+            # Bookkeeping stays with this attempt's worker even when the request moves on
+            target = worker
+            target.in_flight += 1
+            started = time.monotonic()
+            failed = True
+            try:
+                async with self._session.request(request.method, f"{target.url}{request.path_qs}",
+                                                 data=body, headers=headers) as response:
+                    payload = await response.read()
+                    failed = response.status >= 500
+                    return web.Response(body=payload, status=response.status,
+                                        content_type=response.content_type, charset=response.charset)
+            except aiohttp.ClientConnectorError:
+                if attempt == 1:
+                    return web.json_response({"error": "action server worker unavailable"}, status=502)
+            except aiohttp.ClientError as e:
+                return web.json_response({"error": f"action server worker failed: {type(e).__name__}"}, status=502)
+            finally:
+                target.in_flight -= 1
+                target.observe(time.monotonic() - started, failed)
+            # Nothing reached the worker, so the request can safely go elsewhere
+            worker = self.pick(exclude=target)
+            if worker is None:
+                break
+        return web.json_response({"error": "action server worker unavailable"}, status=502)
+
+    async def merged_metrics(self) -> Text:
+        """Every worker's /metrics with a worker label, regrouped into single metric families"""
+        import aiohttp
+
+        headers: Dict[Text, List[Text]] = {}
+        samples: Dict[Text, List[Text]] = {}
+
+        async def fetch(worker: Worker) -> Text:
+            try:
+                async with self._session.get(f"{worker.url}/metrics", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    return await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return ""
+
+        ready = [worker for worker in self.workers if worker.state == READY]
+        for worker, text in zip(ready, await asyncio.gather(*(fetch(worker) for worker in ready))):
+            family = None
+            label = f'worker="{worker.slot}"'
+            for line in text.splitlines():
+                if line.startswith("# "):
+                    family = line.split()[2]
+                    if line not in headers.setdefault(family, []):
+                        headers[family].append(line)
+                    samples.setdefault(family, [])
+                elif line and family is not None:
+                    name, brace, rest = line.partition("{")
+                    if brace:
+                        samples[family].append(f"{name}{{{label},{rest}")
+                    else:
+                        name, _, value = line.partition(" ")
+                        samples[family].append(f"{name}{{{label}}} {value}")
+
+        lines = [line for family in headers for line in headers[family] + samples[family]]
+        lines += self._dispatch_metrics()
+        return "\n".join(lines) + "\n"
+
+    def _dispatch_metrics(self) -> List[Text]:
+        lines = []
+        for name, kind, help, attribute in (
+            ("mediapulse_worker_in_flight", "gauge", "Requests in flight per worker", "in_flight"),
+            ("mediapulse_worker_requests_total", "counter", "Requests dispatched per worker", "served"),
+            ("mediapulse_worker_errors_total", "counter", "Failed requests per worker", "errors"),
+        ):
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines += [f'{name}{{worker="{worker.slot}"}} {getattr(worker, attribute)}' for worker in self.workers]
+        lines += ["# HELP mediapulse_worker_affinity_misses_total Webhook calls sent to another worker "
+                  "because their sender's was not ready",
+                  "# TYPE mediapulse_worker_affinity_misses_total counter",
+                  f"mediapulse_worker_affinity_misses_total {self.affinity_misses}"]
+        lines += ["# HELP mediapulse_worker_restarts_total Worker crashes followed by a restart",
+                  "# TYPE mediapulse_worker_restarts_total counter"]
+        lines += [f'mediapulse_worker_restarts_total{{worker="{slot}"}} {count}'
+                  for slot, count in enumerate(self.restarts)]
+        return lines
+
+    def stats(self) -> Dict[Text, object]:
+        workers = []
+        for worker in self.workers:
+            stats = worker.stats()
+            stats["restarts"] = self.restarts[worker.slot]
+            workers.append(stats)
+        return {
+            "size": self.size,
+            "ready": sum(1 for worker in self.workers if worker.state == READY),
+            "affinity_misses": self.affinity_misses,
+            "reloading": self._reloading is not None and not self._reloading.done(),
+            "workers": workers,
+        }
+
+    async def stop(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for worker in self.workers:
+            worker.state = DRAINING
+        deadline = time.monotonic() + self.drain_timeout
+        while any(worker.in_flight for worker in self.workers) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, worker.stop) for worker in self.workers))
+        if self._session is not None:
+            await self._session.close()
+
+
+def create_dispatcher_app(pool: WorkerPool) -> "web.Application":
+    from aiohttp import web
+
+    async def workers(request: web.Request) -> web.Response:
+        return web.json_response(pool.stats())
+
+    async def reload(request: web.Request) -> web.Response:
+        started = pool.trigger_reload()
+        return web.json_response({"reloading": True, "started": started}, status=202)
+
+    async def health(request: web.Request) -> web.Response:
+        stats = pool.stats()
+        return web.json_response({"status": "ok" if stats["ready"] else "unavailable", "workers_ready": stats["ready"]},
+                                 status=200 if stats["ready"] else 503)
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=await pool.merged_metrics(), content_type="text/plain")
+
+    async def on_startup(app: web.Application) -> None:
+        await pool.start()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, pool.trigger_reload)
+
+    async def on_cleanup(app: web.Application) -> None:
+        await pool.stop()
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_get("/workers", workers)
+    app.router.add_post("/workers/reload", reload)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_route("*", "/{tail:.*}", pool.forward)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def run_worker_pool(host: Text, port: int, workers: int, base_port: int, package: Text = "actions") -> None:
+    """Serve the webhook on host:port from a pool of worker processes"""
+    from aiohttp import web
+
+    logging.basicConfig(level=logging.INFO)
+    pool = WorkerPool(workers, base_port, package)
+    logger.info(f"Action endpoint is up and running on http://{host}:{port} with {workers} workers")
+    web.run_app(create_dispatcher_app(pool), host=host, port=port, access_log=None, print=None)
@@ -0,0 +1,94 @@
+"""Microbenchmark: compiled date range parser vs. the original if/elif chain
+
+Run from media_pulse_bot/:  python -m benchmarks.bench_date_parser
+"""
+import argparse
+import datetime
+import timeit
+from datetime import timedelta
+
+from actions.date_parser import _resolve, get_date_range_from_text
+
+PHRASES = [
+    "today", "yesterday", "last week", "last month", "Q1 2024", "q3", "q4 2025",
+    "this year", "next week", "tomorrow", "sometime soon", "", "last 14 days",
+    "March 2026", "2025-01-01 to 2025-02-15", "what may happen today", "march on last week",
+    "yesterday and today", "3 March",
+]
+
+
+def legacy_get_date_range_from_text(date_range_text):
+    """The substring-matching implementation this parser replaced"""
+    now = datetime.datetime.now()
+
+    if not date_range_text:
+        return None, None
+
+    date_range_text = date_range_text.lower()
+
+    if "today" in date_range_text:
+        return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
+    elif "yesterday" in date_range_text:
+        yesterday = now - timedelta(days=1)
+        return yesterday.strftime("%Y-%m-%d"), yesterday.strftime("%Y-%m-%d")
+    elif "last week" in date_range_text:
+        start = now - timedelta(days=7)
+        return start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
+    elif "last month" in date_range_text:
+        start = now - timedelta(days=30)
+        return start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d")
+    for quarter, (start, end) in {"q1": ("01-01", "03-31"), "q2": ("04-01", "06-30"),
+                                  "q3": ("07-01", "09-30"), "q4": ("10-01", "12-31")}.items():
+        if quarter in date_range_text:
+            year = now.year
+            for candidate in (2023, 2024, 2025):
+                if str(candidate) in date_range_text:
+                    year = candidate
+            return f"{year}-{start}", f"{year}-{end}"
+    if "this year" in date_range_text:
+        return f"{now.year}-01-01", f"{now.year}-12-31"
+    elif "next week" in date_range_text:
+        start = now + timedelta(days=7)
+        return now.strftime("%Y-%m-%d"), start.strftime("%Y-%m-%d")
+    elif "tomorrow" in date_range_text:
+        tomorrow = now + timedelta(days=1)
+        return tomorrow.strftime("%Y-%m-%d"), tomorrow.strftime("%Y-%m-%d")
+
+    return None, None
+
+
+def check_compatibility():
+    """Phrases the legacy function understood must resolve identically"""
+    for phrase in PHRASES:
+        legacy = legacy_get_date_range_from_text(phrase)
+        if legacy != (None, None):
+            assert get_date_range_from_text(phrase) == legacy, phrase
+
+
+def run(number: int) -> None:
+    check_compatibility()
+
+    def cold():
+        _resolve.cache_clear()
+        for phrase in PHRASES:
+            get_date_range_from_text(phrase)
+
+    def warm():
+        for phrase in PHRASES:
+            get_date_range_from_text(phrase)
+
+    def legacy():
+        for phrase in PHRASES:
+            legacy_get_date_range_from_text(phrase)
+
+    calls = number * len(PHRASES)
+    print(f"{'implementation':<22}{'us/call':>10}")
+    for label, fn in [("legacy if/elif", legacy), ("compiled (cold)", cold), ("compiled (memoized)", warm)]:
+        seconds = min(timeit.repeat(fn, number=number, repeat=5))
+        print(f"{label:<22}{seconds / calls * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations over the phrase list")
+    run(parser.parse_args().number)
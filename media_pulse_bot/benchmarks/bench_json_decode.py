@@ -0,0 +1,161 @@
+"""Microbenchmark: JSON decoding backends, with and without field projection
+
+Streams synthetic /social-posts and /press-releases bodies through
+iter_json_array in STREAM_CHUNK_SIZE chunks, the way ApiClient.aggregate
+reads them, and reports the decode time and the peak memory while reading.
+Social posts keep the content metrics fields and press releases the text
+the sentiment fallback scores. "before" is the stdlib raw_decode loop that
+parsed streamed items one at a time, without projection; backends that are
+not installed are skipped.
+
+Run from media_pulse_bot/:  python -m benchmarks.bench_json_decode --items 10000 100000
+"""
+import argparse
+import asyncio
+import codecs
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from actions import config, decoding
+from actions.decoding import Projection
+from actions.streaming import iter_json_array
+
+POST_FIELDS = Projection('engagement', 'likes', 'shares', 'comments')
+TEXT_FIELDS = Projection('title', 'summary', 'content', 'text')
+
+PLATFORMS = ["twitter", "facebook", "instagram", "linkedin"]
+TOPICS = ["product launch", "earnings", "sustainability", "hiring", "ai"]
+
+
+def social_posts(count: int, rng: random.Random) -> list:
+    return [{
+        "id": i,
+        "platform": rng.choice(PLATFORMS),
+        "topic": rng.choice(TOPICS),
+        "content": " ".join(rng.choice(TOPICS) for _ in range(30)),
+        "author": {"name": f"Author {i % 500}", "handle": f"@author{i % 500}", "followers": rng.randint(0, 10 ** 6)},
+        "tags": rng.sample(TOPICS, 2),
+        "engagement": {"likes": rng.randint(0, 5000), "shares": rng.randint(0, 500), "comments": rng.randint(0, 300)},
+        "mediaUrls": [f"https://cdn.example.com/{i}.png"],
+        "postedAt": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+        "updatedAt": "2026-10-01T00:00:00Z",
+    } for i in range(count)]
+
+
+def press_releases(count: int, rng: random.Random) -> list:
+    return [{
+        "id": i,
+        "title": f"Release {i}: {rng.choice(TOPICS)}",
+        "summary": " ".join(rng.choice(TOPICS) for _ in range(20)),
+        "content": " ".join(rng.choice(TOPICS) for _ in range(200)),
+        "outlets": [{"name": f"Outlet {j}", "reach": rng.randint(0, 10 ** 6)} for j in range(5)],
+        "publishedAt": "2026-10-01T00:00:00Z",
+    } for i in range(count)]
+
+
+def backends():
+    found = []
+    for name in ("json", "ujson", "orjson"):
+        try:
+            found.append((name, decoding._load_backend(name)))
+        except ImportError:
+            pass
+    return found
+
+
+async def _chunks(body: bytes):
+    for start in range(0, len(body), config.STREAM_CHUNK_SIZE):
+        yield body[start:start + config.STREAM_CHUNK_SIZE]
+
+
+def stdlib_items(body: bytes) -> int:
+    """The previous streaming decode: a json raw_decode call per item as the chunks arrive"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    pos = 0
+    count = 0
+    started = False
+    for start in range(0, len(body), config.STREAM_CHUNK_SIZE):
+        text = text[pos:] + utf8.decode(body[start:start + config.STREAM_CHUNK_SIZE])
+        pos = 0
+        while True:
+            while pos < len(text) and text[pos] in " \t\n\r,[":
+                started = started or text[pos] == "["
+                pos += 1
+            if pos == len(text) or text[pos] == "]":
+                break
+            try:
+                _, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                break
+            pos = end
+            count += 1
+    return count if started else 0
+
+
+def streamed(backend, body: bytes, projection=None) -> int:
+    """Read body through iter_json_array with the given backend, counting items"""
+    async def read() -> int:
+        count = 0
+        async for _ in iter_json_array(_chunks(body), projection):
+            count += 1
+        return count
+
+    selected = decoding._loads
+    decoding._loads = backend
+    try:
+        return asyncio.run(read())
+    finally:
+        decoding._loads = selected
+
+
+def time_decode(decode, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        decode()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def peak_mb(decode) -> float:
+    gc.collect()
+    tracemalloc.start()
+    decode()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def run(sizes, repeat: int, seed: int) -> None:
+    rng = random.Random(seed)
+    print(f"{'payload':<24}{'backend':<9}{'fields':<11}{'ms':>10}{'peak MB':>10}")
+    for count in sizes:
+        for label, items, projection in [("social-posts", social_posts(count, rng), POST_FIELDS),
+                                         ("press-releases", press_releases(count, rng), TEXT_FIELDS)]:
+            body = json.dumps(items).encode()
+            del items
+            payload = f"{label} x{count}"
+            rows = [("before", "all", lambda: stdlib_items(body))]
+            for name, backend in backends():
+                rows += [(name, "all", lambda backend=backend: streamed(backend, body)),
+                         (name, "projected", lambda backend=backend: streamed(backend, body, projection))]
+            for name, fields, decode in rows:
+                seconds = time_decode(decode, repeat)
+                peak = peak_mb(decode)
+                print(f"{payload:<24}{name:<9}{fields:<11}{seconds * 1e3:>10.1f}{peak:>10.1f}")
+            print(f"{payload:<24}body {len(body) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10000, 100000], help="items per payload")
+    parser.add_argument("--repeat", type=int, default=5, help="timed decodes per variant (best is reported)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.items, args.repeat, args.seed)
@@ -0,0 +1,89 @@
+"""Microbenchmark: local lexicon sentiment over many short posts
+
+Scores synthetic English and Arabic posts the way the sentiment fallback
+does, with the vectorized NumPy path and the pure Python path, checks that
+both agree and reports the time per run against a target (1 s for 100k
+posts on one core by default).
+
+Run from media_pulse_bot/:  python -m benchmarks.bench_sentiment_lexicon --posts 100000
+"""
+import argparse
+import random
+import time
+from typing import List
+
+from actions import lexicon
+from actions.lexicon import get_lexicon, score_texts
+
+FILLER_EN = ["the", "launch", "team", "our", "new", "app", "update", "today", "price", "store", "customers",
+             "service", "is", "was", "really", "very", "this", "week", "support", "@mediapulse", "#news", "2026"]
+FILLER_AR = ["الخدمة", "التطبيق", "اليوم", "الفريق", "الجديد", "العملاء", "هذا", "كان", "جدا", "الأسبوع", "التحديث"]
+
+
+def make_posts(count: int, rng: random.Random) -> List[str]:
+    english = list(lexicon.POSITIVE_EN) + list(lexicon.NEGATIVE_EN)
+    arabic = list(lexicon.POSITIVE_AR) + list(lexicon.NEGATIVE_AR)
+    posts = []
+    for _ in range(count):
+        if rng.random() < 0.3:
+            words = rng.choices(FILLER_AR, k=rng.randint(6, 14)) + rng.choices(arabic, k=rng.randint(0, 2))
+            if rng.random() < 0.2:
+                words.append(rng.choice(["لا", "ليس", "غير"]))
+        else:
+            words = rng.choices(FILLER_EN, k=rng.randint(8, 18)) + rng.choices(english, k=rng.randint(0, 2))
+            if rng.random() < 0.2:
+                words.append(rng.choice(["not", "never", "no"]))
+        rng.shuffle(words)
+        posts.append(" ".join(words))
+    return posts
+
+
+def best_time(score, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        score()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def python_path(score):
+    """Run score with numpy hidden from the lexicon module"""
+    vectorized = lexicon._numpy
+    lexicon._numpy = lambda: None
+    try:
+        return score()
+    finally:
+        lexicon._numpy = vectorized
+
+
+def run(sizes: List[int], repeat: int, target: float, seed: int) -> None:
+    rng = random.Random(seed)
+    scorer = get_lexicon()
+    print(f"{'posts':>10}{'path':>10}{'ms':>10}{'posts/s':>14}")
+    for count in sizes:
+        posts = make_posts(count, rng)
+        expected = score_texts(posts)
+        numpy_scores = [round(score, 6) for score in scorer.scores(posts)]
+        if numpy_scores != [round(score, 6) for score in python_path(lambda: scorer.scores(posts))]:
+            raise SystemExit(f"NumPy and Python scores differ for {count} posts")
+
+        numpy_seconds = best_time(lambda: score_texts(posts), repeat)
+        python_seconds = python_path(lambda: best_time(lambda: score_texts(posts), repeat))
+        for path, seconds in (("numpy", numpy_seconds), ("python", python_seconds)):
+            print(f"{count:>10}{path:>10}{seconds * 1e3:>10.1f}{count / seconds:>14,.0f}")
+        print(f"{'':>10}counts: {expected}")
+
+        limit = target * count / 100000
+        verdict = "ok" if numpy_seconds <= limit else "TOO SLOW"
+        print(f"{'':>10}target {limit * 1e3:.0f} ms: {verdict}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, nargs="+", default=[10000, 100000], help="posts per run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per path (best is reported)")
+    parser.add_argument("--target", type=float, default=1.0, help="seconds allowed per 100k posts")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.posts, args.repeat, args.target, args.seed)
@@ -0,0 +1,233 @@
+"""Local stand-in for the MediaPulse API used by the benchmarks
+
+Serves every endpoint the custom actions call, with configurable latency,
+payload sizes, transfer rates and error rates. POST /api/query answers the
+query planner's bulk queries in one round trip. POST /api/chat/push stands in
+for the chat server's push endpoint; GET /api/_fake/pushes lists what it got. Run from media_pulse_bot/:
+
+    python -m benchmarks.fake_api --port 8080 --latency 0.05 --posts 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+PLATFORMS = ["twitter", "facebook", "instagram", "linkedin"]
+WORDS = ["launch", "growth", "crisis", "award", "partnership", "delay", "record", "outage", "praise", "complaint"]
+
+
+class FakeApiSettings:
+    def __init__(self, latency: float = 0.02, jitter: float = 0.5, error_rate: float = 0.0,
+                 posts: int = 1000, press_releases: int = 500, report_latency: float = 0.5,
+                 seed: int = 7, recorded: Optional[Dict[str, Any]] = None,
+                 transfer_rate: Optional[float] = None, paginate: bool = True):
+        self.latency = latency
+        # Each response waits latency * (1 +/- jitter)
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.posts = posts
+        self.press_releases = press_releases
+        self.report_latency = report_latency
+        self.seed = seed
+        # Recorded bodies keyed by "METHOD /api/path", served instead of generated data
+        self.recorded = recorded or {}
+        # Bytes per second for list bodies, to mimic a large download; None sends them at once
+        self.transfer_rate = transfer_rate
+        # Whether /press-releases honours limit/offset or always sends every item
+        self.paginate = paginate
+
+
+def make_posts(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "platform": rng.choice(PLATFORMS),
+            "content": " ".join(rng.choices(WORDS, k=12)),
+            "engagement": int(rng.paretovariate(1.5) * 10),
+            "likes": rng.randint(0, 500),
+            "shares": rng.randint(0, 100),
+            "comments": rng.randint(0, 50),
+            "createdAt": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z",
+            "keywords": rng.sample(WORDS, 2),
+        }
+        for i in range(count)
+    ]
+
+
+def make_press_releases(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": i,
+            "title": f"Press release {i}: {' '.join(rng.choices(WORDS, k=4))}",
+            "summary": " ".join(rng.choices(WORDS, k=40)),
+            "content": " ".join(rng.choices(WORDS, k=200)),
+        }
+        for i in range(count)
+    ]
+
+
+def create_fake_api(settings: Optional[FakeApiSettings] = None) -> web.Application:
+    settings = settings or FakeApiSettings()
+    rng = random.Random(settings.seed)
+    posts_body = json.dumps(make_posts(settings.posts, rng)).encode()
+    releases = make_press_releases(settings.press_releases, rng)
+    releases_body = json.dumps(releases).encode()
+    reports: Dict[str, float] = {}
+    stats = {"requests": 0, "errors": 0}
+    # Messages received on the chat push endpoint, with their arrival time
+    pushes: List[Dict[str, Any]] = []
+
+    async def delay(base: float) -> Optional[web.Response]:
+        stats["requests"] += 1
+        await asyncio.sleep(max(0.0, base * (1 + rng.uniform(-settings.jitter, settings.jitter))))
+        if rng.random() < settings.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": "injected failure"}, status=503)
+        return None
+
+    def sentiment_result() -> Dict[str, Any]:
+        return {
+            "overall_sentiment": rng.choice(["positive", "neutral", "negative"]),
+            "positive_count": rng.randint(0, 500),
+            "negative_count": rng.randint(0, 500),
+            "neutral_count": rng.randint(0, 500),
+        }
+
+    async def sentiment(request: web.Request) -> web.Response:
+        return await delay(settings.latency) or web.json_response(sentiment_result())
+
+    async def send_list(request: web.Request, body: bytes) -> web.StreamResponse:
+        if not settings.transfer_rate:
+            return web.Response(body=body, content_type="application/json")
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+        chunk = 16 * 1024
+        for start in range(0, len(body), chunk):
+            await response.write(body[start:start + chunk])
+            await asyncio.sleep(chunk / settings.transfer_rate)
+        await response.write_eof()
+        return response
+
+    async def social_posts(request: web.Request) -> web.StreamResponse:
+        return await delay(settings.latency) or await send_list(request, posts_body)
+
+    async def press_releases(request: web.Request) -> web.StreamResponse:
+        error = await delay(settings.latency)
+        if error:
+            return error
+        if settings.paginate and "limit" in request.query:
+            offset = int(request.query.get("offset", 0))
+            page = releases[offset:offset + int(request.query["limit"])]
+            return web.json_response(page, headers={"X-Total-Count": str(len(releases))})
+        return await send_list(request, releases_body)
+
+    async def bulk_query(request: web.Request) -> web.Response:
+        error = await delay(settings.latency)
+        if error:
+            return error
+        results = {}
+        for query in (await request.json()).get("queries", []):
+            options = query.get("options") or {}
+            if query["path"] == "/nlp/analyze-sentiment":
+                body: Any = sentiment_result()
+            elif query["path"] == "/press-releases" and "limit" in options:
+                offset = int(options.get("offset", 0))
+                body = {"items": releases[offset:offset + int(options["limit"])], "total": len(releases)}
+            elif query["path"] == "/press-releases":
+                body = releases
+            elif query["path"] == "/social-posts":
+                body = json.loads(posts_body)
+            else:
+                results[query["id"]] = {"status": 404, "body": {"error": "unknown path"}}
+                continue
+            results[query["id"]] = {"status": 200, "body": body}
+        return web.json_response({"results": results})
+
+    async def report(request: web.Request) -> web.Response:
+        error = await delay(settings.report_latency)
+        if error:
+            return error
+        report_id = uuid.uuid4().hex
+        reports[report_id] = 1
+        return web.json_response({"report_url": f"http://localhost/reports/{report_id}.pdf"})
+
+    async def report_job(request: web.Request) -> web.Response:
+        return await delay(settings.latency) or web.json_response({
+            "status": "completed",
+            "report_url": f"http://localhost/reports/{request.match_info['job_id']}.pdf",
+        })
+
+    async def create(request: web.Request) -> web.Response:
+        error = await delay(settings.latency)
+        if error:
+            return error
+        record = await request.json()
+        if isinstance(record, list):
+            return web.json_response([dict(item, id=uuid.uuid4().hex) for item in record], status=201)
+        return web.json_response(dict(record, id=uuid.uuid4().hex), status=201)
+
+    async def push(request: web.Request) -> web.Response:
+        pushes.append(dict(await request.json(), received_at=time.time()))
+        return web.json_response({"delivered": True})
+
+    async def fake_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    async def fake_pushes(request: web.Request) -> web.Response:
+        return web.json_response(pushes)
+
+    @web.middleware
+    async def serve_recorded(request: web.Request, handler) -> web.StreamResponse:
+        recorded = settings.recorded.get(f"{request.method} {request.path}")
+        if recorded is None:
+            return await handler(request)
+        return await delay(settings.latency) or web.json_response(recorded)
+
+    app = web.Application(middlewares=[serve_recorded])
+    app.router.add_post("/api/nlp/analyze-sentiment", sentiment)
+    app.router.add_get("/api/social-posts", social_posts)
+    app.router.add_post("/api/social-posts", create)
+    app.router.add_get("/api/press-releases", press_releases)
+    app.router.add_post("/api/reports/generate", report)
+    app.router.add_post("/api/reports/customize", report)
+    app.router.add_get("/api/reports/jobs/{job_id}", report_job)
+    app.router.add_post("/api/keywords", create)
+    app.router.add_post("/api/journalists", create)
+    app.router.add_post("/api/query", bulk_query)
+    app.router.add_post("/api/chat/push", push)
+    app.router.add_get("/api/_fake/stats", fake_stats)
+    app.router.add_get("/api/_fake/pushes", fake_pushes)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="relative latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--posts", type=int, default=1000, help="social posts returned by /social-posts")
+    parser.add_argument("--press-releases", type=int, default=500, help="items returned by /press-releases")
+    parser.add_argument("--report-latency", type=float, default=0.5, help="report rendering time in seconds")
+    parser.add_argument("--recorded", help='JSON file of recorded bodies keyed by "METHOD /api/path"')
+    parser.add_argument("--transfer-rate", type=float, help="bytes per second for list bodies (default: unlimited)")
+    parser.add_argument("--no-pagination", action="store_true", help="ignore limit/offset on /press-releases")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.recorded:
+        with open(args.recorded) as f:
+            recorded = json.load(f)
+    settings = FakeApiSettings(args.latency, args.jitter, args.error_rate, args.posts,
+                               args.press_releases, args.report_latency, recorded=recorded,
+                               transfer_rate=args.transfer_rate, paginate=not args.no_pagination)
+    web.run_app(create_fake_api(settings), host="127.0.0.1", port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Load test: replay synthetic webhook calls against the action server
+
+Starts the fake MediaPulse API and the action server as subprocesses (unless
+--server-url is given), then drives every action at fixed concurrency levels
+and reports throughput, latency percentiles and server RSS. Run from
+media_pulse_bot/:
+
+    python -m benchmarks.loadtest --concurrency 1 10 50 --duration 10 --save baseline.json
+    python -m benchmarks.loadtest --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Text
+
+import aiohttp
+
+TOPICS = ["product launch", "earnings", "ceo interview", "outage", "sustainability",
+          "hiring", "merger", "customer service", "pricing", "security"]
+
+# Slots each action is replayed with; {topic} is rotated across --topics values
+SCENARIOS: Dict[Text, Dict[Text, Any]] = {
+    "action_get_sentiment_analysis": {"topic": "{topic}", "platform": "twitter", "timeframe": "last week"},
+    "action_get_media_coverage": {"topic": "{topic}", "timeframe": "last month"},
+    "action_get_content_metrics": {"topic": "{topic}", "platform": "twitter", "timeframe": "last month"},
+    "action_generate_kpi_report": {"date_range": "Q1 2025", "format": "pdf", "metric_type": "engagement"},
+    "action_set_keyword_alert": {"keyword": "{topic}", "alert_threshold": "10", "category": "brand"},
+    "action_add_journalist_contact": {"journalist_name": "Jane Doe", "journalist_source": "Daily News",
+                                      "email": "jane@example.com"},
+    "action_publish_social_post": {"post_content": "News about {topic}", "platform": "twitter"},
+    "action_schedule_social_post": {"post_content": "News about {topic}", "platform": "twitter",
+                                    "post_schedule_time": "10:00", "date_range": "tomorrow"},
+    "action_customize_report": {"report_type": "performance", "date_range": "last month", "format": "pdf"},
+}
+
+
+def webhook_payload(action: Text, slots: Dict[Text, Any], sender_id: Text = "loadtest",
+                    text: Text = "", events: Optional[List[Dict[Text, Any]]] = None) -> Dict[Text, Any]:
+    """Build the JSON body Rasa posts to the action server's /webhook"""
+    return {
+        "next_action": action,
+        "sender_id": sender_id,
+        "tracker": {
+            "sender_id": sender_id,
+            "slots": slots,
+            "latest_message": {"intent": {}, "entities": [], "text": text},
+            "events": events or [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": None,
+        },
+        "domain": {},
+        "version": "3.6.2",
+    }
+
+
+def scenario_payload(action: Text, index: int, topics: int) -> Dict[Text, Any]:
+    topic = TOPICS[index % topics] if index % topics < len(TOPICS) else f"topic {index % topics}"
+    slots = {name: value.format(topic=topic) if isinstance(value, str) else value
+             for name, value in SCENARIOS[action].items()}
+    return webhook_payload(action, slots, sender_id=f"loadtest-{index % 1000}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Resident set size of a process in MiB, read from /proc (Linux only)"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def run_level(session: aiohttp.ClientSession, url: Text, action: Text, concurrency: int,
+                    duration: float, topics: int) -> Dict[Text, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors, counter
+        while time.perf_counter() < deadline:
+            counter += 1
+            payload = scenario_payload(action, counter, topics)
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run_suite(url: Text, actions: List[Text], levels: List[int], duration: float,
+                    warmup: float, topics: int, server_pid: Optional[int]) -> Dict[Text, Any]:
+    results: Dict[Text, Any] = {}
+    connector = aiohttp.TCPConnector(limit=max(levels))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for action in actions:
+            if warmup:
+                await run_level(session, url, action, min(levels), warmup, topics)
+            results[action] = {}
+            for level in levels:
+                result = await run_level(session, url, action, level, duration, topics)
+                result["rss_mb"] = rss_mb(server_pid)
+                results[action][str(level)] = result
+                print(f"{action:34} c={level:<4} {result['throughput']:>9.1f} req/s  "
+                      f"p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  "
+                      f"p99 {result['p99_ms']:>8.1f}ms  errors {result['errors']:<5} "
+                      f"rss {result['rss_mb'] or 0:.1f}MiB", flush=True)
+    return results
+
+
+def compare(results: Dict[Text, Any], baseline: Dict[Text, Any], tolerance: float) -> List[Text]:
+    """List the action/level pairs whose p95 or throughput regressed past the tolerance"""
+    regressions = []
+    for action, levels in results.items():
+        for level, current in levels.items():
+            previous = baseline.get(action, {}).get(level)
+            if not previous:
+                continue
+            if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{action} c={level}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current["throughput"] < previous["throughput"] * (1 - tolerance):
+                regressions.append(f"{action} c={level}: throughput "
+                                   f"{previous['throughput']} -> {current['throughput']} req/s")
+    return regressions
+
+
+async def wait_for_port(url: Text, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout}s")
+                await asyncio.sleep(0.2)
+
+
+def start_process(args: List[Text], env: Optional[Dict[Text, Text]] = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m"] + args, env=dict(os.environ, **(env or {})),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server-url", help="use an already running action server instead of starting one")
+    parser.add_argument("--server-port", type=int, default=5155)
+    parser.add_argument("--api-port", type=int, default=5180)
+    parser.add_argument("--actions", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per action and concurrency level")
+    parser.add_argument("--warmup", type=float, default=1, help="warm-up seconds per action")
+    parser.add_argument("--topics", type=int, default=len(TOPICS),
+                        help="distinct topics to rotate through; lower values raise the cache hit rate")
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-posts", type=int, default=1000)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    processes = []
+    server_pid = None
+    url = args.server_url
+    try:
+        if not url:
+            processes.append(start_process([
+                "benchmarks.fake_api", "--port", str(args.api_port), "--latency", str(args.api_latency),
+                "--error-rate", str(args.api_error_rate), "--posts", str(args.api_posts),
+            ]))
+            server = start_process(["actions.server", "--port", str(args.server_port)],
+                                   env={"API_HOST": "127.0.0.1", "API_PORT": str(args.api_port)})
+            processes.append(server)
+            server_pid = server.pid
+            url = f"http://127.0.0.1:{args.server_port}/webhook"
+            asyncio.run(wait_for_port(f"http://127.0.0.1:{args.api_port}/api/_fake/stats"))
+            asyncio.run(wait_for_port(f"http://127.0.0.1:{args.server_port}/health"))
+
+        results = asyncio.run(run_suite(url, args.actions, args.concurrency, args.duration,
+                                        args.warmup, args.topics, server_pid))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    report = {"settings": {key: value for key, value in vars(args).items() if key not in ("save", "baseline")},
+              "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Replay recorded conversations through the custom actions offline
+
+Reads exported tracker event streams and, for every custom action the bot
+ran, calls that action's `run` in-process with the tracker state it saw at
+the time. The backend is the fake API (optionally serving recorded bodies)
+or any API given with --api-host/--api-port. Reports per-conversation action
+latency and flags slow paths. Run from media_pulse_bot/:
+
+    python -m benchmarks.replay conversations.jsonl --workers 4 --output replay.json
+    python -m benchmarks.replay --synthesize 500 conversations.jsonl
+
+Accepted inputs (files or directories of *.json / *.jsonl):
+  * tracker dumps as returned by GET /conversations/<id>/tracker, one per
+    file, as a JSON list or one per line
+  * event broker exports: one event per line, each carrying its sender_id
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Text
+
+from benchmarks.loadtest import SCENARIOS, TOPICS, percentile, start_process, wait_for_port
+
+# Filled in each worker process by _init_worker, once API_HOST/API_PORT are set
+_actions: Dict[Text, Any] = {}
+
+
+def _read_json_documents(path: Text) -> Iterator[Dict[Text, Any]]:
+    with open(path) as f:
+        text = f.read()
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError:
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    if isinstance(document, list):
+        yield from document
+    else:
+        yield document
+
+
+def load_conversations(paths: List[Text]) -> List[Dict[Text, Any]]:
+    """Group the exported trackers and events into {"sender_id", "events"} conversations"""
+    files: List[Text] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json")) + glob.glob(os.path.join(path, "*.jsonl"))))
+        else:
+            files.append(path)
+
+    conversations: Dict[Text, Dict[Text, Any]] = {}
+    for file in files:
+        for document in _read_json_documents(file):
+            if "events" in document:
+                sender_id = document.get("sender_id") or f"{os.path.basename(file)}-{len(conversations)}"
+                conversations.setdefault(sender_id, {"sender_id": sender_id, "events": []})
+                conversations[sender_id]["events"].extend(document["events"])
+            elif "event" in document:
+                sender_id = document.get("sender_id", "default")
+                conversations.setdefault(sender_id, {"sender_id": sender_id, "events": []})
+                conversations[sender_id]["events"].append(document)
+    return list(conversations.values())
+
+
+def _init_worker(api_host: Text, api_port: Text) -> None:
+    os.environ["API_HOST"] = api_host
+    os.environ["API_PORT"] = api_port
+    from rasa_sdk import Action
+    import actions.actions  # noqa: F401  registers the action classes
+    # The actions log every call at INFO, which would drown the report
+    logging.disable(logging.INFO)
+
+    def subclasses(cls):
+        for subclass in cls.__subclasses__():
+            yield subclass
+            yield from subclasses(subclass)
+
+    for action_class in subclasses(Action):
+        if action_class.__module__ == "actions.actions":
+            action = action_class()
+            _actions[action.name()] = action
+
+
+async def _replay_conversation(conversation: Dict[Text, Any], slow_ms: Optional[float]) -> Dict[Text, Any]:
+    from rasa_sdk import Tracker
+    from rasa_sdk.executor import CollectingDispatcher
+    from actions.budgets import get_budget
+
+    sender_id = conversation["sender_id"]
+    slots: Dict[Text, Any] = {}
+    latest_message: Dict[Text, Any] = {"intent": {}, "entities": [], "text": ""}
+    seen: List[Dict[Text, Any]] = []
+    calls = []
+
+    for event in conversation["events"]:
+        kind = event.get("event")
+        if kind == "action" and event.get("name") in _actions:
+            action = _actions[event["name"]]
+            tracker = Tracker(sender_id, dict(slots), latest_message, list(seen), False, None, {},
+                              seen[-1].get("name") if seen and seen[-1].get("event") == "action" else None)
+            started = time.perf_counter()
+            error = None
+            try:
+                await action.run(CollectingDispatcher(), tracker, {})
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            duration_ms = (time.perf_counter() - started) * 1000
+            threshold = slow_ms if slow_ms is not None else get_budget(action.name()).seconds * 1000
+            calls.append({
+                "action": action.name(),
+                "ms": round(duration_ms, 2),
+                "slow": duration_ms > threshold,
+                "error": error,
+                "slots": {name: value for name, value in slots.items() if value is not None},
+            })
+        elif kind == "user":
+            parse_data = event.get("parse_data") or {}
+            latest_message = {
+                "text": event.get("text"),
+                "intent": parse_data.get("intent", {}),
+                "entities": parse_data.get("entities", []),
+            }
+        elif kind == "slot":
+            slots[event["name"]] = event.get("value")
+        elif kind in ("restart", "reset_slots"):
+            slots = {}
+        seen.append(event)
+
+    total_ms = sum(call["ms"] for call in calls)
+    return {
+        "sender_id": sender_id,
+        "action_calls": len(calls),
+        "action_ms": round(total_ms, 2),
+        "max_ms": max((call["ms"] for call in calls), default=0.0),
+        "slow_paths": [call for call in calls if call["slow"] or call["error"]],
+        "calls": [{"action": call["action"], "ms": call["ms"]} for call in calls],
+    }
+
+
+async def _replay_batch_async(conversations: List[Dict[Text, Any]], concurrency: int,
+                              slow_ms: Optional[float]) -> List[Dict[Text, Any]]:
+    from actions import config
+    from actions.api_client import get_api_client
+    from actions.outbox import get_outbox
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def replay(conversation):
+        async with semaphore:
+            return await _replay_conversation(conversation, slow_ms)
+
+    try:
+        return await asyncio.gather(*(replay(conversation) for conversation in conversations))
+    finally:
+        # The outbox drainer never finishes on its own; queued posts stay in its file
+        if config.WRITE_BEHIND_ENABLED:
+            await get_outbox().stop()
+        # Let background report jobs finish before their connection pool goes away
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*pending, return_exceptions=True)
+        await get_api_client().close()
+
+
+def replay_batch(conversations: List[Dict[Text, Any]], concurrency: int = 1,
+                 slow_ms: Optional[float] = None) -> List[Dict[Text, Any]]:
+    """Replay a batch of conversations inside one worker process"""
+    return asyncio.run(_replay_batch_async(conversations, concurrency, slow_ms))
+
+
+def summarize(results: List[Dict[Text, Any]]) -> Dict[Text, Any]:
+    per_action: Dict[Text, List[float]] = {}
+    for result in results:
+        for call in result["calls"]:
+            per_action.setdefault(call["action"], []).append(call["ms"])
+    summary = {}
+    for action, durations in sorted(per_action.items()):
+        durations.sort()
+        summary[action] = {
+            "calls": len(durations),
+            "p50_ms": percentile(durations, 0.50),
+            "p95_ms": percentile(durations, 0.95),
+            "p99_ms": percentile(durations, 0.99),
+            "max_ms": durations[-1],
+        }
+    conversation_ms = sorted(result["action_ms"] for result in results)
+    return {
+        "conversations": len(results),
+        "action_calls": sum(result["action_calls"] for result in results),
+        "slow_paths": sum(len(result["slow_paths"]) for result in results),
+        "conversation_p50_ms": percentile(conversation_ms, 0.50),
+        "conversation_p95_ms": percentile(conversation_ms, 0.95),
+        "actions": summary,
+    }
+
+
+def synthesize_conversations(count: int, seed: int = 7,
+                             weights: Optional[Dict[Text, float]] = None) -> List[Dict[Text, Any]]:
+    """Generate tracker dumps mixing the load-test scenarios, e.g. to model a month-end rush"""
+    rng = random.Random(seed)
+    names = list(SCENARIOS)
+    mix = [(weights or {}).get(name, 1.0) for name in names]
+    conversations = []
+    for index in range(count):
+        events: List[Dict[Text, Any]] = [{"event": "action", "name": "action_session_start"}]
+        for _ in range(rng.randint(1, 6)):
+            action = rng.choices(names, mix)[0]
+            topic = rng.choice(TOPICS)
+            events.append({"event": "user", "text": f"{action.replace('action_', '').replace('_', ' ')} {topic}",
+                           "parse_data": {"intent": {"name": action.replace("action_", ""), "confidence": 1.0},
+                                          "entities": []}})
+            for name, value in SCENARIOS[action].items():
+                events.append({"event": "slot", "name": name,
+                               "value": value.format(topic=topic) if isinstance(value, str) else value})
+            events.append({"event": "action", "name": action})
+            events.append({"event": "action", "name": "action_listen"})
+        conversations.append({"sender_id": f"synthetic-{index}", "events": events})
+    return conversations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="exported tracker files or directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="replay worker processes")
+    parser.add_argument("--concurrency", type=int, default=1, help="conversations replayed at once per worker")
+    parser.add_argument("--slow-ms", type=float,
+                        help="flag calls slower than this; defaults to each action's latency budget")
+    parser.add_argument("--api-host", help="replay against this API instead of the fake one")
+    parser.add_argument("--api-port", default="5180")
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--recorded", help='recorded API bodies keyed by "METHOD /api/path" for the fake API')
+    parser.add_argument("--output", help="write per-conversation results and the summary to this JSON file")
+    parser.add_argument("--top", type=int, default=10, help="slowest conversations to print")
+    parser.add_argument("--synthesize", type=int, metavar="N",
+                        help="write N synthetic conversations to the input file and exit")
+    parser.add_argument("--mix", nargs="*", default=[], metavar="ACTION=WEIGHT",
+                        help="action weights for --synthesize, e.g. action_get_content_metrics=5")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        weights = {name: float(weight) for name, weight in (item.split("=", 1) for item in args.mix)}
+        with open(args.inputs[0], "w") as f:
+            for conversation in synthesize_conversations(args.synthesize, weights=weights):
+                f.write(json.dumps(conversation) + "\n")
+        print(f"Wrote {args.synthesize} conversations to {args.inputs[0]}")
+        return
+
+    conversations = load_conversations(args.inputs)
+    if not conversations:
+        sys.exit("No conversations found")
+
+    fake_api: Optional[subprocess.Popen] = None
+    api_host = args.api_host
+    if not api_host:
+        api_host = "127.0.0.1"
+        command = ["benchmarks.fake_api", "--port", args.api_port, "--latency", str(args.api_latency)]
+        if args.recorded:
+            command += ["--recorded", args.recorded]
+        fake_api = start_process(command)
+    try:
+        if fake_api is not None:
+            asyncio.run(wait_for_port(f"http://{api_host}:{args.api_port}/api/_fake/stats"))
+        workers = max(1, min(args.workers, len(conversations)))
+        batches = [conversations[i::workers] for i in range(workers)]
+        started = time.perf_counter()
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(api_host, args.api_port)) as pool:
+            futures = [pool.submit(replay_batch, batch, args.concurrency, args.slow_ms) for batch in batches]
+            results = [result for future in futures for result in future.result()]
+        elapsed = time.perf_counter() - started
+    finally:
+        if fake_api is not None:
+            fake_api.terminate()
+            fake_api.wait()
+
+    summary = summarize(results)
+    print(f"Replayed {summary['conversations']} conversations ({summary['action_calls']} action calls) "
+          f"with {workers} workers in {elapsed:.1f}s; {summary['slow_paths']} slow paths")
+    for action, stats in summary["actions"].items():
+        print(f"  {action:34} {stats['calls']:>6} calls  p50 {stats['p50_ms']:>8.1f}ms  "
+              f"p95 {stats['p95_ms']:>8.1f}ms  max {stats['max_ms']:>8.1f}ms")
+    print("Slowest conversations:")
+    for result in sorted(results, key=lambda r: r["action_ms"], reverse=True)[:args.top]:
+        flags = ", ".join(f"{call['action']} {call['ms']:.0f}ms" + (f" ({call['error']})" if call["error"] else "")
+                          for call in result["slow_paths"])
+        print(f"  {result['sender_id']:30} {result['action_ms']:>9.1f}ms  {flags}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "conversations": results}, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
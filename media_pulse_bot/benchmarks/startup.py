@@ -0,0 +1,137 @@
+"""Startup benchmark: import-time report and time to first response
+
+The import report runs the action server's app setup under
+`python -X importtime` and lists where startup time goes, and which deferred dependencies
+were still imported. The time-to-first-response runs start the action
+server against the fake API, post one webhook call as soon as the port
+answers, and time each step, with and without --warm-up. Run from
+media_pulse_bot/:
+
+    python -m benchmarks.startup --rounds 5
+    python -m benchmarks.startup --report-only --top 20
+"""
+import argparse
+import asyncio
+import re
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Text
+
+import aiohttp
+
+from benchmarks.loadtest import percentile, scenario_payload, start_process, wait_for_port
+
+# Modules the action server should only import on first use
+DEFERRED = ("aiohttp", "numpy")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+# What the server does before it can listen; rasa_sdk imports every module of the actions package
+STARTUP_CODE = "from actions.server import create_action_app; create_action_app()"
+
+
+def import_report(code: Text = STARTUP_CODE) -> List[Dict[Text, Any]]:
+    """Run code under python -X importtime and return one row per imported module"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append({
+                "module": match.group(4),
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+                "depth": (len(match.group(3)) - 1) // 2,
+            })
+    return rows
+
+
+def print_import_report(rows: List[Dict[Text, Any]], top: int) -> None:
+    total = sum(row["self_ms"] for row in rows)
+    print(f"Import time: {total:.0f} ms across {len(rows)} modules")
+    print(f"\n{'top-level import':<40}{'cumulative ms':>14}")
+    for row in sorted((row for row in rows if row["depth"] == 0), key=lambda row: -row["cumulative_ms"])[:top]:
+        print(f"{row['module']:<40}{row['cumulative_ms']:>14.1f}")
+    print(f"\n{'module':<40}{'self ms':>14}")
+    for row in sorted(rows, key=lambda row: -row["self_ms"])[:top]:
+        print(f"{row['module']:<40}{row['self_ms']:>14.1f}")
+    imported = {row["module"] for row in rows}
+    loaded = [name for name in DEFERRED if name in imported]
+    print(f"\nDeferred dependencies imported at startup: {', '.join(loaded) if loaded else 'none'}")
+
+
+async def _wait_until_up(session: aiohttp.ClientSession, url: Text, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                return
+        except aiohttp.ClientError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.01)
+
+
+async def _post(session: aiohttp.ClientSession, url: Text, payload: Dict[Text, Any]) -> float:
+    started = time.monotonic()
+    async with session.post(url, json=payload) as response:
+        await response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Webhook answered HTTP {response.status}")
+    return time.monotonic() - started
+
+
+async def first_response(port: int, api_port: int, action: Text, warm: bool) -> Dict[Text, float]:
+    """Start a server and time startup, the first webhook call and a second one"""
+    env = {"API_HOST": "127.0.0.1", "API_PORT": str(api_port), "ACTION_SERVER_WARM_UP": str(warm).lower()}
+    started = time.monotonic()
+    server = start_process(["actions.server", "--port", str(port)], env=env)
+    try:
+        async with aiohttp.ClientSession() as session:
+            await _wait_until_up(session, f"http://127.0.0.1:{port}/health")
+            listening = time.monotonic() - started
+            first = await _post(session, f"http://127.0.0.1:{port}/webhook", scenario_payload(action, 0, 1))
+            answered = time.monotonic() - started
+            second = await _post(session, f"http://127.0.0.1:{port}/webhook", scenario_payload(action, 1, 2))
+    finally:
+        server.terminate()
+        server.wait()
+    return {"listening": listening, "first_request": first, "first_response": answered, "second_request": second}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="server starts per mode")
+    parser.add_argument("--action", default="action_get_sentiment_analysis")
+    parser.add_argument("--server-port", type=int, default=5155)
+    parser.add_argument("--api-port", type=int, default=5180)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--top", type=int, default=10, help="modules to list in the import report")
+    parser.add_argument("--report-only", action="store_true", help="only print the import report")
+    args = parser.parse_args()
+
+    print_import_report(import_report(), args.top)
+    if args.report_only:
+        return
+
+    api = start_process(["benchmarks.fake_api", "--port", str(args.api_port), "--latency", str(args.api_latency)])
+    try:
+        asyncio.run(wait_for_port(f"http://127.0.0.1:{args.api_port}/api/_fake/stats"))
+        print(f"\n{'mode':<10}{'step':<18}{'p50 ms':>10}{'max ms':>10}")
+        for mode, warm in (("lazy", False), ("warm-up", True)):
+            runs = [asyncio.run(first_response(args.server_port, args.api_port, args.action, warm))
+                    for _ in range(args.rounds)]
+            for step in ("listening", "first_request", "first_response", "second_request"):
+                values = sorted(run[step] * 1000 for run in runs)
+                print(f"{mode:<10}{step:<18}{percentile(values, 0.5):>10.1f}{values[-1]:>10.1f}")
+    finally:
+        api.terminate()
+        api.wait()
+
+
+if __name__ == "__main__":
+    main()